@@ -0,0 +1,238 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+
+from metrics import observe_admission, observe_rejection
+
+# Admission control: per-class concurrency limits, each with a bounded FIFO
+# queue. A request that cannot start within its class's max wait (or is
+# predicted not to) gets an immediate 503 + Retry-After instead of queueing
+# until gunicorn's timeout. Limits are per worker.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() != "false"
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", "16"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "1.0"))
+# Admins get their own slots and wait longer rather than being shed
+ADMIN_CONCURRENCY = int(os.getenv("ADMIN_CONCURRENCY", "4"))
+ADMIN_MAX_WAIT = float(os.getenv("ADMIN_MAX_WAIT", "10"))
+# Long-poll and event-stream clients of the change feed mostly sit idle;
+# they get their own, larger pool and are refused at once when it is full
+CHANGES_CONCURRENCY = int(os.getenv("CHANGES_CONCURRENCY", "256"))
+
+# Per-client token buckets on the listing APIs scrapers go for. Paths match
+# exactly: /api/videos/changes (long-poll/SSE reconnects) and per-video
+# routes under /api/videos/ are not listings
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+RATE_LIMIT_PATHS = frozenset(
+    path.strip().rstrip("/") for path in os.getenv("RATE_LIMIT_PATHS", "/api/videos,/api/search").split(",")
+    if path.strip()
+)
+# Requests/second and burst per client, per worker
+RATE_LIMIT = float(os.getenv("RATE_LIMIT", "5"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "20"))
+RATE_LIMIT_CLIENTS = int(os.getenv("RATE_LIMIT_CLIENTS", "10000"))
+# Proxies in front of the app that append to X-Forwarded-For (Render: 1)
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1" if os.getenv("RENDER") else "0"))
+
+# Never limited: health checks and monitoring must answer during overload
+EXEMPT_PATHS = ("/health", "/metrics")
+# First matching prefix decides the class; everything else is "pages"
+ROUTE_CLASSES = (
+    ("/admin", "admin"), ("/api/videos/changes", "changes"), ("/api/", "api"), ("/static/", "static")
+)
+
+
+class ConcurrencyLimiter:
+    """At most `limit` requests at once; the rest wait in a bounded FIFO queue.
+
+    A slot passes directly from a finishing request to the oldest waiter.
+    The mean service time (EWMA) predicts each newcomer's wait, so requests
+    that could not start before `max_wait` are refused on arrival.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, max_wait: float):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiters = deque()
+        self.service_time = 0.0
+
+    def expected_wait(self, position: int) -> float:
+        """Predicted wait of the request `position` places back in the queue"""
+        return position * self.service_time / self.limit
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained"""
+        return max(1, math.ceil(self.expected_wait(len(self.waiters) + 1)))
+
+    async def acquire(self) -> Optional[str]:
+        """Take a slot; returns None when admitted, else why the request was shed"""
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return None
+        if len(self.waiters) >= self.queue_size:
+            return "queue_full"
+        if self.expected_wait(len(self.waiters) + 1) > self.max_wait:
+            return "deadline"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+            return None
+        except asyncio.TimeoutError:
+            return "timeout"
+        except asyncio.CancelledError:
+            # The client went away; hand on a slot it was granted meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release(0.0)
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self.waiters.remove(waiter)
+                except ValueError:
+                    pass
+
+    def release(self, elapsed: float):
+        """Free a slot, passing it to the oldest live waiter"""
+        if elapsed:
+            self.service_time = elapsed if not self.service_time else 0.9 * self.service_time + 0.1 * elapsed
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float):
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+
+class RateLimiter:
+    """Per-client token buckets, keeping the most recently seen clients"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_clients = max_clients
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def take(self, client: str) -> float:
+        """Spend a token; returns 0 when allowed, else seconds until one is available"""
+        bucket = self.buckets.get(client)
+        now = time.monotonic()
+        if bucket is None:
+            bucket = self.buckets[client] = TokenBucket(self.burst)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(client)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+
+def client_address(scope, proxy_hops: int = TRUSTED_PROXY_HOPS) -> str:
+    """Client IP, taken from X-Forwarded-For as written by our own proxies"""
+    if proxy_hops:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                hops = [hop.strip() for hop in value.decode("latin-1").split(",") if hop.strip()]
+                if hops:
+                    return hops[max(0, len(hops) - proxy_hops)]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def route_class(path: str) -> str:
+    for prefix, name in ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return name
+    return "pages"
+
+
+def _limits_from_env() -> Dict[str, Tuple[int, int, float]]:
+    """(concurrency, queue size, max wait) per class; ADMISSION_LIMITS="api=8,pages=24" overrides concurrency"""
+    limits = {
+        "pages": (ADMISSION_CONCURRENCY, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_WAIT),
+        "api": (ADMISSION_CONCURRENCY, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_WAIT),
+        "static": (ADMISSION_CONCURRENCY * 2, ADMISSION_QUEUE_SIZE * 2, ADMISSION_MAX_WAIT),
+        "admin": (ADMIN_CONCURRENCY, ADMISSION_QUEUE_SIZE, ADMIN_MAX_WAIT),
+        "changes": (CHANGES_CONCURRENCY, 0, 0.0),
+    }
+    for item in os.getenv("ADMISSION_LIMITS", "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() in limits and value.strip().isdigit():
+            _, queue_size, max_wait = limits[name.strip()]
+            limits[name.strip()] = (int(value), queue_size, max_wait)
+    return limits
+
+
+async def _reject(send, status: int, retry_after: int, detail: str):
+    body = ('{"detail": "%s"}' % detail).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+            (b"cache-control", b"no-store"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """ASGI middleware shedding load early (503) and rate limiting scrapers (429)"""
+
+    def __init__(self, app, limits: Optional[Dict[str, Tuple[int, int, float]]] = None):
+        self.app = app
+        self.limiters = {
+            name: ConcurrencyLimiter(name, *settings)
+            for name, settings in (limits or _limits_from_env()).items()
+        }
+        self.rate_limiter = RateLimiter(RATE_LIMIT, RATE_LIMIT_BURST, RATE_LIMIT_CLIENTS)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not ADMISSION_ENABLED or path in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if RATE_LIMIT_ENABLED and scope["method"] == "GET" and path.rstrip("/") in RATE_LIMIT_PATHS:
+            wait = self.rate_limiter.take(client_address(scope))
+            if wait:
+                observe_rejection("api", "rate_limited")
+                await _reject(send, 429, max(1, math.ceil(wait)), "Too many requests")
+                return
+
+        name = route_class(path)
+        limiter = self.limiters[name]
+        arrived = time.perf_counter()
+        reason = await limiter.acquire()
+        if reason is not None:
+            observe_rejection(name, reason)
+            await _reject(send, 503, limiter.retry_after(), "Server busy, retry later")
+            return
+
+        started = time.perf_counter()
+        observe_admission(name, started - arrived)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - started)
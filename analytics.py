@@ -0,0 +1,214 @@
+import asyncio
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, desc, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from catalog import get_catalog_version, listed
+from models import Video, VideoStats, VideoViewsHourly
+
+# Analytics configuration
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "10"))
+TRENDING_WINDOW_HOURS = int(os.getenv("TRENDING_WINDOW_HOURS", "24"))
+RANKING_CACHE_TTL = float(os.getenv("RANKING_CACHE_TTL", "60"))
+# Watch heartbeats report at most this many seconds each
+MAX_WATCH_SECONDS = 300
+# Rankings are only browsable this deep
+MAX_RANKED_PAGES = 20
+
+SORT_ORDERS = ("latest", "popular", "trending")
+
+ranking_cache = TTLCache(maxsize=256, ttl=RANKING_CACHE_TTL)
+
+# Per-worker counters, swapped out atomically on every flush
+_lock = threading.Lock()
+_views: Counter = Counter()
+_watch_seconds: Counter = Counter()
+_flush_task: Optional[asyncio.Task] = None
+
+
+def record_view(video_id: int):
+    """Count one view in memory; never touches the database"""
+    with _lock:
+        _views[video_id] += 1
+
+
+def record_watch(video_id: int, seconds: int):
+    """Add watch time reported by a player heartbeat"""
+    seconds = max(0, min(int(seconds), MAX_WATCH_SECONDS))
+    if seconds:
+        with _lock:
+            _watch_seconds[video_id] += seconds
+
+
+def _take_pending() -> Tuple[Counter, Counter]:
+    global _views, _watch_seconds
+    with _lock:
+        views, watch_seconds = _views, _watch_seconds
+        _views, _watch_seconds = Counter(), Counter()
+    return views, watch_seconds
+
+
+def _upsert(connection, table, rows, keys, increments):
+    """INSERT rows, adding `increments` columns onto existing rows on conflict"""
+    insert = pg_insert if connection.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={column: table.c[column] + stmt.excluded[column] for column in increments}
+        | {column: stmt.excluded[column] for column in rows[0] if column not in keys + increments},
+    )
+    connection.execute(stmt, rows)
+
+
+def write_deltas(connection, views: Counter, watch_seconds: Counter, now: datetime) -> int:
+    """Apply aggregated deltas in one transaction; returns rows written"""
+    video_ids = set(views) | set(watch_seconds)
+    if not video_ids:
+        return 0
+    # Events for deleted or unknown videos are dropped rather than orphaned
+    existing = set(connection.execute(select(Video.id).where(Video.id.in_(video_ids))).scalars())
+    stats_rows = [
+        {
+            "video_id": video_id,
+            "views": views.get(video_id, 0),
+            "watch_seconds": watch_seconds.get(video_id, 0),
+            "last_viewed_at": now,
+        }
+        for video_id in sorted(existing)
+    ]
+    if not stats_rows:
+        return 0
+    _upsert(connection, VideoStats.__table__, stats_rows, ["video_id"], ["views", "watch_seconds"])
+
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    hourly_rows = [
+        {"video_id": video_id, "hour": hour, "views": count}
+        for video_id, count in sorted(views.items()) if video_id in existing
+    ]
+    if hourly_rows:
+        _upsert(connection, VideoViewsHourly.__table__, hourly_rows, ["video_id", "hour"], ["views"])
+
+    # Buckets older than the trending window are never read again
+    connection.execute(
+        delete(VideoViewsHourly).where(VideoViewsHourly.hour < hour - timedelta(hours=TRENDING_WINDOW_HOURS * 2))
+    )
+    return len(stats_rows)
+
+
+async def flush_analytics(engine) -> int:
+    """Write this worker's pending counters as one batched transaction"""
+    views, watch_seconds = _take_pending()
+    if not views and not watch_seconds:
+        return 0
+    try:
+        async with engine.begin() as connection:
+            return await connection.run_sync(write_deltas, views, watch_seconds, datetime.utcnow())
+    except Exception as e:
+        # Put the deltas back so the next flush retries them
+        with _lock:
+            _views.update(views)
+            _watch_seconds.update(watch_seconds)
+        print(f"⚠️  Analytics flush failed: {e}")
+        return 0
+
+
+async def _flush_loop(engine):
+    while True:
+        await asyncio.sleep(ANALYTICS_FLUSH_INTERVAL)
+        await flush_analytics(engine)
+
+
+def start_analytics(engine):
+    """Start the periodic flush task for this worker"""
+    global _flush_task
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.get_running_loop().create_task(_flush_loop(engine))
+
+
+async def stop_analytics(engine):
+    """Stop the flush task and write whatever is still pending"""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+    await flush_analytics(engine)
+
+
+async def get_ranked_page(
+    db: AsyncSession, sort: str, page: int, limit: int
+) -> Tuple[List[Video], bool]:
+    """Return one page of the 'popular' or 'trending' ordering.
+
+    Rankings are recomputed at most once per RANKING_CACHE_TTL per worker,
+    and at once when the catalog changes (edited, deleted or hidden videos):
+    'popular' walks the (views, video_id) index, then continues with unviewed
+    videos newest first (so a catalog without stats yet is not empty);
+    'trending' sums the hourly buckets inside TRENDING_WINDOW_HOURS.
+    """
+    page = max(1, min(page, MAX_RANKED_PAGES))
+    version, _ = await get_catalog_version(db)
+    key = (sort, version, page, limit)
+    result = ranking_cache.get(key)
+    if result is not None:
+        return result
+
+    offset = (page - 1) * limit
+    if sort == "popular":
+        # Hidden videos are left out before slicing, so pages stay full
+        stmt = (
+            listed(select(VideoStats.video_id).join(Video, Video.id == VideoStats.video_id))
+            .where(VideoStats.views > 0)
+            .order_by(VideoStats.views.desc(), VideoStats.video_id.desc())
+        )
+    else:
+        since = datetime.utcnow() - timedelta(hours=TRENDING_WINDOW_HOURS)
+        total = func.sum(VideoViewsHourly.views).label("total")
+        stmt = (
+            listed(select(VideoViewsHourly.video_id).join(Video, Video.id == VideoViewsHourly.video_id))
+            .where(VideoViewsHourly.hour >= since)
+            .group_by(VideoViewsHourly.video_id)
+            .order_by(desc(total), VideoViewsHourly.video_id.desc())
+        )
+    ids = list((await db.execute(stmt.limit(limit + 1).offset(offset))).scalars())
+    if sort == "popular" and len(ids) <= limit:
+        ids += await _unviewed_ids(db, offset, ids, limit + 1 - len(ids))
+
+    has_more = len(ids) > limit and page < MAX_RANKED_PAGES
+    ids = ids[:limit]
+    by_id = {
+        video.id: video
+        for video in (await db.execute(listed(select(Video)).where(Video.id.in_(ids)))).scalars()
+    } if ids else {}
+    result = ([by_id[video_id] for video_id in ids if video_id in by_id], has_more)
+    ranking_cache.set(key, result)
+    return result
+
+
+async def _unviewed_ids(db: AsyncSession, offset: int, ranked: List[int], count: int) -> List[int]:
+    """Ids that follow the viewed videos in 'popular': never viewed, newest first"""
+    viewed = offset + len(ranked) if ranked else (await db.execute(
+        listed(select(func.count()).select_from(VideoStats).join(Video, Video.id == VideoStats.video_id))
+        .where(VideoStats.views > 0)
+    )).scalar()
+    stmt = (
+        listed(select(Video.id))
+        .where(~Video.id.in_(select(VideoStats.video_id).where(VideoStats.views > 0)))
+        .order_by(Video.created_at.desc(), Video.id.desc())
+        .limit(count)
+        .offset(max(0, offset - viewed))
+    )
+    return list((await db.execute(stmt)).scalars())
+
+
+def ranking_bucket() -> int:
+    """Changes once per RANKING_CACHE_TTL; used in ETags of ranked pages"""
+    return int(time.time() // RANKING_CACHE_TTL)
@@ -0,0 +1,321 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, event, func, select, update
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from catalog import bump_catalog_version
+from jobs import job
+from models import BannerFile, Video
+from storage import (
+    BANNER_DIR, BANNER_GC_GRACE_SECONDS, SNIFF_SIZE, banner_path_for, delete_file_safely, sniff_image_type
+)
+from thumbnails import THUMB_DIR, generate_variants
+
+# Banners stored by content hash; anything else in BANNER_DIR predates dedup
+CONTENT_ADDRESSED = re.compile(rf"^{re.escape(BANNER_DIR)}/[0-9a-f]{{2}}/[0-9a-f]{{64}}\.\w+$")
+MANIFEST_DIR = Path(THUMB_DIR) / "by-banner"
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def adjust_banner_refs(connection, deltas: Counter):
+    """Add `deltas` to the reference counts of banner files, creating missing rows"""
+    changes = [{"banner": path, "delta": delta} for path, delta in deltas.items() if path and delta]
+    if not changes:
+        return
+    table = BannerFile.__table__
+    insert = pg_insert if connection.dialect.name == "postgresql" else sqlite_insert
+    connection.execute(
+        insert(table).on_conflict_do_nothing(index_elements=["path"]),
+        [{"path": change["banner"], "size": _file_size(change["banner"]), "ref_count": 0} for change in changes]
+    )
+    connection.execute(
+        update(table)
+        .where(table.c.path == bindparam("banner"))
+        .values(ref_count=table.c.ref_count + bindparam("delta")),
+        changes
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _count_banner_refs(session, flush_context):
+    """Keep banner_files.ref_count in step with videos written through the ORM"""
+    deltas: Counter = Counter()
+    for obj in session.new:
+        if isinstance(obj, Video):
+            deltas[obj.banner_path] += 1
+    for obj in session.dirty:
+        if isinstance(obj, Video):
+            history = sa_inspect(obj).attrs.banner_path.history
+            if history.has_changes():
+                deltas.update(history.added)
+                deltas.subtract(history.deleted)
+    for obj in session.deleted:
+        if isinstance(obj, Video):
+            history = sa_inspect(obj).attrs.banner_path.history
+            deltas.subtract(history.deleted or history.unchanged)
+    if deltas:
+        adjust_banner_refs(session.connection(), deltas)
+
+
+def _is_recent(path: str, grace_seconds: float) -> bool:
+    try:
+        return time.time() - os.path.getmtime(path) < grace_seconds
+    except OSError:
+        return False
+
+
+def _referenced(paths):
+    return select(BannerFile.path).where(BannerFile.path.in_(paths), BannerFile.ref_count > 0)
+
+
+def _delete_unreferenced(paths, referenced) -> int:
+    # Files touched within BANNER_GC_GRACE_SECONDS are left to gc-banners:
+    # an upload of the same image may be about to reference them
+    return sum(
+        delete_file_safely(path)
+        for path in paths - set(referenced)
+        if not _is_recent(path, BANNER_GC_GRACE_SECONDS)
+    )
+
+
+def release_banner_files(connection, paths: Iterable[Optional[str]]) -> int:
+    """Delete banner files no video references any more; call after commit"""
+    paths = {path for path in paths if path}
+    if not paths:
+        return 0
+    return _delete_unreferenced(paths, connection.execute(_referenced(paths)).scalars())
+
+
+def _discard_created(created: Dict[str, int], referenced) -> int:
+    # A moved mtime means commit_banner() reused the file since: a concurrent
+    # upload of the same image may be about to reference it
+    referenced = set(referenced)
+    removed = 0
+    for path, mtime_ns in created.items():
+        try:
+            reused = os.stat(path).st_mtime_ns != mtime_ns
+        except OSError:
+            continue
+        if path not in referenced and not reused:
+            removed += delete_file_safely(path)
+    return removed
+
+
+async def discard_created_banners(db: AsyncSession, created: Dict[str, int]) -> int:
+    """Delete banner files a failed write created ({path: mtime when stored}; see
+    storage.creation_stamp), unless a committed video references them or
+    another upload reused them since; call after rollback"""
+    if not created:
+        return 0
+    return _discard_created(created, (await db.execute(_referenced(set(created)))).scalars())
+
+
+def discard_created_banner_files(connection, created: Dict[str, int]) -> int:
+    """discard_created_banners() on a sync connection"""
+    if not created:
+        return 0
+    return _discard_created(created, connection.execute(_referenced(set(created))).scalars())
+
+
+@job("release_banners")
+def _release_banners_job(payload: dict):
+    """Enqueued with the write that dropped the references, so runs once it committed"""
+    from database import engine
+    with engine.connect() as connection:
+        release_banner_files(connection, payload["paths"])
+
+
+@job("thumbnails")
+def _thumbnails_job(payload: dict):
+    """Resized variants of a new banner (see thumbnails.py); a no-op once the file is gone"""
+    generate_variants(payload["banner_path"])
+
+
+def _reference_counts(connection) -> Dict[str, int]:
+    return dict(connection.execute(
+        select(Video.banner_path, func.count()).group_by(Video.banner_path)
+    ).all())
+
+
+def backfill_banner_refs(connection) -> int:
+    """Count banner references for catalogs that predate banner_files"""
+    if connection.execute(select(BannerFile.path).limit(1)).first() is not None:
+        return 0
+    return reconcile_banner_refs(connection)
+
+
+def reconcile_banner_refs(connection) -> int:
+    """Recount every banner's references from videos in one pass; returns rows fixed"""
+    counts = _reference_counts(connection)
+    stored = dict(connection.execute(select(BannerFile.path, BannerFile.ref_count)).all())
+    table = BannerFile.__table__
+
+    missing = [
+        {"path": path, "size": _file_size(path), "ref_count": count}
+        for path, count in counts.items() if path not in stored
+    ]
+    wrong = [
+        {"banner": path, "refs": counts.get(path, 0)}
+        for path, refs in stored.items() if refs != counts.get(path, 0)
+    ]
+    if missing:
+        connection.execute(table.insert(), missing)
+    if wrong:
+        connection.execute(
+            update(table).where(table.c.path == bindparam("banner")).values(ref_count=bindparam("refs")),
+            wrong
+        )
+    # Unreferenced files are either gone already or collected below
+    connection.execute(delete(table).where(table.c.ref_count <= 0))
+    return len(missing) + len(wrong)
+
+
+def _content_address(path: str) -> Optional[str]:
+    with open(path, "rb") as f:
+        extension = sniff_image_type(f.read(SNIFF_SIZE))
+        if extension is None:
+            return None
+        f.seek(0)
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    return banner_path_for(digest, extension)
+
+
+def dedupe_legacy_banners(connection, dry_run: bool = False) -> int:
+    """Move uuid-named banners to their content address and repoint their videos.
+
+    Identical legacy files collapse onto one stored copy; the old files are
+    left unreferenced for the orphan sweep. With `dry_run` only the database
+    is changed (for the caller to roll back). Returns the number of files moved.
+    """
+    moved, repointed = 0, []
+    legacy = connection.execute(
+        select(Video.banner_path).where(Video.banner_path.like(f"{BANNER_DIR}/%")).distinct()
+    ).scalars().all()
+    for path in legacy:
+        if CONTENT_ADDRESSED.match(path) or not os.path.isfile(path):
+            continue
+        target = _content_address(path)
+        if target is None:
+            continue
+        if not dry_run and not os.path.exists(target):
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+            temp_path = f"{target}.part"
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, target)
+        # The thumbnails are keyed by content hash, so the manifest carries over
+        manifest = MANIFEST_DIR / f"{Path(path).name}.json"
+        if manifest.exists() and not dry_run:
+            shutil.copyfile(manifest, MANIFEST_DIR / f"{Path(target).name}.json")
+        # A new updated_at also retires cached card fragments and page ETags
+        repointed.extend(connection.execute(
+            update(Video).where(Video.banner_path == path)
+            .values(banner_path=target, updated_at=datetime.utcnow())
+            .returning(Video.id)
+        ).scalars())
+        moved += 1
+    if moved:
+        bump_catalog_version(connection, changed=repointed)
+    return moved
+
+
+def _walk_files(root: str) -> Iterable[Path]:
+    """Files under `root`, skipping dotfiles (.gitkeep) other than upload temp files"""
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if not filename.startswith(".") or filename.endswith(".part"):
+                yield Path(directory, filename)
+
+
+def find_orphans(connection, grace_seconds: float = BANNER_GC_GRACE_SECONDS) -> List[Path]:
+    """Banner files, thumbnail manifests and thumbnails no video references.
+
+    Compares the whole of BANNER_DIR and THUMB_DIR against videos.banner_path
+    in one query; files younger than `grace_seconds` are kept.
+    """
+    referenced = set(_reference_counts(connection))
+    banner_names = {Path(path).name for path in referenced}
+    orphans = []
+
+    for path in _walk_files(BANNER_DIR):
+        if path.as_posix() not in referenced and not _is_recent(str(path), grace_seconds):
+            orphans.append(path)
+
+    live_digests = set()
+    for manifest in MANIFEST_DIR.glob("*.json"):
+        if manifest.name[:-len(".json")] in banner_names:
+            try:
+                live_digests.add(json.loads(manifest.read_text())["digest"])
+            except (OSError, ValueError, KeyError):
+                pass
+        elif not _is_recent(str(manifest), grace_seconds):
+            orphans.append(manifest)
+
+    for path in _walk_files(THUMB_DIR):
+        if path.parent == MANIFEST_DIR:
+            continue
+        digest = path.name.split("-", 1)[0]
+        if digest not in live_digests and not _is_recent(str(path), grace_seconds):
+            orphans.append(path)
+    return orphans
+
+
+def remove_files(paths: Iterable[Path]) -> Tuple[int, int]:
+    """Delete files, returning (files removed, bytes freed)"""
+    removed, freed = 0, 0
+    for path in paths:
+        size = _file_size(str(path))
+        if delete_file_safely(str(path)):
+            removed += 1
+            freed += size
+    return removed, freed
+
+
+def _tree_usage(root: str) -> Tuple[int, int]:
+    files, size = 0, 0
+    for path in _walk_files(root):
+        files += 1
+        size += _file_size(str(path))
+    return files, size
+
+
+def disk_usage(connection) -> Dict:
+    """Bytes on disk for banners and thumbnails next to what the catalog references"""
+    banner_files, banner_bytes = _tree_usage(BANNER_DIR)
+    thumb_files, thumb_bytes = _tree_usage(THUMB_DIR)
+    unique, unique_bytes, references = connection.execute(
+        select(func.count(), func.coalesce(func.sum(BannerFile.size), 0), func.coalesce(func.sum(BannerFile.ref_count), 0))
+        .where(BannerFile.ref_count > 0)
+    ).one()
+    usage = {
+        "banners": {"files": banner_files, "bytes": banner_bytes},
+        "unique_banners": {"files": unique, "bytes": int(unique_bytes), "references": int(references)},
+        "unreferenced_bytes": max(0, banner_bytes - int(unique_bytes)),
+        "thumbnails": {"files": thumb_files, "bytes": thumb_bytes},
+    }
+    database_file = connection.engine.url.database if connection.dialect.name == "sqlite" else None
+    if database_file and os.path.exists(database_file):
+        usage["database"] = {"bytes": sum(
+            _file_size(database_file + suffix) for suffix in ("", "-wal", "-shm")
+        )}
+    total, used, free = shutil.disk_usage(BANNER_DIR if os.path.isdir(BANNER_DIR) else ".")
+    usage["filesystem"] = {"total": total, "used": used, "free": free}
+    return usage
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+StreamHub Link Check Benchmark
+Seed a synthetic catalog into a temporary database, check every link
+against the stub Streamtape server and report throughput, the request rate
+the stub actually saw, and whether each video got the expected verdict.
+
+    python benchmarks/links.py --videos 10000 --rate 100 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def expected_status(n: int) -> str:
+    """Verdict the stub's behaviour for benchmark id `n` should produce"""
+    if n % 10 in (0, 1):
+        return "broken"
+    if n % 100 == 3:
+        return "error"
+    return "ok"
+
+
+async def run_check(args, base_url):
+    from sqlalchemy import func, select
+
+    from catalog import listed
+    from database import async_engine
+    from linkcheck import check_links
+    from models import Video, VideoLink
+
+    start = time.perf_counter()
+    totals = await check_links(
+        async_engine, concurrency=args.concurrency, rate=args.rate, base_url=base_url
+    )
+    elapsed = time.perf_counter() - start
+
+    async with async_engine.connect() as connection:
+        rows = (await connection.execute(
+            select(Video.streamtape_id, VideoLink.status).join(VideoLink, VideoLink.video_id == Video.id)
+        )).all()
+        visible = (await connection.execute(
+            listed(select(func.count(Video.id)))
+        )).scalar_one()
+    await async_engine.dispose()
+
+    mismatches = [
+        streamtape_id for streamtape_id, status in rows
+        if status != expected_status(int(streamtape_id[len("bench"):]))
+    ]
+    return totals, elapsed, len(rows), visible, mismatches
+
+
+def main():
+    """Benchmark the link checker against the stub server"""
+    parser = argparse.ArgumentParser(description="Benchmark the Streamtape link checker")
+    parser.add_argument("--videos", type=int, default=10000, help="Videos to seed and check")
+    parser.add_argument("--concurrency", type=int, default=32, help="Checks in flight")
+    parser.add_argument("--rate", type=float, default=100, help="Checker rate limit (requests/second)")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Stub response delay")
+    parser.add_argument("--max-rps", type=float, default=0, help="Stub answers 429 above this rate")
+    parser.add_argument("--output", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='streamhub-links-')}/links.db")
+
+    from seed import seed_catalog
+    from stub_streamtape import start_stub
+
+    print(f"🌱 Seeding {args.videos} videos...")
+    seed_catalog(args.videos)
+    server, state = start_stub(latency=args.latency_ms / 1000, max_rps=args.max_rps)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"🔗 Checking {args.videos} links ({args.concurrency} concurrent, {args.rate:g} req/s)...")
+    try:
+        totals, elapsed, stored, visible, mismatches = asyncio.run(run_check(args, base_url))
+    finally:
+        server.shutdown()
+
+    report = {
+        "videos": args.videos,
+        "concurrency": args.concurrency,
+        "rate_limit": args.rate,
+        "elapsed_s": round(elapsed, 2),
+        "links_per_s": round(args.videos / elapsed, 1),
+        "stub_requests": sum(state.responses.values()),
+        "stub_peak_rps": state.peak_rps(),
+        "stub_responses": {str(status): count for status, count in sorted(state.responses.items())},
+        "statuses": {key: totals[key] for key in ("ok", "broken", "error")},
+        "visibility_changes": totals["changed"],
+        "stored": stored,
+        "visible": visible,
+        "mismatches": len(mismatches),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    if mismatches or stored != args.videos:
+        print(f"❌ {len(mismatches)} wrong verdict(s), e.g. {mismatches[:5]}; {stored}/{args.videos} stored")
+        return 1
+    print(f"✅ {args.videos} links checked in {elapsed:.1f}s, peak {state.peak_rps()} req/s at the stub")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+StreamHub Overload Benchmark
+Offer more concurrent load than the server can take, with admission control
+on and off, and report latency of the requests that were served, the share
+shed with 503 and /health latency under load.
+
+    python benchmarks/overload.py --videos 10000 --concurrency 256 --workers 1
+
+The load generator is CPU-hungry: give it cores the server does not use
+(e.g. taskset), or the comparison measures the client instead.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from run import ROOT, free_port, summarize  # noqa: E402
+
+
+async def wait_healthy(client, server):
+    deadline = time.monotonic() + 60
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited: {server.stderr.read().decode()[-2000:]}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("gunicorn did not become healthy within 60s")
+        await asyncio.sleep(0.2)
+
+
+async def offer_load(base_url, args, max_id):
+    """Closed-loop clients on /watch/{id} for `args.seconds`, probing /health alongside"""
+    import httpx
+
+    rng = random.Random(1234)
+    served, shed, failed, health = [], 0, 0, []
+    stop = time.monotonic() + args.seconds
+    limits = httpx.Limits(max_connections=args.concurrency + 1, max_keepalive_connections=args.concurrency + 1)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        async def client_loop():
+            nonlocal shed, failed
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(f"/watch/{rng.randint(1, max_id)}")
+                except Exception:
+                    failed += 1
+                    continue
+                if response.status_code == 503:
+                    shed += 1
+                    # Honour Retry-After loosely so shed clients do not spin
+                    await asyncio.sleep(min(1.0, float(response.headers.get("retry-after", 1))) * rng.random())
+                elif response.status_code >= 400:
+                    failed += 1
+                else:
+                    served.append(time.perf_counter() - start)
+
+        async def probe_health():
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        health.append(time.perf_counter() - start)
+                except Exception:
+                    pass
+                await asyncio.sleep(0.05)
+
+        start = time.perf_counter()
+        await asyncio.gather(probe_health(), *(client_loop() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - start
+
+    result = summarize(served, failed, wall)
+    result["shed"] = shed
+    result["health"] = summarize(health, 0, wall)
+    return result
+
+
+async def bench(args, env, admission: bool):
+    import httpx
+
+    port = free_port()
+    command = [
+        sys.executable, "-m", "gunicorn", "main:app",
+        "-c", str(ROOT / "gunicorn.conf.py"),
+        "-w", str(args.workers),
+        "-b", f"127.0.0.1:{port}",
+        "--pid", str(Path(tempfile.gettempdir()) / f"streamhub-overload-{port}.pid"),
+        "--access-logfile", "/dev/null",
+    ]
+    env = dict(env, ADMISSION_ENABLED=str(admission).lower())
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            await wait_healthy(client, server)
+        return await offer_load(base_url, args, args.videos)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    """Compare served-request and /health latency with admission control on and off"""
+    parser = argparse.ArgumentParser(description="StreamHub overload benchmark")
+    parser.add_argument("--videos", type=int, default=10000, help="Synthetic catalog size")
+    parser.add_argument("--database-url", help="Database to seed and benchmark (default: fresh temp SQLite)")
+    parser.add_argument("--skip-seed", action="store_true", help="Benchmark the database as is")
+    parser.add_argument("--concurrency", type=int, default=256, help="Concurrent clients (well above capacity)")
+    parser.add_argument("--seconds", type=float, default=20, help="Load duration per run")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers")
+    parser.add_argument("--output", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="streamhub-overload-"))
+    database_url = args.database_url or f"sqlite:///{workdir / 'bench.db'}"
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONPATH=str(ROOT), RATE_LIMIT_ENABLED="false")
+    os.chdir(ROOT)
+
+    print("🏋️ StreamHub overload benchmark")
+    print("=" * 50)
+    if not args.skip_seed:
+        seed = subprocess.run(
+            [sys.executable, str(ROOT / "benchmarks" / "seed.py"), "--videos", str(args.videos)],
+            cwd=ROOT, env=env
+        )
+        if seed.returncode != 0:
+            return seed.returncode
+
+    results = {}
+    for admission in (False, True):
+        label = "admission" if admission else "no-admission"
+        stats = results[label] = asyncio.run(bench(args, env, admission))
+        print(
+            f"   {label:<13} served p50 {stats['p50_ms']} ms  p99 {stats['p99_ms']} ms  "
+            f"{stats['throughput_rps']} req/s  shed {stats['shed']}  errors {stats['errors']}  "
+            f"/health p99 {stats['health']['p99_ms']} ms"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"💾 Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+StreamHub Benchmark Suite
+Seed a synthetic catalog, drive the main routes at fixed concurrency and
+report latency percentiles, throughput and worker RSS as JSON.
+
+    python benchmarks/run.py --videos 50000 --concurrency 32 --mode both
+    python benchmarks/run.py --compare results/previous.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ROUTES = ["/", "/watch/{id}", "/api/videos", "/admin"]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, wall):
+    """Latency percentiles (ms) and throughput for one route"""
+    latencies = sorted(latencies)
+    to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "p50_ms": to_ms(percentile(latencies, 0.50)),
+        "p95_ms": to_ms(percentile(latencies, 0.95)),
+        "p99_ms": to_ms(percentile(latencies, 0.99)),
+        "max_ms": to_ms(latencies[-1] if latencies else None),
+        "mean_ms": to_ms(sum(latencies) / len(latencies) if latencies else None),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+    }
+
+
+def rss_bytes(pid):
+    """Resident set size of a process (Linux /proc), or None"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def child_pids(parent_pid):
+    """PIDs whose parent is `parent_pid` (Linux /proc)"""
+    children = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            fields = (entry / "stat").read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent_pid:
+            children.append(int(entry.name))
+    return children
+
+
+async def drive_route(client, make_path, total, concurrency):
+    """Send `total` requests from `concurrency` concurrent clients"""
+    latencies, errors = [], 0
+    remaining = total
+
+    async def client_loop():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            path = make_path()
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code >= 400:
+                    errors += 1
+                    continue
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run_routes(client, args, max_id, rss_probe):
+    """Warm up, then benchmark every route in turn"""
+    rng = random.Random(1234)
+    results = {}
+    for route in args.routes:
+        if route == "/watch/{id}":
+            make_path = lambda: f"/watch/{rng.randint(1, max_id)}"
+        else:
+            make_path = lambda route=route: route
+        await drive_route(client, make_path, args.warmup, args.concurrency)
+        latencies, errors, wall = await drive_route(client, make_path, args.requests, args.concurrency)
+        results[route] = summarize(latencies, errors, wall)
+        results[route]["rss_bytes"] = rss_probe()
+        print(
+            f"   {route:<14} p50 {results[route]['p50_ms']} ms  p95 {results[route]['p95_ms']} ms  "
+            f"p99 {results[route]['p99_ms']} ms  {results[route]['throughput_rps']} req/s  "
+            f"errors {errors}"
+        )
+    return results
+
+
+async def bench_asgi(args, max_id):
+    """Drive the app in-process through its ASGI interface"""
+    import httpx
+
+    sys.path.insert(0, str(ROOT))
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        return await run_routes(client, args, max_id, lambda: {str(os.getpid()): rss_bytes(os.getpid())})
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def bench_server(args, max_id, env):
+    """Drive a real gunicorn + UvicornWorker process over HTTP"""
+    import httpx
+
+    port = free_port()
+    pidfile = Path(tempfile.gettempdir()) / f"streamhub-bench-{port}.pid"
+    command = [
+        sys.executable, "-m", "gunicorn", "main:app",
+        "-c", str(ROOT / "gunicorn.conf.py"),
+        "-k", "uvicorn.workers.UvicornWorker",
+        "-w", str(args.workers),
+        "-b", f"127.0.0.1:{port}",
+        "--pid", str(pidfile),
+        "--access-logfile", "/dev/null",
+    ]
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"gunicorn exited: {server.stderr.read().decode()[-2000:]}")
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("gunicorn did not become healthy within 60s")
+                await asyncio.sleep(0.2)
+
+            def rss_probe():
+                return {str(pid): rss_bytes(pid) for pid in child_pids(server.pid)}
+
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as bench_client:
+                return await run_routes(bench_client, args, max_id, rss_probe)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def compare(current, baseline_path):
+    """Print per-route p50/p95/p99/throughput changes against a saved run"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\n📊 Compared with {baseline_path} ({baseline['meta'].get('commit')})")
+    for mode, routes in current["results"].items():
+        for route, stats in routes.items():
+            old = baseline.get("results", {}).get(mode, {}).get(route)
+            if not old:
+                continue
+            changes = []
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+                if stats[metric] and old[metric]:
+                    delta = (stats[metric] - old[metric]) / old[metric] * 100
+                    changes.append(f"{metric} {old[metric]} → {stats[metric]} ({delta:+.1f}%)")
+            print(f"   [{mode}] {route}: " + ", ".join(changes))
+
+
+def main():
+    """Run the benchmark suite"""
+    parser = argparse.ArgumentParser(description="StreamHub latency benchmark")
+    parser.add_argument("--videos", type=int, default=10000, help="Synthetic catalog size")
+    parser.add_argument("--database-url", help="Database to seed and benchmark (default: fresh temp SQLite)")
+    parser.add_argument("--skip-seed", action="store_true", help="Benchmark the database as is")
+    parser.add_argument("--mode", choices=["asgi", "server", "both"], default="asgi")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients per route")
+    parser.add_argument("--requests", type=int, default=2000, help="Measured requests per route")
+    parser.add_argument("--warmup", type=int, default=200, help="Unmeasured requests per route")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers in server mode")
+    parser.add_argument("--routes", nargs="+", default=ROUTES, choices=ROUTES)
+    parser.add_argument("--output", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="streamhub-bench-"))
+    database_url = args.database_url or f"sqlite:///{workdir / 'bench.db'}"
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONPATH=str(ROOT))
+    os.environ.update(DATABASE_URL=database_url)
+    os.chdir(ROOT)
+
+    print("🏁 StreamHub benchmark")
+    print("=" * 50)
+    seed_seconds = None
+    if not args.skip_seed:
+        start = time.perf_counter()
+        seed = subprocess.run(
+            [sys.executable, str(ROOT / "benchmarks" / "seed.py"), "--videos", str(args.videos)],
+            cwd=ROOT, env=env
+        )
+        if seed.returncode != 0:
+            return seed.returncode
+        seed_seconds = round(time.perf_counter() - start, 2)
+
+    results = {}
+    if args.mode in ("asgi", "both"):
+        print("⚡ ASGI (in-process)")
+        results["asgi"] = asyncio.run(bench_asgi(args, args.videos))
+    if args.mode in ("server", "both"):
+        print(f"🦄 gunicorn ({args.workers} UvicornWorker)")
+        results["server"] = asyncio.run(bench_server(args, args.videos, env))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": "PostgreSQL" if "postgres" in database_url else "SQLite",
+            "videos": args.videos,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "workers": args.workers,
+            "seed_seconds": seed_seconds,
+        },
+        "results": results,
+    }
+
+    output = Path(args.output) if args.output else ROOT / "benchmarks" / "results" / (
+        f"{report['meta']['commit'] or 'local'}-{args.videos}-{int(time.time())}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"💾 Results written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
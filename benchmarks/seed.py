@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+StreamHub Benchmark Seeder
+Fill the configured DATABASE_URL with a synthetic catalog of a given size
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+WORDS = (
+    "action adventure comedy drama thriller horror romance mystery fantasy "
+    "documentary travel music sports cooking science history nature space "
+    "ocean city night summer winter legend secret journey return final"
+).split()
+
+BENCH_BANNER = "static/banners/bench-banner.png"
+
+
+def make_banner(path: str):
+    """Write one small PNG banner shared by every synthetic video"""
+    if os.path.exists(path):
+        return
+    try:
+        from PIL import Image
+        Image.new("RGB", (640, 360), (37, 99, 235)).save(path)
+    except ImportError:
+        # 1x1 PNG - enough for the magic-byte check
+        Path(path).write_bytes(bytes.fromhex(
+            "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+            "0000000d4944415478da63f8cf00000301010018dd8db00000000049454e44ae426082"
+        ))
+
+
+def synthetic_records(count: int, seed: int = 42):
+    """Yield `count` deterministic video records"""
+    rng = random.Random(seed)
+    for index in range(count):
+        title_words = rng.sample(WORDS, 3)
+        tags = rng.sample(WORDS, rng.randint(1, 4))
+        yield {
+            "title": f"{' '.join(title_words).title()} {index}",
+            "description": " ".join(rng.choices(WORDS, k=rng.randint(10, 60))),
+            "hashtags": [f"#{tag}" for tag in tags],
+            "streamtape_url": f"https://streamtape.com/e/bench{index:07d}/",
+            "banner": BENCH_BANNER,
+        }
+
+
+def seed_catalog(count: int, batch_size: int = 5000, append: bool = False) -> float:
+    """Create the schema and import `count` videos; returns seconds taken"""
+    from sqlalchemy import func, select
+
+    from database import SessionLocal, init_db
+    from importer import import_videos
+    from models import Video
+
+    init_db()
+    db = SessionLocal()
+    try:
+        existing = db.execute(select(func.count(Video.id))).scalar_one()
+    finally:
+        db.close()
+    if existing and not append:
+        raise RuntimeError(f"Database already holds {existing} videos - use --append or a fresh DATABASE_URL")
+    Path("static/banners").mkdir(parents=True, exist_ok=True)
+    make_banner(BENCH_BANNER)
+
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        result = import_videos(db, synthetic_records(count), batch_size=batch_size)
+    finally:
+        db.close()
+    if result["errors"]:
+        raise RuntimeError(f"Seeding produced errors: {result['errors'][:3]}")
+    return time.perf_counter() - start
+
+
+def main():
+    """Seed a synthetic catalog"""
+    parser = argparse.ArgumentParser(description="Seed a synthetic StreamHub catalog")
+    parser.add_argument("--videos", type=int, default=10000, help="Number of videos to create")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT batch")
+    parser.add_argument("--append", action="store_true", help="Allow seeding a database that already has videos")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    print(f"🌱 Seeding {args.videos} videos into {os.getenv('DATABASE_URL', 'sqlite:///./streamhub.db')}...")
+    try:
+        elapsed = seed_catalog(args.videos, args.batch_size, args.append)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ Seeded {args.videos} videos in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
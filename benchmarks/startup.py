@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+StreamHub Startup
+Measure cold import, lifespan startup and first render of the app, and
+optionally gunicorn time-to-ready and worker respawn. The budget itself is
+enforced by tests/test_startup.py (STARTUP_BUDGET_MS=2000 pytest).
+
+    python benchmarks/startup.py --server --output results/startup.json
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from run import ROOT, child_pids, free_port
+
+# Runs in a fresh interpreter so imports are really cold
+PROBE = """
+import asyncio, json, time
+import httpx
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def probe():
+    async with main.app.router.lifespan_context(main.app):
+        started = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            status = (await client.get("/")).status_code
+        return started, time.perf_counter(), status
+
+started, rendered, status = asyncio.run(probe())
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "lifespan_ms": (started - imported) * 1000,
+    "first_render_ms": (rendered - started) * 1000,
+    "first_render_status": status,
+}))
+"""
+
+
+def measure_in_process(env, runs):
+    """Best-of-N cold import, lifespan startup and first homepage render"""
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr[-2000:])
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {
+        key: round(min(sample[key] for sample in samples), 1) if key.endswith("_ms") else samples[-1][key]
+        for key in samples[0]
+    }
+
+
+def migrate(env):
+    """Create the schema; a separate deploy step, not part of worker startup"""
+    result = subprocess.run(
+        [sys.executable, "manage.py", "migrate"], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Migration failed:\n{result.stdout}{result.stderr}")
+
+
+def wait_healthy(base_url, deadline):
+    import httpx
+
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return True
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    return False
+
+
+def measure_server(env, workers):
+    """gunicorn time-to-ready, and how long a killed worker takes to come back"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.monotonic()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "main:app",
+            "-c", str(ROOT / "gunicorn.conf.py"),
+            "-w", str(workers), "-b", f"127.0.0.1:{port}",
+            "--pid", str(Path(tempfile.gettempdir()) / f"streamhub-startup-{port}.pid"),
+            "--access-logfile", "/dev/null",
+        ],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_healthy(base_url, start + 60):
+            raise RuntimeError("gunicorn did not become healthy within 60s")
+        ready_ms = (time.monotonic() - start) * 1000
+        while len(child_pids(server.pid)) < workers:
+            time.sleep(0.05)
+
+        # Kill one worker and time until the master has replaced it
+        victims = child_pids(server.pid)
+        os.kill(victims[0], signal.SIGKILL)
+        killed = time.monotonic()
+        while True:
+            current = set(child_pids(server.pid))
+            if len(current) >= workers and victims[0] not in current:
+                break
+            if time.monotonic() - killed > 60:
+                raise RuntimeError("worker was not respawned within 60s")
+            time.sleep(0.01)
+        respawn_ms = (time.monotonic() - killed) * 1000
+        return {"ready_ms": round(ready_ms, 1), "respawn_ms": round(respawn_ms, 1), "workers": workers}
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    """Measure startup and report it"""
+    parser = argparse.ArgumentParser(description="StreamHub startup")
+    parser.add_argument("--database-url", help="Database to start against (default: fresh temp SQLite)")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to take the best of")
+    parser.add_argument("--server", action="store_true", help="Also measure gunicorn ready and respawn times")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers with --server")
+    parser.add_argument("--output", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='streamhub-startup-')}/startup.db"
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONPATH=str(ROOT))
+
+    try:
+        migrate(env)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+
+    print("⏱️  StreamHub startup")
+    print("=" * 50)
+    report = {"in_process": measure_in_process(env, args.runs)}
+    for key, value in report["in_process"].items():
+        print(f"   {key:<20} {value}")
+    if args.server:
+        report["server"] = measure_server(env, args.workers)
+        for key, value in report["server"].items():
+            print(f"   {key:<20} {value}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    total = report["in_process"]["import_ms"] + report["in_process"]["lifespan_ms"]
+    print(f"✅ Startup took {total:.0f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
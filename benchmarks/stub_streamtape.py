@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Stub Streamtape Server
+Answers /e/<id>/ embed requests the way Streamtape does, so the link checker
+can be exercised without touching the real host. Benchmark ids end in a
+number that picks the behaviour:
+
+    n % 10 == 0    404
+    n % 10 == 1    200 "Video not found" page
+    n % 10 == 2    503 + Retry-After on the first request, then ok
+    n % 100 == 3   500 every time
+    otherwise      200 with og:image and og:video:duration
+
+Requests beyond --max-rps in any one-second window get a 429.
+
+    python benchmarks/stub_streamtape.py --port 8765
+"""
+
+import argparse
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBED_PATH = re.compile(r"^/e/([A-Za-z0-9_-]+)/?$")
+
+OK_PAGE = """<!DOCTYPE html><html><head>
+<meta name="og:image" content="https://thumb.stub/{id}.jpg">
+<meta name="og:video:duration" content="{duration}">
+<title>{id}</title></head><body><video id="mainvideo"></video></body></html>"""
+NOT_FOUND_PAGE = "<!DOCTYPE html><html><body><h1>Video not found!</h1></body></html>"
+
+
+class StubState:
+    """Request log shared by all handler threads"""
+
+    def __init__(self, latency: float, max_rps: float):
+        self.latency = latency
+        self.max_rps = max_rps
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.seen = Counter()
+        self.responses = Counter()
+        self.per_second = Counter()
+
+    def admit(self) -> bool:
+        """Record a request; False when it exceeds max_rps"""
+        now = time.monotonic()
+        with self.lock:
+            self.per_second[int(now)] += 1
+            while self.recent and now - self.recent[0] >= 1.0:
+                self.recent.popleft()
+            if self.max_rps and len(self.recent) >= self.max_rps:
+                return False
+            self.recent.append(now)
+            return True
+
+    def first_visit(self, video_id: str) -> bool:
+        with self.lock:
+            self.seen[video_id] += 1
+            return self.seen[video_id] == 1
+
+    def peak_rps(self) -> int:
+        with self.lock:
+            return max(self.per_second.values(), default=0)
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def respond(self, status, body="", headers=None):
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+            with state.lock:
+                state.responses[status] += 1
+
+        def do_GET(self):
+            if not state.admit():
+                self.respond(429, headers={"Retry-After": "1"})
+                return
+            match = EMBED_PATH.match(self.path)
+            if not match:
+                self.respond(404)
+                return
+            video_id = match.group(1)
+            digits = re.search(r"(\d+)$", video_id)
+            n = int(digits.group(1)) if digits else 4
+            time.sleep(state.latency)
+            if n % 10 == 0:
+                self.respond(404)
+            elif n % 10 == 1:
+                self.respond(200, NOT_FOUND_PAGE)
+            elif n % 10 == 2 and state.first_visit(video_id):
+                self.respond(503, headers={"Retry-After": "0"})
+            elif n % 100 == 3:
+                self.respond(500)
+            else:
+                self.respond(200, OK_PAGE.format(id=video_id, duration=60 + n % 3600))
+
+    return Handler
+
+
+def start_stub(port: int = 0, latency: float = 0.05, max_rps: float = 0):
+    """Start the stub in a background thread; returns (server, state)"""
+    state = StubState(latency, max_rps)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    """Run the stub until interrupted"""
+    parser = argparse.ArgumentParser(description="Stub Streamtape embed server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Delay added to every answer")
+    parser.add_argument("--max-rps", type=float, default=0, help="Answer 429 above this rate (0 = no limit)")
+    args = parser.parse_args()
+
+    server, state = start_stub(args.port, args.latency_ms / 1000, args.max_rps)
+    print(f"🧪 Stub Streamtape listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"📊 Responses: {dict(state.responses)}")
+
+
+if __name__ == "__main__":
+    main()
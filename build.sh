@@ -18,7 +18,11 @@ echo "🔒 Setting permissions..."
 chmod -R 755 static/
 chmod +x build.sh
 
-# Database setup (migrations will run automatically via init_db)
+# Precompile templates so workers start with a warm bytecode cache
+echo "🧩 Compiling templates..."
+python manage.py compile-templates
+
+# Database setup (schema changes are applied by `python manage.py migrate` at start)
 echo "🗄️  Database setup ready..."
 
 echo "✅ Build completed successfully!"
@@ -0,0 +1,318 @@
+import os
+import time
+from datetime import datetime
+from itertools import chain
+from typing import AsyncIterator, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import Row, delete, event, exists, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from cache import TTLCache
+from models import CatalogState, Tag, Video, VideoLink, VideoTombstone, normalize_tag, video_tags
+from pagination import MAX_PAGE_SIZE, apply_keyset, split_page
+
+# Catalog cache configuration
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "512"))
+# Maximum delay before a worker notices a write made by another worker
+CATALOG_COHERENCE_INTERVAL = float(os.getenv("CATALOG_COHERENCE_INTERVAL", "2"))
+# Keep videos whose Streamtape link is known dead out of public listings (see linkcheck.py)
+HIDE_BROKEN_VIDEOS = os.getenv("HIDE_BROKEN_VIDEOS", "true").lower() != "false"
+# Ids per statement when stamping change sequences (SQLite caps bound parameters)
+STAMP_BATCH_SIZE = 500
+
+catalog_cache = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+
+_state = {"version": None, "updated_at": None, "probed_at": 0.0}
+
+
+class TagInfo(NamedTuple):
+    """Plain copy of a Tag row, safe to cache and share between requests"""
+    id: int
+    name: str
+    video_count: int
+
+    @property
+    def label(self):
+        """Display form of the tag"""
+        return f"#{self.name}"
+
+
+_TAG_COLUMNS = (Tag.id, Tag.name, Tag.video_count)
+
+
+def bump_catalog_version(connection, changed: Iterable[int] = (), deleted: Iterable[int] = ()) -> int:
+    """Increment the catalog version inside the caller's transaction and return it.
+
+    Called automatically for ORM writes to Video; bulk Core writes that
+    bypass the ORM must call it themselves, passing the ids of the videos
+    they wrote (`changed`) or removed (`deleted`) for the change feed.
+    """
+    table = CatalogState.__table__
+    version = connection.execute(
+        update(table)
+        .where(table.c.id == 1)
+        .values(version=table.c.version + 1, updated_at=datetime.utcnow())
+        .returning(table.c.version)
+    ).scalar()
+    if version is None:
+        version = 1
+        connection.execute(insert(table).values(id=1, version=version, updated_at=datetime.utcnow()))
+    _stamp_changes(connection, version, list(changed), list(deleted))
+    return version
+
+
+def _stamp_changes(connection, version: int, changed: List[int], deleted: List[int]):
+    """Record `version` as the change sequence of written videos and tombstone deleted ones.
+
+    The version row stays locked until commit, so once a version is
+    committed every write with a sequence up to it is visible too; readers
+    bound their scans by the version they read (see changes.read_changes).
+    """
+    tombstones = VideoTombstone.__table__
+    for start in range(0, len(changed), STAMP_BATCH_SIZE):
+        ids = changed[start:start + STAMP_BATCH_SIZE]
+        # Keep updated_at: a link check hiding a video is not an edit
+        connection.execute(
+            update(Video).where(Video.id.in_(ids)).values(change_seq=version, updated_at=Video.updated_at)
+        )
+        # SQLite may reuse the id of a deleted video
+        connection.execute(delete(tombstones).where(tombstones.c.video_id.in_(ids)))
+    if deleted:
+        insert_stmt = (pg_insert if connection.dialect.name == "postgresql" else sqlite_insert)(tombstones)
+        connection.execute(
+            insert_stmt.on_conflict_do_update(
+                index_elements=["video_id"],
+                set_={"change_seq": insert_stmt.excluded.change_seq, "deleted_at": insert_stmt.excluded.deleted_at},
+            ),
+            [{"video_id": video_id, "change_seq": version, "deleted_at": datetime.utcnow()} for video_id in deleted]
+        )
+
+
+def invalidate_catalog():
+    """Drop this worker's cached catalog and force a version probe"""
+    catalog_cache.clear()
+    _state["probed_at"] = 0.0
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_on_video_write(session, flush_context):
+    """Bump the catalog version whenever a flush touches a Video"""
+    written = [
+        obj for obj in chain(session.new, session.dirty)
+        if isinstance(obj, Video) and (obj in session.new or session.is_modified(obj))
+    ]
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Video)]
+    if written or deleted:
+        version = bump_catalog_version(session.connection(), [obj.id for obj in written], deleted)
+        for obj in written:
+            set_committed_value(obj, "change_seq", version)
+        session.info["catalog_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    """Invalidate the local cache as soon as a catalog write commits"""
+    if session.info.pop("catalog_changed", False):
+        invalidate_catalog()
+
+
+@event.listens_for(Session, "after_rollback")
+def _reset_on_rollback(session):
+    """Forget a pending invalidation when the write is rolled back"""
+    session.info.pop("catalog_changed", None)
+
+
+def reads_own_writes(db: AsyncSession) -> bool:
+    """True for sessions pinned to the primary right after this client wrote"""
+    return db.info.get("read_your_writes", False)
+
+
+def cached(db: AsyncSession, key):
+    """Cached catalog value, or None on a miss.
+
+    Pinned sessions always miss: this worker's cache may have been filled
+    from a replica that hasn't caught up with the client's write yet.
+    """
+    if reads_own_writes(db):
+        return None
+    return catalog_cache.get(key)
+
+
+async def _probe_version(db: AsyncSession) -> Tuple[int, Optional[datetime]]:
+    row = (await db.execute(
+        select(CatalogState.version, CatalogState.updated_at).where(CatalogState.id == 1)
+    )).first()
+    return tuple(row) if row else (0, None)
+
+
+async def sync_catalog_cache(db: AsyncSession):
+    """Clear the cache if another worker changed the catalog.
+
+    Probes the version counter at most once per CATALOG_COHERENCE_INTERVAL,
+    so every worker sees a write within that delay. Pinned sessions read
+    the primary's version, which replicas may not have yet, so they never
+    update the shared state.
+    """
+    now = time.monotonic()
+    if reads_own_writes(db) or now - _state["probed_at"] < CATALOG_COHERENCE_INTERVAL:
+        return
+    version, updated_at = await _probe_version(db)
+    _state["probed_at"] = now
+    _state["updated_at"] = updated_at
+    if version != _state["version"]:
+        catalog_cache.clear()
+        _state["version"] = version
+
+
+async def get_catalog_version(db: AsyncSession) -> Tuple[int, Optional[datetime]]:
+    """Return the (version, last change time) of the catalog as this worker sees it"""
+    if reads_own_writes(db):
+        return await _probe_version(db)
+    await sync_catalog_cache(db)
+    return _state["version"], _state["updated_at"]
+
+
+async def get_video_page(
+    db: AsyncSession, cursor: Optional[str], limit: int, tag: Optional[TagInfo] = None,
+    include_broken: bool = False
+) -> Tuple[List[Video], Optional[str]]:
+    """Return one keyset page of videos, newest first, through the cache.
+
+    With `tag`, only that tag's videos are listed, found through the
+    (tag_id, video_id) index of video_tags. Videos with a broken link are
+    left out unless `include_broken` (the admin panel lists everything).
+    """
+    await sync_catalog_cache(db)
+    key = ("page", tag.id if tag else None, cursor, limit, include_broken)
+    page = cached(db, key)
+    if page is None:
+        generation = catalog_cache.generation
+        stmt = _filter_by_tag(select(Video), tag)
+        if not include_broken:
+            stmt = listed(stmt)
+        rows = (await db.execute(apply_keyset(stmt, cursor, limit))).scalars().all()
+        page = split_page(rows, limit)
+        catalog_cache.set(key, page, generation)
+    return page
+
+
+def listed(stmt):
+    """Leave out videos whose link is broken, when HIDE_BROKEN_VIDEOS is on"""
+    if not HIDE_BROKEN_VIDEOS:
+        return stmt
+    return stmt.where(~exists().where(VideoLink.video_id == Video.id, VideoLink.status == VideoLink.BROKEN))
+
+
+def _filter_by_tag(stmt, tag: Optional[TagInfo]):
+    if tag:
+        stmt = stmt.join(video_tags, video_tags.c.video_id == Video.id).where(video_tags.c.tag_id == tag.id)
+    return stmt
+
+
+def _row_statement(columns: Sequence, tag: Optional[TagInfo]):
+    # id and created_at are always selected: the keyset cursor is built from them
+    columns = list(columns) + [column for column in (Video.id, Video.created_at) if column not in columns]
+    return listed(_filter_by_tag(select(*columns), tag))
+
+
+async def get_video_rows(
+    db: AsyncSession, cursor: Optional[str], limit: int, columns: Sequence, tag: Optional[TagInfo] = None
+) -> Tuple[List[Row], Optional[str]]:
+    """Like get_video_page, but selects only `columns` as lightweight rows.
+
+    Pages up to MAX_PAGE_SIZE go through the cache; larger API pages don't,
+    so a few huge responses can't evict the pages everyone shares.
+    """
+    await sync_catalog_cache(db)
+    key = ("rows", tag.id if tag else None, cursor, limit, tuple(column.key for column in columns))
+    cacheable = limit <= MAX_PAGE_SIZE
+    page = cached(db, key) if cacheable else None
+    if page is None:
+        generation = catalog_cache.generation
+        rows = (await db.execute(apply_keyset(_row_statement(columns, tag), cursor, limit))).all()
+        page = split_page(rows, limit)
+        if cacheable:
+            catalog_cache.set(key, page, generation)
+    return page
+
+
+async def stream_video_rows(
+    db: AsyncSession, cursor: Optional[str], limit: int, columns: Sequence,
+    tag: Optional[TagInfo] = None, chunk_size: int = 1000
+) -> AsyncIterator[List[Row]]:
+    """Yield one keyset page as chunks of rows from a server-side cursor.
+
+    The last chunk may include the extra lookahead row; callers use it to
+    build the next cursor the same way split_page does.
+    """
+    result = await db.stream(
+        apply_keyset(_row_statement(columns, tag), cursor, limit).execution_options(yield_per=chunk_size)
+    )
+    async for chunk in result.partitions(chunk_size):
+        yield chunk
+
+
+async def get_tag(db: AsyncSession, name: str) -> Optional[TagInfo]:
+    """Look up a tag by name (with or without '#') through the cache"""
+    await sync_catalog_cache(db)
+    name = normalize_tag(name)
+    key = ("tag", name)
+    tag = cached(db, key)
+    if tag is None:
+        generation = catalog_cache.generation
+        row = (await db.execute(select(*_TAG_COLUMNS).where(Tag.name == name))).first()
+        if row is None:
+            return None
+        tag = TagInfo(*row)
+        catalog_cache.set(key, tag, generation)
+    return tag
+
+
+async def get_tag_stats(db: AsyncSession, top: int = 10) -> Tuple[int, List[TagInfo]]:
+    """Return (number of tags in use, most used tags) from the precomputed counts"""
+    await sync_catalog_cache(db)
+    stats = cached(db, ("tag_stats", top))
+    if stats is None:
+        generation = catalog_cache.generation
+        in_use = (await db.execute(
+            select(func.count(Tag.id)).where(Tag.video_count > 0)
+        )).scalar_one()
+        top_tags = (await db.execute(
+            select(*_TAG_COLUMNS).where(Tag.video_count > 0).order_by(Tag.video_count.desc(), Tag.name).limit(top)
+        )).all()
+        stats = (in_use, [TagInfo(*row) for row in top_tags])
+        catalog_cache.set(("tag_stats", top), stats, generation)
+    return stats
+
+
+async def video_exists(db: AsyncSession, video_id: int) -> bool:
+    """Whether a video exists; hits are cached, misses cost a primary-key lookup"""
+    await sync_catalog_cache(db)
+    key = ("exists", video_id)
+    if cached(db, key):
+        return True
+    generation = catalog_cache.generation
+    found = (await db.execute(select(Video.id).where(Video.id == video_id))).first() is not None
+    if found:
+        catalog_cache.set(key, True, generation)
+    return found
+
+
+async def count_videos(db: AsyncSession, include_broken: bool = False) -> int:
+    """Return the number of videos through the cache; broken ones only with `include_broken`"""
+    await sync_catalog_cache(db)
+    key = ("count", include_broken)
+    total = cached(db, key)
+    if total is None:
+        generation = catalog_cache.generation
+        stmt = select(func.count(Video.id))
+        if not include_broken:
+            stmt = listed(stmt)
+        total = (await db.execute(stmt)).scalar_one()
+        catalog_cache.set(key, total, generation)
+    return total
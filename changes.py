@@ -0,0 +1,258 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, delete, func, or_, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from catalog import listed
+from models import CatalogState, Video, VideoTombstone
+from serializers import VIDEO_FIELDS, dumps, parse_fields, video_columns
+
+# Change feed configuration
+CHANGES_PAGE_SIZE = int(os.getenv("CHANGES_PAGE_SIZE", "500"))
+CHANGES_MAX_PAGE_SIZE = int(os.getenv("CHANGES_MAX_PAGE_SIZE", "5000"))
+# Longest a long-poll request waits for a change
+CHANGES_MAX_WAIT = float(os.getenv("CHANGES_MAX_WAIT", "30"))
+# How often a worker with waiting clients checks the catalog version
+CHANGES_POLL_INTERVAL = float(os.getenv("CHANGES_POLL_INTERVAL", "1.0"))
+# Event streams send a comment this often and end after SSE_MAX_SECONDS
+# (clients reconnect with Last-Event-ID)
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_MAX_SECONDS = float(os.getenv("SSE_MAX_SECONDS", "300"))
+SSE_MEDIA_TYPE = "text/event-stream"
+# Deletes older than this are forgotten; clients further behind must resync
+TOMBSTONE_RETENTION_DAYS = float(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+
+# Position in the feed: (change_seq, video id), or (change_seq, None) for
+# "everything after this version"
+Position = Tuple[int, Optional[int]]
+
+
+def encode_token(change_seq: int, video_id: Optional[int] = None) -> str:
+    return f"{change_seq}.{video_id}" if video_id is not None else str(change_seq)
+
+
+def decode_token(token: Optional[str]) -> Optional[Position]:
+    """Parse a change token: "<seq>" or "<seq>.<video id>" (None = from the start)"""
+    if not token:
+        return None
+    seq, _, video_id = token.partition(".")
+    try:
+        return int(seq), int(video_id) if video_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid change token")
+
+
+def change_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Projection for the feed: every field by default, always starting with id"""
+    names = parse_fields(fields) if fields else tuple(VIDEO_FIELDS)
+    return ("id",) + tuple(name for name in names if name != "id")
+
+
+def _after(seq_column, id_column, position: Optional[Position]):
+    if position is None:
+        return true()
+    seq, video_id = position
+    if video_id is None:
+        return seq_column > seq
+    return or_(seq_column > seq, and_(seq_column == seq, id_column > video_id))
+
+
+async def check_token(db: AsyncSession, token: Optional[str]) -> Optional[Position]:
+    """Decode `token`, answering 410 when deletes it has not seen were pruned"""
+    position = decode_token(token)
+    if position is not None:
+        pruned_seq = (await db.execute(
+            select(CatalogState.pruned_seq).where(CatalogState.id == 1)
+        )).scalar()
+        if pruned_seq is not None and position[0] < pruned_seq:
+            raise HTTPException(status_code=410, detail="Change token expired; sync again without `since`")
+    return position
+
+
+async def read_changes(
+    db: AsyncSession, position: Optional[Position], limit: int, names: Tuple[str, ...]
+) -> Tuple[Dict, int]:
+    """One page of changes after `position`, plus the catalog version read before it.
+
+    Walks (change_seq, id) order over live videos and tombstones with one
+    index range scan each. Both scans stop at the version read first:
+    writes committing between the scans must not carry the token past a
+    write the other scan missed. Videos that are hidden (broken link) are
+    reported as deleted, like tombstones.
+    """
+    version = (await db.execute(select(CatalogState.version).where(CatalogState.id == 1))).scalar() or 0
+    written = (await db.execute(
+        select(Video.change_seq, Video.id)
+        .where(_after(Video.change_seq, Video.id, position), Video.change_seq <= version)
+        .order_by(Video.change_seq, Video.id)
+        .limit(limit + 1)
+    )).all()
+    removed = (await db.execute(
+        select(VideoTombstone.change_seq, VideoTombstone.video_id)
+        .where(_after(VideoTombstone.change_seq, VideoTombstone.video_id, position),
+               VideoTombstone.change_seq <= version)
+        .order_by(VideoTombstone.change_seq, VideoTombstone.video_id)
+        .limit(limit + 1)
+    )).all()
+    entries = sorted([(seq, video_id, False) for seq, video_id in written] +
+                     [(seq, video_id, True) for seq, video_id in removed])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    ids = [video_id for _, video_id, gone in entries if not gone]
+    rows = {}
+    if ids:
+        rows = {
+            row[0]: dict(zip(names, row))
+            for row in await db.execute(listed(select(*video_columns(names))).where(Video.id.in_(ids)))
+        }
+    videos = [rows[video_id] for _, video_id, gone in entries if not gone and video_id in rows]
+    deleted = [video_id for _, video_id, gone in entries if gone or video_id not in rows]
+
+    if entries:
+        next_token = encode_token(entries[-1][0], entries[-1][1])
+    elif position is not None:
+        next_token = encode_token(*position)
+    else:
+        # Every write up to the version read first has committed
+        next_token = encode_token(version)
+    return {
+        "status": "success",
+        "count": len(videos),
+        "videos": videos,
+        "deleted": deleted,
+        "next_token": next_token,
+        "has_more": has_more,
+    }, version
+
+
+class ChangeNotifier:
+    """One catalog-version poller per worker, shared by every waiting client.
+
+    Polls only while someone waits; each version change wakes all waiters.
+    """
+
+    def __init__(self, interval: float = CHANGES_POLL_INTERVAL):
+        self.interval = interval
+        self.version: Optional[int] = None
+        self.waiters = 0
+        self._changed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _probe(self) -> int:
+        from database import AsyncReadSessionLocal
+        async with AsyncReadSessionLocal() as db:
+            return (await db.execute(select(CatalogState.version).where(CatalogState.id == 1))).scalar() or 0
+
+    async def _poll(self):
+        try:
+            while self.waiters:
+                try:
+                    version = await self._probe()
+                except Exception as e:
+                    print(f"⚠️  Change feed version probe failed: {e}")
+                    version = self.version
+                if version != self.version:
+                    self.version = version
+                    changed, self._changed = self._changed, asyncio.Event()
+                    changed.set()
+                await asyncio.sleep(self.interval)
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+    async def wait(self, seen_version: int, timeout: float):
+        """Return once the catalog moved past `seen_version`, or after `timeout`"""
+        if self.version is not None and self.version > seen_version:
+            return
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First waiter, or the app now runs on a new event loop
+            self._loop, self._changed, self._task, self.waiters = loop, asyncio.Event(), None, 0
+        changed = self._changed
+        self.waiters += 1
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._poll())
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.waiters -= 1
+
+
+notifier = ChangeNotifier()
+
+
+async def wait_for_changes(
+    db: AsyncSession, position: Optional[Position], limit: int, names: Tuple[str, ...], wait: float
+) -> Dict:
+    """read_changes(), long-polling up to `wait` seconds while there is nothing new"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(wait, CHANGES_MAX_WAIT)
+    while True:
+        page, version = await read_changes(db, position, limit, names)
+        remaining = deadline - loop.time()
+        if page["videos"] or page["deleted"] or remaining <= 0:
+            return page
+        # Hand the connection back to the pool while waiting
+        await db.rollback()
+        await notifier.wait(version, remaining)
+
+
+def _event(name: str, data: bytes, event_id: Optional[str] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {name}\n".encode() + b"data: " + data + b"\n\n"
+
+
+async def stream_changes(
+    open_session: Callable[[], AsyncSession], position: Optional[Position], limit: int, names: Tuple[str, ...]
+) -> AsyncIterator[bytes]:
+    """Server-Sent Events: a `changes` event per page as writes commit, ids are change tokens"""
+    loop = asyncio.get_running_loop()
+    started = last_sent = loop.time()
+    yield b"retry: 2000\n\n"
+    while loop.time() - started < SSE_MAX_SECONDS:
+        # A session per page: nothing is held while the stream idles
+        async with open_session() as db:
+            page, version = await read_changes(db, position, limit, names)
+        if page["videos"] or page["deleted"]:
+            position = decode_token(page["next_token"])
+            last_sent = loop.time()
+            yield _event("changes", dumps(page), page["next_token"])
+            if page["has_more"]:
+                continue
+        elif loop.time() - last_sent >= SSE_HEARTBEAT_SECONDS:
+            last_sent = loop.time()
+            yield b": keepalive\n\n"
+        await notifier.wait(version, min(SSE_HEARTBEAT_SECONDS, SSE_MAX_SECONDS - (loop.time() - started)))
+
+
+def backfill_change_seq(connection) -> int:
+    """Give videos written before the change feed existed a change sequence of 0"""
+    return connection.execute(
+        update(Video).where(Video.change_seq.is_(None)).values(change_seq=0, updated_at=Video.updated_at)
+    ).rowcount
+
+
+def prune_tombstones(connection, retention_days: float = TOMBSTONE_RETENTION_DAYS) -> int:
+    """Delete old tombstones, recording how far they went so stale tokens get a 410"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    horizon = connection.execute(
+        select(func.max(VideoTombstone.change_seq)).where(VideoTombstone.deleted_at < cutoff)
+    ).scalar()
+    if horizon is None:
+        return 0
+    removed = connection.execute(
+        delete(VideoTombstone).where(VideoTombstone.change_seq <= horizon)
+    ).rowcount
+    pruned_seq = connection.execute(select(CatalogState.pruned_seq).where(CatalogState.id == 1)).scalar()
+    connection.execute(
+        update(CatalogState).where(CatalogState.id == 1).values(pruned_seq=max(pruned_seq or 0, horizon))
+    )
+    return removed
@@ -1,5 +1,9 @@
+import multiprocessing
 import os
-from sqlalchemy import create_engine
+from typing import List
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -10,18 +14,144 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./streamhub.db")
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+def get_async_url(url: str) -> str:
+    """Map a sync database URL onto its async driver (asyncpg / aiosqlite)"""
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+ASYNC_DATABASE_URL = get_async_url(DATABASE_URL)
+
+# Optional PostgreSQL streaming replica for read-only request handlers
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+if DATABASE_REPLICA_URL and DATABASE_REPLICA_URL.startswith("postgres://"):
+    DATABASE_REPLICA_URL = DATABASE_REPLICA_URL.replace("postgres://", "postgresql://", 1)
+# Seconds a client keeps reading from the primary after it wrote something
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+
+# Connection budget: what all gunicorn workers together may open on one
+# PostgreSQL server. Keep it below max_connections with room for
+# migrations and psql. Same worker count as gunicorn.conf.py.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() * 2 + 1)))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "80"))
+DB_REPLICA_MAX_CONNECTIONS = int(os.getenv("DB_REPLICA_MAX_CONNECTIONS", str(DB_MAX_CONNECTIONS)))
+# The job runner elected among the web workers (jobs.py, JOB_RUNNER=web)
+# has its own pool of JOB_THREADS + 1, taken off the budget up front
+JOB_CONNECTIONS = int(os.getenv("JOB_THREADS", "2")) + 1 if os.getenv("JOB_RUNNER", "web") == "web" else 0
+
+# SQLite tuning: "default" is a plain connection per request; "production"
+# runs WAL with tuned pragmas, a read-only pool and one serialized writer
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+
+def tune_sqlite(engine, read_only: bool = False):
+    """Apply the production SQLite pragmas to every connection of an engine.
+
+    Writers open their transactions with BEGIN IMMEDIATE: a deferred
+    transaction that later upgrades to a write lock fails at once with
+    "database is locked" instead of honouring busy_timeout.
+    """
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # Let SQLAlchemy issue BEGIN itself instead of the driver's implicit one
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+    
+    @event.listens_for(engine, "begin")
+    def on_begin(connection):
+        connection.exec_driver_sql("BEGIN" if read_only else "BEGIN IMMEDIATE")
+
+def pool_settings(max_connections: int, reserved: int = 0) -> dict:
+    """Per-worker pool_size/max_overflow keeping every worker within a server budget.
+
+    Half of a worker's share stays open, the rest is overflow that is closed
+    again once idle. DB_POOL_SIZE / DB_MAX_OVERFLOW override the split.
+    """
+    share = max(2, max_connections // max(1, WEB_CONCURRENCY) - reserved)
+    pool_size = int(os.getenv("DB_POOL_SIZE", str(max(1, share // 2))))
+    max_overflow = int(os.getenv("DB_MAX_OVERFLOW", str(max(0, share - pool_size))))
+    return {"pool_size": pool_size, "max_overflow": max_overflow}
+
 # Create engine with appropriate settings
 if "postgresql://" in DATABASE_URL:
-    # PostgreSQL configuration (if DATABASE_URL is provided)
+    # PostgreSQL configuration (if DATABASE_URL is provided). The sync engine
+    # only serves bulk imports and scripts, so it gets one connection per worker.
     engine = create_engine(
         DATABASE_URL,
-        pool_size=10,
-        max_overflow=20,
+        pool_size=1,
+        max_overflow=0,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        echo=False
+    )
+    primary_pool = pool_settings(DB_MAX_CONNECTIONS - JOB_CONNECTIONS, reserved=1)
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        **primary_pool,
         pool_pre_ping=True,
         pool_recycle=300,
         echo=False
     )
-    print("🐘 Using PostgreSQL database")
+    print(f"🐘 Using PostgreSQL database (pool {primary_pool['pool_size']}+{primary_pool['max_overflow']} per worker)")
+    if DATABASE_REPLICA_URL:
+        replica_pool = pool_settings(DB_REPLICA_MAX_CONNECTIONS)
+        async_read_engine = create_async_engine(
+            get_async_url(DATABASE_REPLICA_URL),
+            **replica_pool,
+            pool_pre_ping=True,
+            pool_recycle=300,
+            echo=False
+        )
+        print(f"🐘 Reading from replica (pool {replica_pool['pool_size']}+{replica_pool['max_overflow']} per worker)")
+    else:
+        async_read_engine = async_engine
+elif SQLITE_PROFILE == "production":
+    # SQLite in WAL mode: one writer connection per engine, so writes queue
+    # in-process instead of fighting over the file lock
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        pool_size=1,
+        max_overflow=0,
+        echo=False
+    )
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=30,
+        echo=False
+    )
+    # Readers never block the writer (or each other) under WAL
+    async_read_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=SQLITE_READ_POOL_SIZE,
+        max_overflow=0,
+        echo=False
+    )
+    tune_sqlite(engine)
+    tune_sqlite(async_engine.sync_engine)
+    tune_sqlite(async_read_engine.sync_engine, read_only=True)
+    print("📁 Using SQLite database (WAL, read pool + single writer)")
 else:
     # SQLite configuration - auto-creates database file
     engine = create_engine(
@@ -29,38 +159,177 @@ else:
         connect_args={"check_same_thread": False},
         echo=False
     )
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        echo=False
+    )
+    async_read_engine = async_engine
     print("📁 Using SQLite database (auto-created)")
 
-# Create SessionLocal class
+def create_job_engines(threads: int):
+    """(writer, reader) sync engines for a job runner.
+
+    The writer pool has a connection per job thread plus one for claiming,
+    so handlers never queue behind imports on `engine`. The reader runs
+    the idle due-check: under the SQLite production profile it opens a
+    plain BEGIN, so polling never takes the write lock.
+    """
+    size = threads + 1
+    if "postgresql://" in DATABASE_URL:
+        # Web-worker runners are budgeted as JOB_CONNECTIONS; worker.py
+        # processes need room of their own below max_connections
+        writer = create_engine(
+            DATABASE_URL, pool_size=size, max_overflow=0, pool_pre_ping=True, pool_recycle=300, echo=False
+        )
+        return writer, writer
+    writer = create_engine(
+        DATABASE_URL, connect_args={"check_same_thread": False}, pool_size=size, max_overflow=0, echo=False
+    )
+    if SQLITE_PROFILE != "production":
+        return writer, writer
+    reader = create_engine(
+        DATABASE_URL, connect_args={"check_same_thread": False}, pool_size=1, max_overflow=0, echo=False
+    )
+    tune_sqlite(writer)
+    tune_sqlite(reader, read_only=True)
+    return writer, reader
+
+# Reads may lag behind writes: clients that just wrote are pinned to the primary
+READ_REPLICA = async_read_engine is not async_engine and "postgresql://" in DATABASE_URL
+
+# Process that created the engines; forked workers must not reuse its connections
+_engine_pid = os.getpid()
+
+def dispose_inherited_engines() -> bool:
+    """Drop pooled connections inherited across fork (call in each worker).
+
+    close=False leaves the parent's sockets alone and just gives this
+    process fresh, empty pools.
+    """
+    global _engine_pid
+    if os.getpid() == _engine_pid:
+        return False
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+    if async_read_engine is not async_engine:
+        async_read_engine.sync_engine.dispose(close=False)
+    _engine_pid = os.getpid()
+    return True
+
+# Create SessionLocal class (scripts, migrations and init_db)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create AsyncSessionLocal class (request handlers - never blocks the event loop)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# Sessions for read-only request handlers (read pool or replica)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Create Base class
 Base = declarative_base()
 
-def init_db():
-    """Initialize database tables - called automatically on startup"""
+def add_missing_columns(connection) -> List[str]:
+    """Add model columns and indexes that existing tables don't have yet.
+
+    create_all only creates missing tables. New columns on existing tables
+    must be nullable or carry a server_default.
+    """
+    from sqlalchemy.schema import CreateColumn
+    
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in present:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                added.append(f"{table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    return added
+
+def init_db() -> bool:
+    """Create or upgrade the schema - run by `manage.py migrate`, not by web workers"""
     try:
         # Import models to register them with Base
-        from models import Video
+        from models import CatalogState, Video
         
-        # Create all tables automatically
+        # Create missing tables, then columns added to existing ones
         Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            for column in add_missing_columns(connection):
+                print(f"✅ Added column {column}")
         print("✅ Database tables created successfully")
         
+        # Create the full-text search index (FTS5 or tsvector/GIN)
+        from search import setup_search_index
+        with engine.begin() as connection:
+            setup_search_index(connection)
+        
         # Test database connection
         db = SessionLocal()
         try:
             # Simple query to verify connection
-            db.execute("SELECT 1")
+            db.execute(text("SELECT 1"))
             print("✅ Database connection verified")
+            
+            # Seed the catalog version counter used by the catalog cache
+            if db.get(CatalogState, 1) is None:
+                db.add(CatalogState(id=1, version=0))
+                db.commit()
+            
+            # Link videos created before the tag tables existed
+            from tags import backfill_tags
+            linked = backfill_tags(db.connection())
+            db.commit()
+            if linked:
+                print(f"✅ Backfilled tags for {linked} video(s)")
+            
+            # Count banner references for catalogs that predate banner_files
+            from banners import backfill_banner_refs
+            counted = backfill_banner_refs(db.connection())
+            db.commit()
+            if counted:
+                print(f"✅ Counted references for {counted} banner file(s)")
+            
+            # Build the related-videos index for catalogs that predate it
+            from related import backfill_related
+            indexed = backfill_related(db.connection())
+            db.commit()
+            if indexed:
+                print(f"✅ Built related videos for {indexed} video(s)")
+            
+            # Videos written before the change feed start at sequence 0
+            from changes import backfill_change_seq
+            stamped = backfill_change_seq(db.connection())
+            db.commit()
+            if stamped:
+                print(f"✅ Added {stamped} video(s) to the change feed")
         except Exception as e:
             print(f"⚠️  Database connection test failed: {e}")
+            return False
         finally:
             db.close()
+        return True
             
     except Exception as e:
         print(f"❌ Database initialization error: {e}")
         # Don't raise error - let app continue with potential fallback
+        return False
 
 def get_db_info():
     """Get database connection information for debugging"""
@@ -68,5 +337,6 @@ def get_db_info():
     return {
         "type": db_type,
         "url": DATABASE_URL.split("@")[-1] if "@" in DATABASE_URL else "local file",
+        "replica": DATABASE_REPLICA_URL.split("@")[-1] if READ_REPLICA else None,
         "status": "connected"
     }
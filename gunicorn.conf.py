@@ -1,12 +1,19 @@
 import os
 import multiprocessing
+import shutil
+
+# Shared on-disk store so /metrics aggregates every worker (see metrics.py).
+# Must be set before the app (and prometheus_client) is imported.
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/streamhub-metrics")
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
 
 # Server socket
 bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
 backlog = 2048
 
-# Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
+# Worker processes (database.py sizes its connection pools from the same count)
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
 worker_class = "uvicorn.workers.UvicornWorker"
 worker_connections = 1000
 max_requests = 1000
@@ -61,10 +68,27 @@ def when_ready(server):
     """Called just after the server is started."""
     server.log.info("🚀 StreamHub is ready! Workers: %s", server.cfg.workers)
 
+def post_fork(server, worker):
+    """Called just after a worker has been forked."""
+    # The preloaded app's engines belong to the master; give this worker its own pools
+    try:
+        from database import dispose_inherited_engines
+        dispose_inherited_engines()
+    except ImportError:
+        pass
+
 def worker_int(worker):
     """Called just after a worker exited on SIGINT or SIGQUIT."""
     worker.log.info("👋 Worker shutting down...")
 
+def child_exit(server, worker):
+    """Called just after a worker has been exited, in the master process."""
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
+
 def on_exit(server):
     """Called just before exiting."""
     server.log.info("👋 StreamHub shutting down...")
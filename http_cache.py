@@ -0,0 +1,92 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Dict, Hashable, Optional
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+
+from cache import TTLCache
+
+# Rendered page cache configuration
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "600"))
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "1024"))
+# Browser and shared (CDN) freshness lifetimes for HTML pages
+PAGE_MAX_AGE = int(os.getenv("PAGE_MAX_AGE", "60"))
+PAGE_S_MAXAGE = int(os.getenv("PAGE_S_MAXAGE", "300"))
+# Folded into every ETag so a deploy with new templates invalidates old pages
+BUILD_ID = os.getenv("RENDER_GIT_COMMIT", "dev")
+
+page_cache = TTLCache(maxsize=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL)
+
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the values that determine a response body"""
+    digest = hashlib.sha1("|".join(str(part) for part in (BUILD_ID,) + parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def http_date(value: datetime) -> str:
+    """Format a naive UTC datetime as an HTTP date"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    """Validator and freshness headers shared by 200 and 304 responses"""
+    headers = {
+        "ETag": etag,
+        "Cache-Control": (
+            f"public, max-age={PAGE_MAX_AGE}, s-maxage={PAGE_S_MAXAGE}, "
+            f"stale-while-revalidate={PAGE_MAX_AGE}"
+        ),
+        "Vary": "Accept-Encoding",
+    }
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since (RFC 9110 precedence)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+        return modified <= since
+    return False
+
+
+async def cached_page(
+    request: Request,
+    key: Hashable,
+    etag: str,
+    last_modified: Optional[datetime],
+    render: Callable,
+) -> Response:
+    """Serve a rendered HTML page, answering revalidations with 304.
+
+    `render` is an async callable returning the page body; it is only
+    awaited when neither the client nor this worker has the current version.
+    """
+    headers = cache_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    body = page_cache.get((key, etag))
+    if body is None:
+        body = await render()
+        page_cache.set((key, etag), body)
+    return HTMLResponse(body, headers=headers)
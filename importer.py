@@ -0,0 +1,182 @@
+import csv
+import json
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from sqlalchemy import insert
+
+from banners import adjust_banner_refs, discard_created_banner_files
+from catalog import bump_catalog_version
+from models import Video, extract_streamtape_id
+from related import index_videos
+from storage import BANNER_DIR, creation_stamp, store_banner_file
+from tags import add_video_tags
+
+# Bulk import configuration
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_BANNER_WORKERS = int(os.getenv("IMPORT_BANNER_WORKERS", "8"))
+
+
+def detect_format(filename: str) -> str:
+    """Guess the import format from a file name"""
+    return "csv" if filename.lower().endswith(".csv") else "jsonl"
+
+
+def read_records(stream: TextIO, fmt: str) -> Iterator[Dict]:
+    """Yield raw records from a JSONL or CSV text stream"""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {line_number}: invalid JSON ({e})")
+
+
+def normalize_record(record: Dict) -> Dict:
+    """Validate one raw record and map it onto Video columns.
+
+    `hashtags` may be a list or a comma-separated string. Raises ValueError
+    with a human readable reason when the record can't be imported.
+    """
+    title = (record.get("title") or "").strip()
+    if not title:
+        raise ValueError("title is required")
+    if len(title) > 255:
+        raise ValueError("title too long (max 255 characters)")
+
+    streamtape_url = (record.get("streamtape_url") or "").strip()
+    if "streamtape.com" not in streamtape_url:
+        raise ValueError("streamtape_url must contain 'streamtape.com'")
+
+    hashtags = record.get("hashtags") or ""
+    if isinstance(hashtags, (list, tuple)):
+        hashtags = ",".join(str(tag).strip() for tag in hashtags if str(tag).strip())
+
+    banner = (record.get("banner") or record.get("banner_path") or "").strip()
+    if not banner:
+        raise ValueError("banner is required")
+
+    return {
+        "title": title,
+        "description": (record.get("description") or "").strip() or None,
+        "hashtags": hashtags.strip() or None,
+        "streamtape_url": streamtape_url,
+        "streamtape_id": extract_streamtape_id(streamtape_url),
+        "banner_path": banner,
+    }
+
+
+def import_banner(source: str, banner_root: Optional[str] = None) -> Tuple[str, bool]:
+    """Store a local banner by content hash; returns (stored path, newly created).
+
+    Banners that already live in BANNER_DIR are referenced in place, and
+    images stored before share the existing file.
+    """
+    if Path(source).parent.resolve() == Path(BANNER_DIR).resolve() and os.path.exists(source):
+        return f"{BANNER_DIR}/{Path(source).name}", False
+    path = Path(banner_root, source) if banner_root and not os.path.isabs(source) else Path(source)
+    return store_banner_file(str(path))
+
+
+def _prepare_batch(
+    records: List[Dict],
+    pool: ThreadPoolExecutor,
+    banner_root: Optional[str],
+    errors: List[str],
+    offset: int,
+    copied: Dict[str, int],
+) -> List[Dict]:
+    """Validate a batch and copy its banners in parallel.
+
+    Invalid records are reported in `errors`; banner files this import
+    created are recorded in `copied` (path -> mtime) so a failed import can
+    remove them again.
+    """
+    rows = []
+    for index, record in enumerate(records, offset):
+        try:
+            rows.append((index, normalize_record(record)))
+        except ValueError as e:
+            errors.append(f"Record {index}: {e}")
+
+    futures = [pool.submit(import_banner, row["banner_path"], banner_root) for _, row in rows]
+    prepared = []
+    for (index, row), future in zip(rows, futures):
+        try:
+            stored, created = future.result()
+        except (OSError, ValueError) as e:
+            errors.append(f"Record {index}: banner {e}")
+            continue
+        copied.update(creation_stamp(stored, created))
+        row["banner_path"] = stored
+        prepared.append(row)
+    return prepared
+
+
+def import_videos(
+    session,
+    records: Iterable[Dict],
+    banner_root: Optional[str] = None,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    max_errors: int = 100,
+) -> Dict:
+    """Bulk insert videos in one transaction using batched executemany INSERTs.
+
+    Runs on a synchronous Session. The banners of each batch are stored in
+    parallel by a thread pool; nothing is committed unless the whole import
+    succeeds, and newly stored banners are removed again if it doesn't.
+    """
+    errors: List[str] = []
+    copied: Dict[str, int] = {}
+    imported_ids: List[int] = []
+    imported = 0
+    offset = 1
+
+    def insert_batch(batch: List[Dict]):
+        nonlocal imported, offset
+        offset += len(batch)
+        prepared = _prepare_batch(batch, pool, banner_root, errors, offset - len(batch), copied)
+        if len(errors) > max_errors:
+            raise ValueError(f"Too many invalid records ({len(errors)}), import aborted")
+        if prepared:
+            video_ids = session.execute(
+                insert(Video).returning(Video.id, sort_by_parameter_order=True), prepared
+            ).scalars().all()
+            add_video_tags(session.connection(), zip(video_ids, (row["hashtags"] for row in prepared)))
+            index_videos(session.connection(), [
+                (video_id, row["title"], row["hashtags"]) for video_id, row in zip(video_ids, prepared)
+            ], offer=False)
+            adjust_banner_refs(session.connection(), Counter(row["banner_path"] for row in prepared))
+            imported_ids.extend(video_ids)
+            imported += len(prepared)
+
+    try:
+        with ThreadPoolExecutor(max_workers=IMPORT_BANNER_WORKERS) as pool:
+            batch: List[Dict] = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    insert_batch(batch)
+                    batch = []
+            insert_batch(batch)
+
+        if imported:
+            # Core INSERTs bypass the ORM flush hook, so bump the version by hand
+            bump_catalog_version(session.connection(), changed=imported_ids)
+            session.info["catalog_changed"] = True
+        session.commit()
+    except Exception:
+        session.rollback()
+        # Shared, content-addressed files: only drop what nothing took up since
+        discard_created_banner_files(session.connection(), copied)
+        raise
+
+    return {"imported": imported, "errors": errors}
@@ -0,0 +1,353 @@
+import importlib
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, delete, event, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from metrics import instrument_engine, observe_job, set_jobs_due
+from models import Job
+
+# Only available on POSIX; without it every web worker runs jobs
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Where jobs run: "web" runs them in one web worker per host, elected with
+# JOB_LOCK_FILE (hosts where only the web service sees the static disk),
+# "external" leaves them to `python worker.py`
+JOB_RUNNER = os.getenv("JOB_RUNNER", "web")
+JOB_LOCK_FILE = os.getenv("JOB_LOCK_FILE", os.path.join(tempfile.gettempdir(), "streamhub-jobs.lock"))
+# How often the other web workers check whether the runner went away
+JOB_ELECTION_INTERVAL = float(os.getenv("JOB_ELECTION_INTERVAL", "5"))
+JOB_THREADS = int(os.getenv("JOB_THREADS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# Retry n waits about JOB_BACKOFF_SECONDS * 2**(n-1), capped
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "5"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "3600"))
+# A running job whose worker died is picked up again after this long
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "600"))
+# Finished jobs (and their idempotency keys) are kept this long
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+JOB_SHUTDOWN_TIMEOUT = float(os.getenv("JOB_SHUTDOWN_TIMEOUT", "10"))
+
+# Modules whose @job handlers a runner needs
+JOB_MODULES = ("banners",)
+
+# kind -> handler(payload); handlers must be safe to run more than once
+HANDLERS: Dict[str, Callable[[dict], None]] = {}
+
+# The runner of this process, woken when a local commit enqueued jobs
+_runner: Optional["JobRunner"] = None
+
+
+def job(kind: str):
+    """Register a function as the handler of a job kind"""
+    def register(handler: Callable[[dict], None]):
+        HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+def _job_values(kind: str, payload: Optional[dict], key: Optional[str], delay: float, max_attempts: int) -> dict:
+    now = datetime.utcnow()
+    return {
+        "kind": kind,
+        "payload": payload or {},
+        "status": "queued",
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "idempotency_key": key,
+        "run_at": now + timedelta(seconds=delay) if delay else now,
+        "created_at": now,
+    }
+
+
+def _insert_ignoring_duplicates(dialect_name: str, values: dict):
+    insert = pg_insert if dialect_name == "postgresql" else sqlite_insert
+    return insert(Job.__table__).values(**values).on_conflict_do_nothing(index_elements=["idempotency_key"])
+
+
+async def enqueue(db: AsyncSession, kind: str, payload: Optional[dict] = None, key: Optional[str] = None,
+                  delay: float = 0, max_attempts: int = JOB_MAX_ATTEMPTS):
+    """Add a job to the caller's transaction; it becomes visible when that commits.
+
+    Without a key this is a plain session add (no round trip); with one it
+    is an insert that does nothing while a queued or running job holds the
+    key. Finished jobs give their key up (see finish_job).
+    """
+    values = _job_values(kind, payload, key, delay, max_attempts)
+    if key is None:
+        db.add(Job(**values))
+    else:
+        await db.execute(_insert_ignoring_duplicates(db.bind.dialect.name, values))
+    db.sync_session.info["enqueued_jobs"] = True
+
+
+def enqueue_sync(connection, kind: str, payload: Optional[dict] = None, key: Optional[str] = None,
+                 delay: float = 0, max_attempts: int = JOB_MAX_ATTEMPTS):
+    """enqueue() for sync connections (scripts, imports, other jobs)"""
+    connection.execute(
+        _insert_ignoring_duplicates(connection.dialect.name, _job_values(kind, payload, key, delay, max_attempts))
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_runner(session):
+    if session.info.pop("enqueued_jobs", False) and _runner is not None:
+        _runner.wake.set()
+
+
+def _due(now: datetime):
+    return or_(
+        and_(Job.status == "queued", Job.run_at <= now),
+        and_(Job.status == "running", Job.locked_at < now - timedelta(seconds=JOB_LEASE_SECONDS)),
+    )
+
+
+def count_due(connection) -> int:
+    return connection.execute(select(func.count()).where(_due(datetime.utcnow()))).scalar()
+
+
+def claim_jobs(connection, worker_id: str, limit: int) -> List:
+    """Mark up to `limit` due jobs as running by `worker_id` and return them.
+
+    PostgreSQL skips rows other workers are claiming (FOR UPDATE SKIP
+    LOCKED); SQLite runs the statement under its single write lock.
+    """
+    now = datetime.utcnow()
+    ids = (
+        select(Job.id).where(_due(now)).order_by(Job.run_at, Job.id).limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return connection.execute(
+        update(Job)
+        .where(Job.id.in_(ids.scalar_subquery()))
+        .values(status="running", locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts, Job.run_at)
+    ).all()
+
+
+def backoff_seconds(attempts: int) -> float:
+    delay = min(JOB_BACKOFF_MAX_SECONDS, JOB_BACKOFF_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def finish_job(connection, job_id: int, worker_id: str, error: Optional[str] = None,
+               retry: bool = False, attempts: int = 0) -> str:
+    """Record a job's outcome; returns done, retry or failed.
+
+    Only the worker holding the job may finish it, so a run that outlived
+    its lease cannot overwrite the outcome of the run that replaced it.
+    Done and failed jobs drop their idempotency key, so the same work can
+    be enqueued again.
+    """
+    now = datetime.utcnow()
+    if error is None:
+        outcome, values = "done", {
+            "status": "done", "finished_at": now, "last_error": None, "idempotency_key": None
+        }
+    elif retry:
+        outcome, values = "retry", {
+            "status": "queued", "run_at": now + timedelta(seconds=backoff_seconds(attempts)), "last_error": error
+        }
+    else:
+        outcome, values = "failed", {
+            "status": "failed", "finished_at": now, "last_error": error, "idempotency_key": None
+        }
+    connection.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.locked_by == worker_id, Job.status == "running")
+        .values(locked_by=None, locked_at=None, **values)
+    )
+    return outcome
+
+
+def prune_jobs(connection, retention_hours: float = JOB_RETENTION_HOURS) -> int:
+    """Delete done jobs older than the retention window (failed ones stay for inspection)"""
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    # Jobs finished before keys were released on completion
+    connection.execute(
+        update(Job).where(Job.status.in_(("done", "failed")), Job.idempotency_key.is_not(None))
+        .values(idempotency_key=None)
+    )
+    return connection.execute(delete(Job).where(Job.status == "done", Job.finished_at < cutoff)).rowcount
+
+
+def job_counts(connection) -> Dict[str, int]:
+    return dict(connection.execute(select(Job.status, func.count()).group_by(Job.status)).all())
+
+
+def retry_failed_jobs(connection, kind: Optional[str] = None) -> int:
+    """Queue failed jobs again with a fresh set of attempts"""
+    stmt = update(Job).where(Job.status == "failed")
+    if kind:
+        stmt = stmt.where(Job.kind == kind)
+    return connection.execute(
+        stmt.values(status="queued", attempts=0, run_at=datetime.utcnow(), finished_at=None)
+    ).rowcount
+
+
+def load_handlers():
+    for module in JOB_MODULES:
+        importlib.import_module(module)
+
+
+class JobRunner:
+    """Claims due jobs and runs them on a thread pool until stopped.
+
+    `engine` claims and finishes jobs; `read_engine` (default: `engine`)
+    runs the due check, so idle polling never opens a write transaction.
+    With `elect` the runner first waits to hold JOB_LOCK_FILE, so one
+    process per host runs jobs.
+    """
+
+    def __init__(self, engine, threads: int = JOB_THREADS, name: Optional[str] = None,
+                 read_engine=None, elect: bool = False):
+        self.engine = engine
+        self.read_engine = read_engine or engine
+        self.elect = elect
+        self.threads = max(1, threads)
+        self.worker_id = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="job")
+        self._thread: Optional[threading.Thread] = None
+        self._lock_file = None
+
+    def run_job(self, row):
+        job_id, kind, payload, attempts, max_attempts, run_at = row
+        started = time.perf_counter()
+        waited = max(0.0, (datetime.utcnow() - run_at).total_seconds())
+        error = None
+        try:
+            handler = HANDLERS.get(kind)
+            if handler is None:
+                raise LookupError(f"no handler for job kind {kind!r}")
+            if attempts > max_attempts:
+                raise RuntimeError("lease expired on every attempt")
+            handler(payload)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=5)}"
+        try:
+            with self.engine.begin() as connection:
+                outcome = finish_job(
+                    connection, job_id, self.worker_id, error,
+                    retry=attempts < max_attempts and kind in HANDLERS, attempts=attempts
+                )
+        except Exception as e:
+            # The lease runs out and another worker retries it
+            print(f"⚠️  Could not record result of job {job_id}: {e}")
+            outcome = "lost"
+        if error:
+            print(f"⚠️  Job {job_id} ({kind}) attempt {attempts}/{max_attempts} failed: {error.splitlines()[0]}")
+        observe_job(kind, outcome, waited, time.perf_counter() - started)
+        with self._lock:
+            self.in_flight -= 1
+        self.wake.set()
+
+    def poll(self) -> int:
+        """Claim as many jobs as there are idle threads; returns how many started"""
+        with self._lock:
+            free = self.threads - self.in_flight
+        if free <= 0:
+            return 0
+        with self.read_engine.connect() as connection:
+            due = count_due(connection)
+        set_jobs_due(due)
+        if not due:
+            return 0
+        with self.engine.begin() as connection:
+            rows = claim_jobs(connection, self.worker_id, free)
+        with self._lock:
+            self.in_flight += len(rows)
+        for row in rows:
+            self._executor.submit(self.run_job, row)
+        return len(rows)
+
+    def wait_for_election(self) -> bool:
+        """Block until this process holds JOB_LOCK_FILE; False if stopped first.
+
+        The lock is released when the process exits, and another worker
+        takes over within JOB_ELECTION_INTERVAL.
+        """
+        if fcntl is None:
+            return not self.stopping.is_set()
+        self._lock_file = open(JOB_LOCK_FILE, "w")
+        while not self.stopping.is_set():
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                self.stopping.wait(JOB_ELECTION_INTERVAL)
+        return False
+
+    def run(self):
+        """Poll until stop(), sleeping between polls unless woken by a finished or new job"""
+        if self.elect:
+            if not self.wait_for_election():
+                return
+            print(f"👷 Job runner {self.worker_id} elected ({self.threads} thread(s))")
+        load_handlers()
+        last_prune = 0.0
+        while not self.stopping.is_set():
+            self.wake.clear()
+            try:
+                started = self.poll()
+                if time.monotonic() - last_prune > 3600:
+                    with self.engine.begin() as connection:
+                        prune_jobs(connection)
+                    last_prune = time.monotonic()
+            except Exception as e:
+                print(f"⚠️  Job poll failed: {e}")
+                started = 0
+            if not started:
+                self.wake.wait(JOB_POLL_INTERVAL)
+        self._executor.shutdown(wait=True)
+
+    def start(self):
+        """Run in a background thread of this process"""
+        global _runner
+        _runner = self
+        self._thread = threading.Thread(target=self.run, name="job-runner", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = JOB_SHUTDOWN_TIMEOUT):
+        """Stop claiming and wait up to `timeout` for running jobs; unfinished ones are retried after their lease"""
+        self.stopping.set()
+        self.wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def start_jobs() -> Optional[JobRunner]:
+    """Stand this web worker for election as the host's job runner, unless jobs run in worker.py"""
+    from database import create_job_engines
+
+    if JOB_RUNNER != "web":
+        return None
+    engine, read_engine = create_job_engines(JOB_THREADS)
+    instrument_engine(engine, "jobs")
+    runner = JobRunner(engine, read_engine=read_engine, elect=True)
+    runner.start()
+    return runner
+
+
+def stop_jobs():
+    if _runner is not None:
+        _runner.stop()
@@ -0,0 +1,261 @@
+import asyncio
+import os
+import random
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from catalog import bump_catalog_version
+from models import Video, VideoLink
+
+# httpx is only needed by the checker itself, not by the web workers
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Link checker configuration; point LINKCHECK_BASE_URL at a stub server to test
+LINKCHECK_BASE_URL = os.getenv("LINKCHECK_BASE_URL", "https://streamtape.com").rstrip("/")
+LINKCHECK_CONCURRENCY = int(os.getenv("LINKCHECK_CONCURRENCY", "16"))
+# Requests per second across all concurrent checks
+LINKCHECK_RATE = float(os.getenv("LINKCHECK_RATE", "20"))
+LINKCHECK_TIMEOUT = float(os.getenv("LINKCHECK_TIMEOUT", "10"))
+LINKCHECK_RETRIES = int(os.getenv("LINKCHECK_RETRIES", "3"))
+# Links are rechecked once their last check is older than this
+LINKCHECK_MAX_AGE_HOURS = float(os.getenv("LINKCHECK_MAX_AGE_HOURS", "24"))
+LINKCHECK_BATCH_SIZE = int(os.getenv("LINKCHECK_BATCH_SIZE", "200"))
+LINKCHECK_USER_AGENT = "StreamHub-LinkCheck/1.0"
+
+# Streamtape answers 200 with an error page for removed files
+NOT_FOUND_MARKERS = ("Video not found", "File was deleted", "file you are looking for is not found")
+STREAMTAPE_ID = re.compile(r"^[A-Za-z0-9_-]{4,100}$")
+META_TAG = re.compile(r"<meta\s+(?:name|property)=[\"']([^\"']+)[\"']\s+content=[\"']([^\"']*)[\"']", re.I)
+
+
+class RateLimiter:
+    """Token bucket shared by every check: `rate` requests/second, bursts up to `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait for a token; callers queue in order behind the lock"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Stop every check for `seconds` (the host asked us to back off)"""
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+def _retry_after(response) -> Optional[float]:
+    try:
+        return min(60.0, float(response.headers.get("retry-after", "")))
+    except ValueError:
+        return None
+
+
+def parse_embed_page(html: str) -> Dict[str, Optional[object]]:
+    """Duration and thumbnail from the embed page's meta tags"""
+    meta = {name.lower(): content for name, content in META_TAG.findall(html)}
+    duration = meta.get("og:video:duration") or meta.get("video:duration")
+    try:
+        duration = int(float(duration)) if duration else None
+    except ValueError:
+        duration = None
+    return {"duration_seconds": duration, "thumbnail_url": (meta.get("og:image") or None)}
+
+
+def _result(video_id: int, status: str, http_status: Optional[int] = None, error: Optional[str] = None, **meta):
+    return {
+        "video_id": video_id,
+        "status": status,
+        "http_status": http_status,
+        "duration_seconds": meta.get("duration_seconds"),
+        "thumbnail_url": (meta.get("thumbnail_url") or "")[:500] or None,
+        "error": error[:255] if error else None,
+        "checked_at": datetime.utcnow(),
+    }
+
+
+async def check_link(client, limiter: RateLimiter, video_id: int, streamtape_id: str,
+                     retries: int = LINKCHECK_RETRIES, base_url: str = LINKCHECK_BASE_URL) -> dict:
+    """Check one embed page, retrying timeouts, 429 and 5xx with jittered backoff.
+
+    404/410 or Streamtape's "not found" page are final: the video is broken.
+    Anything still failing after the retries is an error, not a verdict.
+    """
+    if not streamtape_id or not STREAMTAPE_ID.match(streamtape_id):
+        return _result(video_id, VideoLink.BROKEN, error="Malformed Streamtape URL")
+
+    url = f"{base_url}/e/{streamtape_id}/"
+    http_status, error = None, None
+    for attempt in range(retries + 1):
+        if attempt:
+            await asyncio.sleep(min(30.0, 0.5 * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+        await limiter.acquire()
+        try:
+            response = await client.get(url)
+        except httpx.HTTPError as e:
+            http_status, error = None, f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            continue
+
+        http_status = response.status_code
+        if http_status in (404, 410):
+            return _result(video_id, VideoLink.BROKEN, http_status, "Not found")
+        if http_status == 200:
+            if any(marker in response.text for marker in NOT_FOUND_MARKERS):
+                return _result(video_id, VideoLink.BROKEN, http_status, "Not found")
+            return _result(video_id, VideoLink.OK, http_status, **parse_embed_page(response.text))
+
+        error = f"HTTP {http_status}"
+        if http_status in (429, 503):
+            retry_after = _retry_after(response)
+            limiter.pause(1.0 if retry_after is None else retry_after)
+        elif http_status < 500:
+            break
+    return _result(video_id, VideoLink.ERROR, http_status, error)
+
+
+def due_statement(max_age_hours: float, limit: Optional[int] = None):
+    """Videos never checked, checked too long ago, or edited since their check"""
+    cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+    stmt = (
+        select(Video.id, Video.streamtape_id)
+        .outerjoin(VideoLink, VideoLink.video_id == Video.id)
+        .where(or_(
+            VideoLink.checked_at.is_(None),
+            VideoLink.checked_at < cutoff,
+            VideoLink.checked_at < Video.updated_at,
+        ))
+        .order_by(VideoLink.checked_at.is_(None).desc(), VideoLink.checked_at, Video.id)
+    )
+    return stmt.limit(limit) if limit else stmt
+
+
+def save_results(connection, results: List[dict]) -> int:
+    """Upsert check results; returns how many videos became hidden or visible.
+
+    Bumps the catalog version when visibility changes, so the web workers
+    drop their cached listings. Results for videos deleted meanwhile are dropped.
+    """
+    ids = [result["video_id"] for result in results]
+    existing = set(connection.execute(select(Video.id).where(Video.id.in_(ids))).scalars())
+    previous = {
+        video_id: (status, failures)
+        for video_id, status, failures in connection.execute(
+            select(VideoLink.video_id, VideoLink.status, VideoLink.failures).where(VideoLink.video_id.in_(ids))
+        )
+    }
+    rows, changed = [], []
+    for result in results:
+        if result["video_id"] not in existing:
+            continue
+        old_status, failures = previous.get(result["video_id"], (None, 0))
+        status = result["status"]
+        if status == VideoLink.ERROR:
+            # An error is not a verdict: keep the last known one, count the failure
+            rows.append({**result, "status": old_status or status, "failures": failures + 1})
+            continue
+        rows.append({**result, "failures": 0})
+        if (old_status == VideoLink.BROKEN) != (status == VideoLink.BROKEN):
+            changed.append(result["video_id"])
+    if not rows:
+        return 0
+
+    insert = pg_insert if connection.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(VideoLink.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["video_id"],
+        set_={column: stmt.excluded[column] for column in rows[0] if column != "video_id"},
+    )
+    connection.execute(stmt, rows)
+    if changed:
+        # Hidden videos leave the change feed's listing like deleted ones
+        bump_catalog_version(connection, changed=changed)
+    return len(changed)
+
+
+async def check_links(
+    engine,
+    limit: Optional[int] = None,
+    max_age_hours: float = LINKCHECK_MAX_AGE_HOURS,
+    concurrency: int = LINKCHECK_CONCURRENCY,
+    rate: float = LINKCHECK_RATE,
+    base_url: str = LINKCHECK_BASE_URL,
+) -> Counter:
+    """Check every due link once; returns counts by status plus 'changed'.
+
+    A fixed set of `concurrency` tasks shares one pooled HTTP client and one
+    rate limiter, and results are written in batches of LINKCHECK_BATCH_SIZE.
+    """
+    if httpx is None:
+        raise RuntimeError("httpx is not installed")
+    async with engine.connect() as connection:
+        due: Iterable[Tuple[int, str]] = iter((await connection.execute(due_statement(max_age_hours, limit))).all())
+
+    totals: Counter = Counter()
+    pending: List[dict] = []
+    limiter = RateLimiter(rate)
+
+    async def flush():
+        batch = pending[:]
+        pending.clear()
+        if batch:
+            async with engine.begin() as connection:
+                totals["changed"] += await connection.run_sync(save_results, batch)
+
+    async def worker(client):
+        for video_id, streamtape_id in due:
+            result = await check_link(client, limiter, video_id, streamtape_id, base_url=base_url)
+            totals[result["status"]] += 1
+            pending.append(result)
+            if len(pending) >= LINKCHECK_BATCH_SIZE:
+                await flush()
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(
+        timeout=LINKCHECK_TIMEOUT, limits=limits, follow_redirects=True,
+        headers={"User-Agent": LINKCHECK_USER_AGENT}
+    ) as client:
+        await asyncio.gather(*(worker(client) for _ in range(max(1, concurrency))))
+    await flush()
+    return totals
+
+
+async def get_link_statuses(db: AsyncSession, video_ids: Iterable[int]) -> Dict[int, str]:
+    """Last known link status of each given video (unchecked videos are absent)"""
+    video_ids = list(video_ids)
+    if not video_ids:
+        return {}
+    rows = await db.execute(
+        select(VideoLink.video_id, VideoLink.status).where(VideoLink.video_id.in_(video_ids))
+    )
+    return dict(rows.all())
+
+
+async def count_broken_links(db: AsyncSession) -> int:
+    """Number of videos whose link is known to be broken"""
+    return (await db.execute(
+        select(func.count()).select_from(VideoLink).where(VideoLink.status == VideoLink.BROKEN)
+    )).scalar_one()
@@ -1,43 +1,132 @@
+import io
 import os
-import uuid
-import aiofiles
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
 
-from fastapi import FastAPI, Request, Form, File, UploadFile, HTTPException, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, Form, File, UploadFile, HTTPException, Depends, Query
+from fastapi import Path as PathParam
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import (
+    FileResponse, HTMLResponse, RedirectResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+)
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from admission import AdmissionMiddleware
+from metrics import (
+    CONTENT_TYPE_LATEST, METRICS_ENABLED, MetricsMiddleware, instrument_engine,
+    instrument_templates, observe_checkout, render_metrics
+)
+from static_files import mount_static
 
 # Import database and models with error handling
 try:
-    from database import SessionLocal, engine, init_db
-    from models import Base, Video
+    from database import (
+        READ_REPLICA, READ_YOUR_WRITES_SECONDS, AsyncReadSessionLocal, AsyncSessionLocal, SessionLocal,
+        async_engine, async_read_engine, dispose_inherited_engines, engine, init_db
+    )
+    from models import Base, Video, VideoLink, extract_streamtape_id
+    from catalog import (
+        count_videos, get_catalog_version, get_tag, get_tag_stats, get_video_page, get_video_rows,
+        stream_video_rows, video_exists
+    )
+    import tags  # registers the flush hooks that keep video_tags in sync
+    from banners import discard_created_banners  # and banner_files.ref_count
+    from http_cache import cached_page, http_date, is_not_modified, make_etag
+    from storage import UploadLimitMiddleware, save_uploaded_file
+    from jobs import enqueue, start_jobs, stop_jobs
+    from templating import TEMPLATE_DIR, configure_environment
+    from importer import detect_format, import_videos, read_records
+    from linkcheck import count_broken_links, get_link_statuses
+    from related import RELATED_K, get_related_videos
+    from search import MAX_SEARCH_PAGES, search_videos
+    from sitemap import SITEMAP_MAX_AGE, SITE_URL, ensure_sitemaps, prebuilt_file, schedule_refresh
+    from changes import (
+        CHANGES_MAX_PAGE_SIZE, CHANGES_PAGE_SIZE, SSE_MEDIA_TYPE, change_fields, check_token,
+        stream_changes, wait_for_changes
+    )
+    from analytics import (
+        SORT_ORDERS, get_ranked_page, ranking_bucket, record_view, record_watch,
+        start_analytics, stop_analytics
+    )
+    from pagination import API_MAX_PAGE_SIZE, clamp_limit, encode_cursor
+    from serializers import (
+        NDJSON_MEDIA_TYPE, FastJSONResponse, dumps, ndjson_lines, parse_fields, project,
+        video_columns, wants_ndjson
+    )
     
-    # Initialize database automatically
-    init_db()
-    print("✅ Database initialized successfully")
+    # Query count/time and pool usage for the request and script engines
+    instrument_engine(async_engine.sync_engine, "async")
+    if async_read_engine is not async_engine:
+        instrument_engine(async_read_engine.sync_engine, "read")
+    instrument_engine(engine, "sync")
 except Exception as e:
     print(f"❌ Database initialization error: {e}")
     # Create fallback database setup
     from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
     from sqlalchemy.ext.declarative import declarative_base
     from sqlalchemy.orm import sessionmaker
     
     engine = create_engine("sqlite:///./streamhub.db", connect_args={"check_same_thread": False})
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    AsyncSessionLocal = async_sessionmaker(
+        create_async_engine("sqlite+aiosqlite:///./streamhub.db"), expire_on_commit=False
+    )
+    AsyncReadSessionLocal = AsyncSessionLocal
+    READ_REPLICA = False
     Base = declarative_base()
 
+# Schema changes run through `manage.py migrate`; set to run them at worker startup instead
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false").lower() == "true"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-worker startup and shutdown.
+
+    Runs after gunicorn forks, so nothing here is shared with the master.
+    """
+    start = time.perf_counter()
+    # Never reuse pooled connections inherited from a preloading master
+    dispose_inherited_engines()
+    create_directories()
+    if AUTO_MIGRATE:
+        await run_in_threadpool(init_db)
+    # Start batched analytics flushing for this worker
+    start_analytics(async_engine)
+    # Run background jobs here unless a separate worker.py does
+    start_jobs()
+    database_type = "SQLite" if "sqlite://" in os.getenv("DATABASE_URL", "sqlite://") else "PostgreSQL"
+    print(
+        f"🚀 StreamHub worker {os.getpid()} ready in {(time.perf_counter() - start) * 1000:.0f}ms "
+        f"({database_type}, {os.getenv('RENDER_SERVICE_NAME', 'development')})"
+    )
+    yield
+    await run_in_threadpool(stop_jobs)
+    await stop_analytics(async_engine)
+    await async_engine.dispose()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="StreamHub - Video Streaming Platform",
     description="A complete video streaming platform with admin management and Streamtape integration",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+# Oversized banner uploads get a 413 while the body arrives, not after it was spooled
+app.add_middleware(UploadLimitMiddleware)
+# Early 503s beyond per-route concurrency and per-client rate limits on the
+# listing APIs; added first so the metrics middleware still counts them
+app.add_middleware(AdmissionMiddleware)
+# Per-route latency, status and DB work, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Create directories function
 def create_directories():
     """Create necessary directories if they don't exist"""
@@ -45,78 +134,78 @@ def create_directories():
     for directory in directories:
         try:
             Path(directory).mkdir(parents=True, exist_ok=True)
-            print(f"✅ Created directory: {directory}")
         except Exception as e:
             print(f"⚠️  Could not create directory {directory}: {e}")
 
-# Create directories on startup
-create_directories()
-
-# Mount static files with error handling
+# Mount static files with error handling (directories are created at startup);
+# content-addressed files are cached for a year, and STATIC_URL/SERVE_STATIC
+# move them to a CDN or a separate static process
 try:
-    app.mount("/static", StaticFiles(directory="static"), name="static")
-    print("✅ Static files mounted")
+    mount_static(app)
 except Exception as e:
     print(f"⚠️  Static files mount error: {e}")
 
-# Initialize Jinja2 templates with error handling
+# Initialize Jinja2 templates with error handling (templates compile lazily from the bytecode cache)
 try:
-    templates = Jinja2Templates(directory="templates")
-    print("✅ Templates initialized")
+    templates = Jinja2Templates(directory=TEMPLATE_DIR)
+    configure_environment(templates.env)
+    instrument_templates(templates.env)
 except Exception as e:
     print(f"⚠️  Templates initialization error: {e}")
     templates = None
 
-# Database dependency
-def get_db():
-    """Get database session"""
-    db = SessionLocal()
+# Clients that wrote within READ_YOUR_WRITES_SECONDS read from the primary
+READ_YOUR_WRITES_COOKIE = "streamhub_primary"
+
+def pin_to_primary(response: Response) -> Response:
+    """Route this client's reads to the primary until replicas have its write"""
+    if READ_REPLICA:
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE,
+            str(int(time.time()) + READ_YOUR_WRITES_SECONDS),
+            max_age=READ_YOUR_WRITES_SECONDS,
+            httponly=True,
+            samesite="lax"
+        )
+    return response
+
+def reads_from_primary(request: Request) -> bool:
+    """True while the client's read-your-writes cookie is fresh"""
+    if not READ_REPLICA:
+        return False
     try:
+        return int(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def read_session(request: Request):
+    """Open a session on the replica, or on the primary for a client that just wrote"""
+    if reads_from_primary(request):
+        db = AsyncSessionLocal()
+        db.info["read_your_writes"] = True
+        return db
+    return AsyncReadSessionLocal()
+
+# Database dependencies
+async def get_read_db(request: Request):
+    """Get async database session for read-only handlers (read pool or replica)"""
+    async with read_session(request) as db:
+        # Acquire the connection up front so pool waits are measured per request
+        start = time.perf_counter()
+        await db.connection()
+        observe_checkout(time.perf_counter() - start)
         yield db
-    finally:
-        db.close()
 
-# Utility functions
-def extract_streamtape_id(url: str) -> str:
-    """Extract video ID from Streamtape URL"""
-    try:
-        if '/e/' in url:
-            return url.split('/e/')[-1].split('/')[0]
-        else:
-            return url.split('/')[-1].replace('/', '')
-    except Exception:
-        return "invalid_id"
-
-async def save_uploaded_file(file: UploadFile) -> str:
-    """Save uploaded file using aiofiles and return path"""
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No file provided")
-    
-    if not file.content_type or not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="Only image files are allowed")
-    
-    # Generate unique filename
-    file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
-    filename = f"{uuid.uuid4()}.{file_extension}"
-    file_path = f"static/banners/{filename}"
+async def get_write_db():
+    """Get async database session for handlers that write.
     
-    # Save file using aiofiles
-    try:
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        return file_path
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
-
-def delete_file_safely(file_path: str):
-    """Safely delete file if it exists"""
-    try:
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
-    except Exception:
-        pass
+    The connection (and, in the SQLite production profile, the single
+    writer and its BEGIN IMMEDIATE lock) is only taken at first use.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
 
+# Utility functions
 def validate_form_input(title: str, streamtape_url: str):
     """Validate form inputs"""
     if not title or len(title.strip()) == 0:
@@ -136,8 +225,15 @@ async def test_route():
 
 # Main routes with fallback handling
 @app.get("/", response_class=HTMLResponse)
-async def homepage(request: Request, db: Session = Depends(get_db)):
-    """Homepage showing all videos in grid layout"""
+async def homepage(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    sort: str = "latest",
+    page: int = Query(1, ge=1),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Homepage showing one page of videos in grid layout"""
     try:
         if templates is None:
             return HTMLResponse("""
@@ -151,17 +247,51 @@ async def homepage(request: Request, db: Session = Depends(get_db)):
             </body></html>
             """)
         
-        # Try to get videos from database
+        limit = clamp_limit(limit)
+        
+        # Try to get the catalog version from database
         try:
-            videos = db.query(Video).order_by(Video.created_at.desc()).all()
+            version, last_modified = await get_catalog_version(db)
         except Exception as e:
             print(f"Database query error: {e}")
-            videos = []
+            return templates.TemplateResponse(request, "index.html", {
+                "videos": [],
+                "next_cursor": None,
+                "limit": limit,
+                "total_videos": 0
+            })
         
-        return templates.TemplateResponse("index.html", {
-            "request": request,
-            "videos": videos
-        })
+        if sort not in SORT_ORDERS:
+            sort = "latest"
+        
+        async def render():
+            next_cursor = next_page = None
+            if sort == "latest":
+                videos, next_cursor = await get_video_page(db, cursor, limit)
+            else:
+                videos, has_more = await get_ranked_page(db, sort, page, limit)
+                next_page = page + 1 if has_more else None
+            total_videos = await count_videos(db)
+            return templates.TemplateResponse(request, "index.html", {
+                "videos": videos,
+                "next_cursor": next_cursor,
+                "next_page": next_page,
+                "sort": sort,
+                "limit": limit,
+                "total_videos": total_videos
+            }).body
+        
+        if sort == "latest":
+            key = ("index", cursor, limit)
+            etag = make_etag("index", version, cursor, limit)
+        else:
+            # Rankings move with views, not with catalog writes
+            key = ("index", sort, page, limit)
+            etag = make_etag("index", sort, version, ranking_bucket(), page, limit)
+            last_modified = None
+        return await cached_page(request, key, etag, last_modified, render)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Homepage error: {e}")
         return HTMLResponse(f"""
@@ -175,9 +305,43 @@ async def homepage(request: Request, db: Session = Depends(get_db)):
         </body></html>
         """)
 
+@app.get("/tag/{name}", response_class=HTMLResponse)
+async def tag_page(
+    request: Request,
+    name: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Videos carrying a single tag, newest first"""
+    limit = clamp_limit(limit)
+    version, last_modified = await get_catalog_version(db)
+    tag = await get_tag(db, name)
+    if not tag or not tag.video_count:
+        raise HTTPException(status_code=404, detail="Tag not found")
+    
+    async def render():
+        videos, next_cursor = await get_video_page(db, cursor, limit, tag=tag)
+        return templates.TemplateResponse(request, "index.html", {
+            "videos": videos,
+            "next_cursor": next_cursor,
+            "limit": limit,
+            "total_videos": tag.video_count,
+            "tag": tag,
+            "page_url": f"/tag/{tag.name}"
+        }).body
+    
+    etag = make_etag("tag", tag.id, version, cursor, limit)
+    return await cached_page(request, ("tag", tag.id, cursor, limit), etag, last_modified, render)
+
 @app.get("/admin", response_class=HTMLResponse)
-async def admin_panel(request: Request, db: Session = Depends(get_db)):
-    """Admin panel for managing videos"""
+async def admin_panel(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Admin panel for managing one page of videos"""
     try:
         if templates is None:
             return HTMLResponse("""
@@ -189,16 +353,34 @@ async def admin_panel(request: Request, db: Session = Depends(get_db)):
             </body></html>
             """)
         
+        limit = clamp_limit(limit)
+        
         try:
-            videos = db.query(Video).order_by(Video.created_at.desc()).all()
+            videos, next_cursor = await get_video_page(db, cursor, limit, include_broken=True)
+            total_videos = await count_videos(db, include_broken=True)
+            total_tags, top_tags = await get_tag_stats(db)
+            link_statuses = await get_link_statuses(db, [video.id for video in videos])
+            broken_links = await count_broken_links(db)
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"Database query error: {e}")
-            videos = []
+            videos, next_cursor, total_videos = [], None, 0
+            total_tags, top_tags = 0, []
+            link_statuses, broken_links = {}, 0
         
-        return templates.TemplateResponse("admin.html", {
-            "request": request,
-            "videos": videos
+        return templates.TemplateResponse(request, "admin.html", {
+            "videos": videos,
+            "next_cursor": next_cursor,
+            "limit": limit,
+            "total_videos": total_videos,
+            "total_tags": total_tags,
+            "top_tags": top_tags,
+            "link_statuses": link_statuses,
+            "broken_links": broken_links
         })
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Admin panel error: {e}")
         return HTMLResponse(f"""
@@ -210,8 +392,163 @@ async def admin_panel(request: Request, db: Session = Depends(get_db)):
         </body></html>
         """)
 
+@app.get("/search", response_class=HTMLResponse)
+async def search_page(
+    request: Request,
+    q: str = "",
+    page: int = Query(1, ge=1),
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Full-text search over titles, descriptions and hashtags"""
+    limit = clamp_limit(limit)
+    page = min(page, MAX_SEARCH_PAGES)
+    videos, has_more = await search_videos(db, q, page, limit)
+    
+    return templates.TemplateResponse(request, "search.html", {
+        "query": q.strip(),
+        "videos": videos,
+        "page": page,
+        "limit": limit,
+        "has_more": has_more
+    })
+
+# Admin write routes
+@app.post("/admin/upload")
+async def upload_video(
+    title: str = Form(...),
+    streamtape_url: str = Form(...),
+    description: Optional[str] = Form(None),
+    hashtags: Optional[str] = Form(None),
+    banner: UploadFile = File(...),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """Create a new video from the admin upload form"""
+    validate_form_input(title, streamtape_url)
+    banner_path, created = await save_uploaded_file(banner)
+    
+    try:
+        video = Video(
+            title=title.strip(),
+            description=(description or "").strip() or None,
+            hashtags=(hashtags or "").strip() or None,
+            streamtape_url=streamtape_url.strip(),
+            streamtape_id=extract_streamtape_id(streamtape_url.strip()),
+            banner_path=banner_path
+        )
+        db.add(video)
+        await enqueue(db, "thumbnails", {"banner_path": banner_path}, key=f"thumbnails:{banner_path}")
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        await discard_created_banners(db, created)
+        raise HTTPException(status_code=500, detail=f"Failed to save video: {str(e)}")
+    
+    schedule_refresh()
+    return pin_to_primary(RedirectResponse(url="/admin", status_code=303))
+
+@app.get("/admin/edit/{video_id}", response_class=HTMLResponse)
+async def edit_video_form(request: Request, video_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Edit form for a single video"""
+    video = await db.get(Video, video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    return templates.TemplateResponse(request, "edit.html", {
+        "video": video
+    })
+
+@app.post("/admin/edit/{video_id}")
+async def edit_video(
+    video_id: int,
+    title: str = Form(...),
+    streamtape_url: str = Form(...),
+    description: Optional[str] = Form(None),
+    hashtags: Optional[str] = Form(None),
+    banner: Optional[UploadFile] = File(None),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """Update a video, optionally replacing its banner"""
+    validate_form_input(title, streamtape_url)
+    video = await db.get(Video, video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    # Browsers submit an empty file part when no new banner was chosen
+    new_banner, created = await save_uploaded_file(banner) if banner and banner.filename else (None, {})
+    old_banner = video.banner_path
+    
+    try:
+        video.title = title.strip()
+        video.description = (description or "").strip() or None
+        video.hashtags = (hashtags or "").strip() or None
+        video.streamtape_url = streamtape_url.strip()
+        video.streamtape_id = extract_streamtape_id(streamtape_url.strip())
+        if new_banner and new_banner != old_banner:
+            video.banner_path = new_banner
+            # Other videos may share the old banner; it goes once nothing uses it
+            await enqueue(db, "release_banners", {"paths": [old_banner]})
+            await enqueue(db, "thumbnails", {"banner_path": new_banner}, key=f"thumbnails:{new_banner}")
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        await discard_created_banners(db, created)
+        raise HTTPException(status_code=500, detail=f"Failed to update video: {str(e)}")
+    
+    schedule_refresh()
+    return pin_to_primary(RedirectResponse(url="/admin", status_code=303))
+
+@app.post("/admin/delete/{video_id}")
+async def delete_video(video_id: int, db: AsyncSession = Depends(get_write_db)):
+    """Delete a video and its banner"""
+    video = await db.get(Video, video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    try:
+        await enqueue(db, "release_banners", {"paths": [video.banner_path]})
+        await db.delete(video)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to delete video: {str(e)}")
+    
+    schedule_refresh()
+    return pin_to_primary(RedirectResponse(url="/admin", status_code=303))
+
+@app.post("/admin/import")
+async def bulk_import(
+    response: Response,
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None)
+):
+    """Bulk import videos from a JSONL or CSV file in a single transaction"""
+    fmt = format or detect_format(file.filename or "")
+    if fmt not in ("jsonl", "csv"):
+        raise HTTPException(status_code=400, detail="Format must be 'jsonl' or 'csv'")
+    
+    def run_import():
+        stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        db = SessionLocal()
+        try:
+            return import_videos(db, read_records(stream, fmt))
+        finally:
+            db.close()
+    
+    # The import uses the sync engine, so keep it off the event loop
+    try:
+        result = await run_in_threadpool(run_import)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
+    
+    pin_to_primary(response)
+    schedule_refresh()
+    return {"status": "success", **result}
+
 @app.get("/watch/{video_id}", response_class=HTMLResponse)
-async def watch_video(request: Request, video_id: int, db: Session = Depends(get_db)):
+async def watch_video(request: Request, video_id: int, db: AsyncSession = Depends(get_read_db)):
     """Individual video page with Streamtape embed"""
     try:
         if templates is None:
@@ -224,19 +561,37 @@ async def watch_video(request: Request, video_id: int, db: Session = Depends(get
             </body></html>
             """)
         
+        # Probe only updated_at and link status so revalidations never load the full row
         try:
-            video = db.query(Video).filter(Video.id == video_id).first()
+            row = (await db.execute(
+                select(Video.updated_at, VideoLink.status)
+                .outerjoin(VideoLink, VideoLink.video_id == Video.id)
+                .where(Video.id == video_id)
+            )).first()
         except Exception as e:
             print(f"Database query error: {e}")
-            video = None
+            row = None
         
-        if not video:
+        if not row:
             raise HTTPException(status_code=404, detail="Video not found")
         
-        return templates.TemplateResponse("watch.html", {
-            "request": request,
-            "video": video
-        })
+        # watch.html embeds absolute og:image URLs and is cached publicly, so use
+        # the configured SITE_URL over the Host header; without it the host is
+        # part of the key. The catalog version covers the related rail
+        base_url = SITE_URL or str(request.base_url)
+        
+        async def render():
+            video = await db.get(Video, video_id)
+            return templates.TemplateResponse(request, "watch.html", {
+                "video": video,
+                "link_status": row.status,
+                "related": await get_related_videos(db, video_id),
+                "base_url": base_url
+            }).body
+        
+        version, _ = await get_catalog_version(db)
+        etag = make_etag("watch", video_id, row.updated_at, row.status, version, base_url)
+        return await cached_page(request, ("watch", video_id, base_url), etag, row.updated_at, render)
     except HTTPException:
         raise
     except Exception as e:
@@ -251,26 +606,221 @@ async def watch_video(request: Request, video_id: int, db: Session = Depends(get
         """)
 
 # API endpoints
+async def stream_videos_ndjson(request: Request, cursor: Optional[str], limit: int, names, tag):
+    """Stream one keyset page as NDJSON, ending with a {"next_cursor": ...} line"""
+    # The request's session is gone once streaming starts, so use our own
+    async with read_session(request) as db:
+        fetched, last = 0, None
+        async for chunk in stream_video_rows(db, cursor, limit, video_columns(names), tag=tag):
+            rows = chunk[:max(0, limit - fetched)]
+            fetched += len(chunk)
+            if rows:
+                last = rows[-1]
+                yield ndjson_lines(rows, names)
+    next_cursor = encode_cursor(last.created_at, last.id) if fetched > limit else None
+    yield dumps({"next_cursor": next_cursor}) + b"\n"
+
 @app.get("/api/videos")
-async def get_videos_api(db: Session = Depends(get_db)):
-    """API endpoint to get all videos as JSON"""
+async def get_videos_api(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    tag: Optional[str] = None,
+    sort: str = Query("latest", pattern="^(latest|popular|trending)$"),
+    page: int = Query(1, ge=1),
+    fields: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """API endpoint to get one page of videos as JSON.
+    
+    `tag` filters the latest-first listing; `sort=popular|trending` returns
+    page-numbered rankings instead. `fields=id,title,...` picks the columns
+    returned. Latest-first pages may hold up to API_MAX_PAGE_SIZE videos;
+    `format=ndjson` (or Accept: application/x-ndjson) streams them one per line.
+    """
+    names = parse_fields(fields)
     try:
-        videos = db.query(Video).order_by(Video.created_at.desc()).all()
-        return {
+        next_cursor = next_page = None
+        if sort != "latest":
+            limit = clamp_limit(limit)
+            videos, has_more = await get_ranked_page(db, sort, page, limit)
+            next_page = page + 1 if has_more else None
+            if wants_ndjson(request, format):
+                body = ndjson_lines(videos, names) + dumps({"next_page": next_page}) + b"\n"
+                return Response(body, media_type=NDJSON_MEDIA_TYPE)
+        else:
+            limit = clamp_limit(limit, API_MAX_PAGE_SIZE)
+            tag_row = await get_tag(db, tag) if tag else None
+            if tag and not tag_row:
+                return FastJSONResponse({"status": "success", "count": 0, "next_cursor": None, "videos": []})
+            if wants_ndjson(request, format):
+                return StreamingResponse(
+                    stream_videos_ndjson(request, cursor, limit, names, tag_row), media_type=NDJSON_MEDIA_TYPE
+                )
+            videos, next_cursor = await get_video_rows(db, cursor, limit, video_columns(names), tag=tag_row)
+        return FastJSONResponse({
             "status": "success",
             "count": len(videos),
-            "videos": [
-                {
-                    "id": video.id,
-                    "title": video.title,
-                    "description": video.description,
-                    "created_at": video.created_at.isoformat(),
-                }
-                for video in videos
-            ]
-        }
+            "next_cursor": next_cursor,
+            "next_page": next_page,
+            "videos": project(videos, names)
+        })
+    except HTTPException:
+        raise
     except Exception as e:
-        return {"status": "error", "message": str(e), "videos": []}
+        return FastJSONResponse({"status": "error", "message": str(e), "videos": []})
+
+@app.get("/api/videos/changes")
+async def video_changes_api(
+    request: Request,
+    since: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    wait: float = Query(0, ge=0),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Videos created, updated or deleted after the change token `since`.
+    
+    Start without `since` for a full sync, then pass back `next_token`
+    (repeat while `has_more`). `wait=N` long-polls up to N seconds for the
+    next change; Accept: text/event-stream streams changes as they commit,
+    resuming from Last-Event-ID. A 410 means the token is too old: sync again.
+    """
+    names = change_fields(fields)
+    limit = min(limit or CHANGES_PAGE_SIZE, CHANGES_MAX_PAGE_SIZE)
+    if SSE_MEDIA_TYPE in request.headers.get("accept", ""):
+        position = await check_token(db, since or request.headers.get("last-event-id"))
+        return StreamingResponse(
+            stream_changes(lambda: read_session(request), position, limit, names),
+            media_type=SSE_MEDIA_TYPE,
+            headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+        )
+    position = await check_token(db, since)
+    page = await wait_for_changes(db, position, limit, names, wait)
+    return FastJSONResponse(page, headers={"Cache-Control": "no-store"})
+
+@app.get("/api/videos/{video_id}/related")
+async def related_videos_api(
+    video_id: int,
+    limit: int = Query(RELATED_K, ge=1, le=RELATED_K),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Precomputed related videos of one video, best match first"""
+    names = parse_fields(fields)
+    videos = await get_related_videos(db, video_id, limit)
+    if not videos and await db.get(Video, video_id) is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return FastJSONResponse({
+        "status": "success",
+        "video_id": video_id,
+        "count": len(videos),
+        "videos": project(videos, names)
+    })
+
+@app.get("/api/search")
+async def search_api(
+    q: str,
+    page: int = Query(1, ge=1),
+    limit: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """API endpoint for ranked full-text search"""
+    limit = clamp_limit(limit)
+    page = min(page, MAX_SEARCH_PAGES)
+    videos, has_more = await search_videos(db, q, page, limit)
+    return FastJSONResponse({
+        "status": "success",
+        "query": q.strip(),
+        "page": page,
+        "next_page": page + 1 if has_more and page < MAX_SEARCH_PAGES else None,
+        "count": len(videos),
+        "videos": [
+            {
+                "id": video.id,
+                "title": video.title,
+                "description": video.description,
+                "hashtags": video.hashtag_list,
+                "created_at": video.created_at.isoformat(),
+            }
+            for video in videos
+        ]
+    })
+
+@app.post("/api/videos/{video_id}/events", status_code=204)
+async def record_video_event(
+    video_id: int,
+    type: str = Query(..., pattern="^(view|watch)$"),
+    seconds: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Record a view or a watch-time heartbeat (batched, never written inline)"""
+    # Unknown ids would grow the in-memory counters until the next flush
+    if not await video_exists(db, video_id):
+        raise HTTPException(status_code=404, detail="Video not found")
+    if type == "view":
+        record_view(video_id)
+    else:
+        record_watch(video_id, seconds)
+    return Response(status_code=204)
+
+# Sitemaps and feeds: prebuilt files, refreshed per changed shard after writes
+async def serve_prebuilt(request: Request, name: str, media_type: str, db: AsyncSession) -> Response:
+    """Send a prebuilt sitemap/feed file, answering revalidations with 304"""
+    version, _ = await get_catalog_version(db)
+    enabled = await ensure_sitemaps(version)
+    found = prebuilt_file(name, request.headers.get("accept-encoding", "")) if enabled else None
+    if found is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    path, encoding, modified = found
+    etag = make_etag(name, encoding, modified.timestamp())
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(modified),
+        "Cache-Control": f"public, max-age={SITEMAP_MAX_AGE}",
+        "Vary": "Accept-Encoding",
+    }
+    if is_not_modified(request, etag, modified):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+@app.get("/sitemap.xml", include_in_schema=False)
+async def sitemap_xml(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """Sitemap of every listed video, or the index of its shards past SITEMAP_SHARD_SIZE"""
+    return await serve_prebuilt(request, "sitemap.xml", "application/xml", db)
+
+@app.get("/sitemaps/{name}", include_in_schema=False)
+async def sitemap_shard(request: Request, name: str = PathParam(..., pattern=r"^sitemap-\d+\.xml$"),
+                        db: AsyncSession = Depends(get_read_db)):
+    """One shard of the sitemap index"""
+    return await serve_prebuilt(request, name, "application/xml", db)
+
+@app.get("/feed.xml", include_in_schema=False)
+async def rss_feed(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """RSS 2.0 feed of the newest videos"""
+    return await serve_prebuilt(request, "feed.xml", "application/rss+xml", db)
+
+@app.get("/atom.xml", include_in_schema=False)
+async def atom_feed(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """Atom feed of the newest videos"""
+    return await serve_prebuilt(request, "atom.xml", "application/atom+xml", db)
+
+@app.get("/robots.txt", include_in_schema=False)
+async def robots_txt():
+    """Point crawlers at the sitemap and away from the admin pages"""
+    sitemap = f"Sitemap: {SITE_URL}/sitemap.xml\n" if SITE_URL else ""
+    return PlainTextResponse(f"User-agent: *\nDisallow: /admin\n{sitemap}")
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus metrics aggregated across all workers"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    # Multiprocess mode reads one file per worker; keep that off the event loop
+    return Response(await run_in_threadpool(render_metrics), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/health")
 async def health_check():
@@ -282,6 +832,7 @@ async def health_check():
             "service": "StreamHub Video Platform",
             "version": "1.0.0",
             "database": database_type,
+            "read_replica": READ_REPLICA,
             "environment": os.getenv("RENDER_SERVICE_NAME", "development"),
             "templates": "loaded" if templates else "missing",
             "directories": {
@@ -318,39 +869,12 @@ async def server_error_handler(request: Request, exc: HTTPException):
     </body></html>
     """, status_code=500)
 
-# Application events
-@app.on_event("startup")
-async def startup_event():
-    """Execute on application startup"""
-    print("\n🎬 StreamHub Video Streaming Platform")
-    print("=" * 50)
-    print("✅ Starting up server...")
-    print("📁 Creating directories...")
-    create_directories()
-    
-    # Check critical files
-    critical_files = ["templates", "static", "database.py", "models.py"]
-    for file_path in critical_files:
-        if os.path.exists(file_path):
-            print(f"✅ Found: {file_path}")
-        else:
-            print(f"⚠️  Missing: {file_path}")
-    
-    print("🚀 Server ready!")
-    
-    # Show environment info
-    env = os.getenv("RENDER_SERVICE_NAME", "development")
-    database_type = "SQLite" if "sqlite://" in os.getenv("DATABASE_URL", "sqlite://") else "PostgreSQL"
-    
-    print(f"🌍 Environment: {env}")
-    print(f"🗄️  Database: {database_type}")
-    print("=" * 50)
-
 # Development server
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
     print("🎬 Starting StreamHub...")
+    init_db()
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
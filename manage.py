@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+StreamHub Management Commands
+Command line tools for maintaining the catalog outside the web workers
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+from banners import dedupe_legacy_banners, disk_usage, find_orphans, reconcile_banner_refs, remove_files
+from changes import TOMBSTONE_RETENTION_DAYS, prune_tombstones
+from database import SessionLocal, async_engine, init_db
+from importer import IMPORT_BATCH_SIZE, detect_format, import_videos, read_records
+from jobs import job_counts, prune_jobs, retry_failed_jobs
+from linkcheck import (
+    LINKCHECK_BASE_URL, LINKCHECK_CONCURRENCY, LINKCHECK_MAX_AGE_HOURS, LINKCHECK_RATE, check_links
+)
+from related import REBUILD_BATCH_SIZE, rebuild_related
+from sitemap import SITE_URL, build_sitemaps
+from static_files import STATIC_DIR, brotli, compress_static
+from storage import BANNER_GC_GRACE_SECONDS
+from templating import TEMPLATE_CACHE_DIR, TEMPLATE_DIR, configure_environment, precompile_templates
+
+
+def cmd_import(args):
+    """Bulk import videos from a JSONL or CSV file"""
+    fmt = args.format or detect_format(args.path)
+    print(f"📥 Importing {args.path} ({fmt}, batches of {args.batch_size})...")
+    start = time.perf_counter()
+
+    db = SessionLocal()
+    try:
+        with open(args.path, encoding="utf-8-sig", newline="") as stream:
+            result = import_videos(
+                db,
+                read_records(stream, fmt),
+                banner_root=args.banner_root,
+                batch_size=args.batch_size,
+                max_errors=args.max_errors
+            )
+    except Exception as e:
+        print(f"❌ Import failed, nothing was committed: {e}")
+        return 1
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    for error in result["errors"]:
+        print(f"⚠️  {error}")
+    print(f"✅ Imported {result['imported']} video(s) in {elapsed:.2f}s")
+    return 0
+
+
+def cmd_migrate(args):
+    """Create missing tables, columns, indexes and the search index"""
+    start = time.perf_counter()
+    if not init_db():
+        return 1
+    print(f"✅ Migrated in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def cmd_check_links(args):
+    """Check the Streamtape links of every due video"""
+    async def run():
+        try:
+            while True:
+                start = time.perf_counter()
+                totals = await check_links(
+                    async_engine,
+                    limit=args.limit,
+                    max_age_hours=args.max_age_hours,
+                    concurrency=args.concurrency,
+                    rate=args.rate,
+                    base_url=args.base_url.rstrip("/")
+                )
+                checked = totals["ok"] + totals["broken"] + totals["error"]
+                print(
+                    f"✅ Checked {checked} link(s) in {time.perf_counter() - start:.1f}s: "
+                    f"{totals['ok']} ok, {totals['broken']} broken, {totals['error']} error(s), "
+                    f"{totals['changed']} visibility change(s)"
+                )
+                if not args.every:
+                    return 0
+                await asyncio.sleep(args.every)
+        finally:
+            await async_engine.dispose()
+
+    print(f"🔗 Checking links against {args.base_url} ({args.concurrency} concurrent, {args.rate:g} req/s)...")
+    try:
+        return asyncio.run(run())
+    except KeyboardInterrupt:
+        return 0
+    except Exception as e:
+        print(f"❌ Link check failed: {e}")
+        return 1
+
+
+def cmd_build_related(args):
+    """Rebuild the related-videos index from scratch"""
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        indexed = rebuild_related(db.connection(), batch_size=args.batch_size)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Related videos rebuild failed: {e}")
+        return 1
+    finally:
+        db.close()
+    print(f"✅ Built related videos for {indexed} video(s) in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def cmd_build_sitemaps(args):
+    """Rebuild the changed sitemap shards and feeds"""
+    base_url = (args.base_url or SITE_URL).rstrip("/")
+    if not base_url:
+        print("❌ No site URL: set SITE_URL or pass --base-url")
+        return 1
+    start = time.perf_counter()
+    try:
+        stats = build_sitemaps(base_url, force=args.force)
+    except Exception as e:
+        print(f"❌ Sitemap build failed: {e}")
+        return 1
+    if stats is None:
+        print("⏭️  Another process is building the sitemaps")
+        return 0
+    print(
+        f"✅ Rebuilt {stats['rebuilt']} shard(s), removed {stats['removed']}, "
+        f"feeds {'rewritten' if stats['feeds'] else 'unchanged'} in {time.perf_counter() - start:.2f}s"
+    )
+    return 0
+
+
+def cmd_gc_banners(args):
+    """Recount banner references and delete files no video uses"""
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        connection = db.connection()
+        moved = dedupe_legacy_banners(connection, dry_run=args.dry_run) if args.dedupe else 0
+        fixed = reconcile_banner_refs(connection)
+        orphans = find_orphans(connection, grace_seconds=args.grace_seconds)
+        if args.dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Banner garbage collection failed: {e}")
+        return 1
+    finally:
+        db.close()
+
+    if args.dedupe:
+        print(f"🔁 Moved {moved} legacy banner(s) to content-addressed storage")
+    print(f"🔢 Corrected {fixed} reference count(s)")
+    if args.dry_run:
+        for path in orphans:
+            print(f"   would delete {path}")
+        print(f"✅ {len(orphans)} orphaned file(s) found (dry run, nothing changed)")
+        return 0
+    # Files go only after the recount is committed
+    removed, freed = remove_files(orphans)
+    print(f"✅ Deleted {removed} orphaned file(s), {freed / (1024 * 1024):.1f} MB freed, in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def cmd_disk_usage(args):
+    """Report disk used by banners and thumbnails against unique referenced images"""
+    def mb(size):
+        return f"{size / (1024 * 1024):.1f} MB"
+
+    db = SessionLocal()
+    try:
+        usage = disk_usage(db.connection())
+    finally:
+        db.close()
+    unique = usage["unique_banners"]
+    print(f"🖼️  Banners on disk:   {usage['banners']['files']} file(s), {mb(usage['banners']['bytes'])}")
+    print(f"🧬 Unique referenced: {unique['files']} file(s), {mb(unique['bytes'])} for {unique['references']} video(s)")
+    print(f"🗑️  Unreferenced:      {mb(usage['unreferenced_bytes'])} (run gc-banners)")
+    print(f"🔳 Thumbnails:        {usage['thumbnails']['files']} file(s), {mb(usage['thumbnails']['bytes'])}")
+    if "database" in usage:
+        print(f"📁 Database:          {mb(usage['database']['bytes'])}")
+    fs = usage["filesystem"]
+    print(f"💾 Disk:              {mb(fs['used'])} used of {mb(fs['total'])}, {mb(fs['free'])} free")
+    return 0
+
+
+def cmd_jobs(args):
+    """Show the background job queue; optionally retry failed jobs or prune finished ones"""
+    from models import Job
+
+    db = SessionLocal()
+    try:
+        connection = db.connection()
+        if args.retry_failed:
+            print(f"🔁 Queued {retry_failed_jobs(connection, kind=args.kind)} failed job(s) again")
+        if args.prune:
+            print(f"🧹 Deleted {prune_jobs(connection)} finished job(s)")
+        db.commit()
+        counts = job_counts(db.connection())
+        failed = db.query(Job).filter(Job.status == "failed").order_by(Job.id.desc()).limit(args.show).all()
+    finally:
+        db.close()
+
+    print("📋 Jobs: " + (", ".join(f"{status} {count}" for status, count in sorted(counts.items())) or "none"))
+    for job in failed:
+        error = (job.last_error or "").splitlines()[0] if job.last_error else ""
+        print(f"   ❌ #{job.id} {job.kind} after {job.attempts} attempt(s): {error}")
+    return 0
+
+
+def cmd_prune_tombstones(args):
+    """Forget change-feed deletes older than the retention window"""
+    db = SessionLocal()
+    try:
+        removed = prune_tombstones(db.connection(), retention_days=args.days)
+        db.commit()
+    finally:
+        db.close()
+    print(f"🪦 Pruned {removed} tombstone(s) older than {args.days:g} day(s)")
+    return 0
+
+
+def cmd_compile_templates(args):
+    """Compile every template into the shared bytecode cache"""
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+    # Same loader and autoescape settings as Starlette's Jinja2Templates
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape())
+    configure_environment(env)
+    if env.bytecode_cache is None:
+        return 1
+    start = time.perf_counter()
+    try:
+        count = precompile_templates(env)
+    except Exception as e:
+        print(f"❌ Template compilation failed: {e}")
+        return 1
+    print(f"✅ Compiled {count} template(s) into {TEMPLATE_CACHE_DIR} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def cmd_compress_static(args):
+    """Write precompressed .gz/.br siblings for text files under static/"""
+    start = time.perf_counter()
+    try:
+        written = compress_static(args.root, force=args.force)
+    except OSError as e:
+        print(f"❌ Static compression failed: {e}")
+        return 1
+    saved = sum(original - compressed for _, original, compressed in written)
+    if brotli is None:
+        print("⚠️  brotli is not installed, only gzip siblings were written")
+    print(f"✅ Wrote {len(written)} compressed file(s), {saved / 1024:.1f} KiB saved, in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+def build_parser():
+    """Build the argument parser for all commands"""
+    parser = argparse.ArgumentParser(description="StreamHub management commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="Create or upgrade the database schema")
+    migrate.set_defaults(func=cmd_migrate, needs_db=False)
+
+    importer = commands.add_parser("import", help="Bulk import videos from JSONL or CSV")
+    importer.add_argument("path", help="JSONL or CSV file to import")
+    importer.add_argument("--format", choices=["jsonl", "csv"], help="Input format (default: from file extension)")
+    importer.add_argument("--banner-root", help="Directory that relative banner paths are resolved against")
+    importer.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Rows per INSERT batch")
+    importer.add_argument("--max-errors", type=int, default=100, help="Abort after this many invalid records")
+    importer.set_defaults(func=cmd_import)
+
+    checker = commands.add_parser("check-links", help="Check Streamtape links and hide broken videos")
+    checker.add_argument("--limit", type=int, help="Check at most this many videos")
+    checker.add_argument("--max-age-hours", type=float, default=LINKCHECK_MAX_AGE_HOURS, help="Recheck links older than this")
+    checker.add_argument("--concurrency", type=int, default=LINKCHECK_CONCURRENCY, help="Requests in flight")
+    checker.add_argument("--rate", type=float, default=LINKCHECK_RATE, help="Requests per second (0 = unlimited)")
+    checker.add_argument("--base-url", default=LINKCHECK_BASE_URL, help="Streamtape host (or a stub server)")
+    checker.add_argument("--every", type=float, help="Keep running, starting a new pass every N seconds")
+    checker.set_defaults(func=cmd_check_links)
+
+    related = commands.add_parser("build-related", help="Rebuild the related-videos index from scratch")
+    related.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE, help="Videos scored per batch")
+    related.set_defaults(func=cmd_build_related)
+
+    sitemaps = commands.add_parser("build-sitemaps", help="Rebuild changed sitemap shards and the RSS/Atom feeds")
+    sitemaps.add_argument("--base-url", help="Public site URL (default: SITE_URL)")
+    sitemaps.add_argument("--force", action="store_true", help="Rebuild every shard")
+    sitemaps.set_defaults(func=cmd_build_sitemaps)
+
+    collector = commands.add_parser("gc-banners", help="Recount banner references and delete orphaned files")
+    collector.add_argument("--grace-seconds", type=float, default=BANNER_GC_GRACE_SECONDS, help="Keep files younger than this")
+    collector.add_argument("--dedupe", action="store_true", help="Also move legacy uuid banners to content-addressed storage")
+    collector.add_argument("--dry-run", action="store_true", help="List what would be deleted without changing anything")
+    collector.set_defaults(func=cmd_gc_banners)
+
+    usage = commands.add_parser("disk-usage", help="Report disk used by banners and thumbnails")
+    usage.set_defaults(func=cmd_disk_usage)
+
+    queue = commands.add_parser("jobs", help="Show background job counts and recent failures")
+    queue.add_argument("--retry-failed", action="store_true", help="Queue failed jobs again")
+    queue.add_argument("--kind", help="Only retry jobs of this kind")
+    queue.add_argument("--prune", action="store_true", help="Delete finished jobs past JOB_RETENTION_HOURS")
+    queue.add_argument("--show", type=int, default=10, help="Failed jobs to list")
+    queue.set_defaults(func=cmd_jobs)
+
+    tombstones = commands.add_parser("prune-tombstones", help="Delete old change-feed tombstones")
+    tombstones.add_argument("--days", type=float, default=TOMBSTONE_RETENTION_DAYS, help="Keep deletes this recent")
+    tombstones.set_defaults(func=cmd_prune_tombstones)
+
+    compiler = commands.add_parser("compile-templates", help="Precompile Jinja2 templates into the bytecode cache")
+    compiler.set_defaults(func=cmd_compile_templates, needs_db=False)
+
+    compressor = commands.add_parser("compress-static", help="Precompress static text files (gzip, brotli if installed)")
+    compressor.add_argument("--root", default=STATIC_DIR, help="Directory to compress")
+    compressor.add_argument("--force", action="store_true", help="Recompress files whose siblings are up to date")
+    compressor.set_defaults(func=cmd_compress_static, needs_db=False)
+
+    return parser
+
+
+def main():
+    """Run a management command"""
+    args = build_parser().parse_args()
+    if getattr(args, "needs_db", True):
+        init_db()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+# prometheus_client reads PROMETHEUS_MULTIPROC_DIR when it is imported;
+# gunicorn.conf.py sets it so all workers share one on-disk store
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+        generate_latest, multiprocess, start_http_server
+    )
+except ImportError:
+    CONTENT_TYPE_LATEST = "text/plain; charset=utf-8"
+    generate_latest = None
+
+METRICS_ENABLED = generate_latest is not None and os.getenv("METRICS_ENABLED", "true").lower() != "false"
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class RequestStats:
+    """Database work done while serving one request"""
+
+    __slots__ = ("queries", "query_seconds", "checkout_seconds", "overflow")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.checkout_seconds = 0.0
+        self.overflow = 0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+if METRICS_ENABLED:
+    REQUESTS = Counter(
+        "streamhub_http_requests_total", "HTTP requests served",
+        ["method", "route", "status"]
+    )
+    REQUEST_LATENCY = Histogram(
+        "streamhub_http_request_duration_seconds", "Time to serve a request",
+        ["method", "route"], buckets=LATENCY_BUCKETS
+    )
+    IN_PROGRESS = Gauge(
+        "streamhub_http_requests_in_progress", "Requests currently being served",
+        ["method"], multiprocess_mode="livesum"
+    )
+    REQUEST_QUERIES = Histogram(
+        "streamhub_db_queries_per_request", "SQL statements executed per request",
+        ["route"], buckets=COUNT_BUCKETS
+    )
+    REQUEST_QUERY_TIME = Histogram(
+        "streamhub_db_query_seconds_per_request", "Total SQL execution time per request",
+        ["route"], buckets=LATENCY_BUCKETS
+    )
+    REQUEST_CHECKOUT_WAIT = Histogram(
+        "streamhub_db_checkout_wait_seconds_per_request", "Time spent waiting for a pooled connection per request",
+        ["route"], buckets=QUERY_BUCKETS
+    )
+    REQUEST_OVERFLOW = Counter(
+        "streamhub_db_overflow_requests_total", "Requests that ran on an overflow connection",
+        ["route"]
+    )
+    QUERIES = Counter("streamhub_db_queries_total", "SQL statements executed", ["engine"])
+    QUERY_TIME = Histogram(
+        "streamhub_db_query_duration_seconds", "Duration of individual SQL statements",
+        ["engine"], buckets=QUERY_BUCKETS
+    )
+    POOL_CHECKED_OUT = Gauge(
+        "streamhub_db_pool_checked_out", "Connections currently checked out of the pool",
+        ["engine"], multiprocess_mode="livesum"
+    )
+    POOL_OVERFLOW = Gauge(
+        "streamhub_db_pool_overflow", "Connections open beyond pool_size",
+        ["engine"], multiprocess_mode="livesum"
+    )
+    TEMPLATE_RENDER = Histogram(
+        "streamhub_template_render_seconds", "Jinja2 template render time",
+        ["template"], buckets=QUERY_BUCKETS + (2.5,)
+    )
+    ADMISSION_WAIT = Histogram(
+        "streamhub_admission_wait_seconds", "Time admitted requests waited for a concurrency slot",
+        ["route_class"], buckets=QUERY_BUCKETS + (2.5, 5.0, 10.0)
+    )
+    ADMISSION_REJECTED = Counter(
+        "streamhub_admission_rejected_total", "Requests shed (503) or rate limited (429) before running",
+        ["route_class", "reason"]
+    )
+    JOB_WAIT = Histogram(
+        "streamhub_job_wait_seconds", "Time from a job becoming due to a worker starting it",
+        ["kind"], buckets=LATENCY_BUCKETS + (30.0, 60.0, 300.0)
+    )
+    JOB_DURATION = Histogram(
+        "streamhub_job_duration_seconds", "Time to run a background job",
+        ["kind"], buckets=LATENCY_BUCKETS + (30.0, 60.0, 300.0)
+    )
+    JOBS_FINISHED = Counter(
+        "streamhub_jobs_finished_total", "Background job runs by outcome (done, retry, failed, lost)",
+        ["kind", "outcome"]
+    )
+    JOBS_DUE = Gauge(
+        "streamhub_jobs_due", "Jobs due to run at the last poll",
+        multiprocess_mode="livemax"
+    )
+
+
+def _pool_gauges(name: str, pool, returning: int = 0):
+    # Only QueuePool-style pools report overflow
+    if hasattr(pool, "checkedout"):
+        POOL_CHECKED_OUT.labels(name).set(pool.checkedout() - returning)
+    if hasattr(pool, "overflow"):
+        POOL_OVERFLOW.labels(name).set(max(0, pool.overflow()))
+
+
+def instrument_engine(engine, name: str):
+    """Count and time every statement and track pool usage on a sync Engine"""
+    if not METRICS_ENABLED:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        QUERIES.labels(name).inc()
+        QUERY_TIME.labels(name).observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        pool = engine.pool
+        _pool_gauges(name, pool)
+        stats = _request_stats.get()
+        if stats is not None and hasattr(pool, "overflow"):
+            stats.overflow = max(stats.overflow, pool.overflow())
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        # Fires before the pool takes the connection back
+        _pool_gauges(name, engine.pool, returning=1)
+
+
+def observe_checkout(seconds: float):
+    """Attribute time spent acquiring a pooled connection to the current request"""
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.checkout_seconds += seconds
+
+
+def observe_admission(route_class: str, waited: float):
+    """Record how long an admitted request queued for its slot"""
+    if METRICS_ENABLED:
+        ADMISSION_WAIT.labels(route_class).observe(waited)
+
+
+def observe_rejection(route_class: str, reason: str):
+    """Count a request turned away by admission control"""
+    if METRICS_ENABLED:
+        ADMISSION_REJECTED.labels(route_class, reason).inc()
+
+
+def observe_job(kind: str, outcome: str, waited: float, ran: float):
+    """Record one background job run"""
+    if METRICS_ENABLED:
+        JOB_WAIT.labels(kind).observe(waited)
+        JOB_DURATION.labels(kind).observe(ran)
+        JOBS_FINISHED.labels(kind, outcome).inc()
+
+
+def set_jobs_due(count: int):
+    if METRICS_ENABLED:
+        JOBS_DUE.set(count)
+
+
+def instrument_templates(env):
+    """Time every top-level template render in a Jinja2 Environment"""
+    if not METRICS_ENABLED:
+        return
+
+    class TimedTemplate(env.template_class):
+        def render(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().render(*args, **kwargs)
+            finally:
+                TEMPLATE_RENDER.labels(self.name or "<string>").observe(time.perf_counter() - start)
+
+    env.template_class = TimedTemplate
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and DB work per route"""
+
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if not METRICS_ENABLED or scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_PROGRESS.labels(method).inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_PROGRESS.labels(method).dec()
+            _request_stats.reset(token)
+            # Label by route template (/watch/{video_id}) to keep cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUESTS.labels(method, route, str(status)).inc()
+            REQUEST_LATENCY.labels(method, route).observe(elapsed)
+            # Zero-query requests are recorded too: they are the cache hits
+            REQUEST_QUERIES.labels(route).observe(stats.queries)
+            REQUEST_QUERY_TIME.labels(route).observe(stats.query_seconds)
+            REQUEST_CHECKOUT_WAIT.labels(route).observe(stats.checkout_seconds)
+            if stats.overflow:
+                REQUEST_OVERFLOW.labels(route).inc()
+
+
+def _registry():
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics() -> bytes:
+    """Prometheus text exposition, merged across workers in multiprocess mode"""
+    return generate_latest(_registry())
+
+
+def serve_metrics(port: int) -> bool:
+    """Expose metrics of a process without a web app (the job worker) on `port`"""
+    if not METRICS_ENABLED:
+        return False
+    start_http_server(port, registry=_registry())
+    return True
+
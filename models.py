@@ -1,8 +1,45 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Index
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import JSON, Column, Integer, String, Text, DateTime, Index, ForeignKey, Table
 from datetime import datetime
 
-Base = declarative_base()
+from database import Base
+
+
+def extract_streamtape_id(url: str) -> str:
+    """Extract video ID from Streamtape URL"""
+    try:
+        if '/e/' in url:
+            return url.split('/e/')[-1].split('/')[0]
+        else:
+            return url.split('/')[-1].replace('/', '')
+    except Exception:
+        return "invalid_id"
+
+def normalize_tag(tag: str) -> str:
+    """Canonical tag name: lowercase, without the leading '#'"""
+    return tag.strip().lstrip('#').strip().lower()
+
+
+# Many-to-many association between videos and tags; the (tag_id, video_id)
+# primary key doubles as the index for tag-filtered listings
+video_tags = Table(
+    "video_tags",
+    Base.metadata,
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Column("video_id", Integer, ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_video_tags_video_id", "video_id"),
+)
+
+
+# Inverted index behind related videos: one row per hashtag ("#tag") or
+# title word of a video, see related.py
+video_terms = Table(
+    "video_terms",
+    Base.metadata,
+    Column("term", String(100), primary_key=True),
+    Column("video_id", Integer, ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_video_terms_video_id", "video_id"),
+)
+
 
 class Video(Base):
     __tablename__ = "videos"
@@ -12,15 +49,20 @@ class Video(Base):
     description = Column(Text, nullable=True)
     hashtags = Column(String(500), nullable=True)
     streamtape_url = Column(String(500), nullable=False)
-    streamtape_id = Column(String(100), nullable=False, index=True)
+    streamtape_id = Column(String(100), nullable=False)
     banner_path = Column(String(500), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Catalog version of the last write to this video (see catalog.bump_catalog_version)
+    change_seq = Column(Integer, nullable=True)
     
     # Add database indexes for better performance
     __table_args__ = (
         Index('ix_videos_created_title', 'created_at', 'title'),
+        Index('ix_videos_created_id', 'created_at', 'id'),
         Index('ix_videos_streamtape_id', 'streamtape_id'),
+        # Change feed order (changes.py)
+        Index('ix_videos_change_seq_id', 'change_seq', 'id'),
     )
     
     @property
@@ -62,3 +104,188 @@ class Video(Base):
     
     def __repr__(self):
         return f"<Video(id={self.id}, title='{self.title}', created='{self.formatted_created_at}')>"
+
+
+class Tag(Base):
+    __tablename__ = "tags"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+    # Precomputed number of videos carrying this tag, maintained on every write
+    video_count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index('ix_tags_video_count', 'video_count'),
+    )
+    
+    @property
+    def label(self):
+        """Display form of the tag"""
+        return f"#{self.name}"
+    
+    def __repr__(self):
+        return f"<Tag(name='{self.name}', videos={self.video_count})>"
+
+
+class VideoStats(Base):
+    """Aggregated popularity counters, written in batches by analytics.py"""
+    __tablename__ = "video_stats"
+    
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True)
+    views = Column(Integer, nullable=False, default=0)
+    watch_seconds = Column(Integer, nullable=False, default=0)
+    last_viewed_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index('ix_video_stats_views', 'views', 'video_id'),
+    )
+    
+    def __repr__(self):
+        return f"<VideoStats(video_id={self.video_id}, views={self.views})>"
+
+
+class VideoViewsHourly(Base):
+    """Per-hour view buckets backing the trending ordering"""
+    __tablename__ = "video_views_hourly"
+    
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    views = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index('ix_video_views_hourly_hour', 'hour'),
+    )
+
+
+class RelatedTerm(Base):
+    """Number of videos carrying a term of video_terms, maintained on every write"""
+    __tablename__ = "related_terms"
+    
+    term = Column(String(100), primary_key=True)
+    video_count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<RelatedTerm(term='{self.term}', videos={self.video_count})>"
+
+
+class VideoRelated(Base):
+    """Precomputed top-K related videos of a video, as [[video_id, score, listed_at], ...]
+
+    listed_at is when the entry was added (UTC epoch milliseconds); rows written
+    before it existed hold [video_id, score] pairs.
+    """
+    __tablename__ = "video_related"
+    
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True)
+    neighbors = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<VideoRelated(video_id={self.video_id}, neighbors={len(self.neighbors or [])})>"
+
+
+class VideoLink(Base):
+    """Result of the last Streamtape check of a video, written by linkcheck.py"""
+    __tablename__ = "video_links"
+    
+    OK = "ok"
+    BROKEN = "broken"
+    ERROR = "error"
+    
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(String(20), nullable=False)
+    http_status = Column(Integer, nullable=True)
+    duration_seconds = Column(Integer, nullable=True)
+    thumbnail_url = Column(String(500), nullable=True)
+    error = Column(String(255), nullable=True)
+    # Consecutive checks that ended in an error rather than a verdict
+    failures = Column(Integer, nullable=False, default=0)
+    checked_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_video_links_status', 'status'),
+        Index('ix_video_links_checked_at', 'checked_at'),
+    )
+    
+    def __repr__(self):
+        return f"<VideoLink(video_id={self.video_id}, status='{self.status}')>"
+
+
+class BannerFile(Base):
+    """Number of videos using a stored banner; identical uploads share one file"""
+    __tablename__ = "banner_files"
+    
+    path = Column(String(500), primary_key=True)
+    size = Column(Integer, nullable=False, default=0)
+    ref_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_banner_files_ref_count', 'ref_count'),
+    )
+    
+    def __repr__(self):
+        return f"<BannerFile(path='{self.path}', refs={self.ref_count})>"
+
+
+class VideoTombstone(Base):
+    """Deleted video, kept so change-feed clients learn about the delete"""
+    __tablename__ = "video_tombstones"
+    
+    video_id = Column(Integer, primary_key=True)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_video_tombstones_change_seq', 'change_seq', 'video_id'),
+    )
+    
+    def __repr__(self):
+        return f"<VideoTombstone(video_id={self.video_id}, seq={self.change_seq})>"
+
+
+class CatalogState(Base):
+    """Single-row table holding the catalog version counter.
+
+    Bumped in the same transaction as every write to `videos`, so each
+    worker can detect catalog changes with one primary-key lookup.
+    """
+    __tablename__ = "catalog_state"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Tombstones up to this version were pruned; older change tokens must resync
+    pruned_seq = Column(Integer, nullable=True)
+    
+    def __repr__(self):
+        return f"<CatalogState(version={self.version})>"
+
+
+class Job(Base):
+    """Durable background job, claimed and run by jobs.py workers"""
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    # queued -> running -> done, or back to queued until attempts run out (failed)
+    status = Column(String(16), nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    # Enqueuing the same key again is a no-op while the job row exists
+    idempotency_key = Column(String(200), unique=True)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = Column(String(100))
+    locked_at = Column(DateTime)
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+    
+    __table_args__ = (
+        # Claim order: due queued jobs, oldest first
+        Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+    
+    def __repr__(self):
+        return f"<Job(id={self.id}, kind='{self.kind}', status='{self.status}')>"
@@ -0,0 +1,67 @@
+import base64
+import binascii
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+from models import Video
+
+# Page size configuration
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+# JSON list endpoints may ask for far larger pages (streamed as NDJSON)
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "10000"))
+
+
+def clamp_limit(limit: Optional[int], maximum: int = MAX_PAGE_SIZE) -> int:
+    """Clamp a requested page size to the allowed range"""
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, maximum)
+
+
+def encode_cursor(created_at: datetime, video_id: int) -> str:
+    """Encode a (created_at, id) position as an opaque URL-safe cursor"""
+    raw = f"{created_at.isoformat()}|{video_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Decode a cursor produced by encode_cursor"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, video_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(video_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def apply_keyset(stmt, cursor: Optional[str], limit: int):
+    """Restrict a Video select to the page after `cursor`, newest first.
+
+    Seeks on (created_at, id) instead of using OFFSET so every page costs
+    the same index range scan no matter how deep into the catalog it is.
+    One extra row is fetched to know whether a next page exists.
+    """
+    position = decode_cursor(cursor)
+    if position:
+        created_at, video_id = position
+        stmt = stmt.where(or_(
+            Video.created_at < created_at,
+            and_(Video.created_at == created_at, Video.id < video_id),
+        ))
+    return stmt.order_by(Video.created_at.desc(), Video.id.desc()).limit(limit + 1)
+
+
+def split_page(rows: List, limit: int) -> Tuple[List, Optional[str]]:
+    """Split the rows of an apply_keyset query into (page, next_cursor)"""
+    if len(rows) <= limit:
+        return list(rows), None
+    page = list(rows[:limit])
+    last = page[-1]
+    return page, encode_cursor(last.created_at, last.id)
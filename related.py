@@ -0,0 +1,350 @@
+import heapq
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from catalog import cached, catalog_cache, listed, sync_catalog_cache
+from models import RelatedTerm, Video, VideoRelated, video_terms
+from tags import parse_tags
+
+# Related videos configuration
+RELATED_K = int(os.getenv("RELATED_K", "12"))
+# Only the newest postings of a common term are scored, so no write ever
+# walks a term shared by half the catalog
+RELATED_MAX_POSTINGS = int(os.getenv("RELATED_MAX_POSTINGS", "100"))
+# A written video is offered as a neighbour to this many of its best matches
+RELATED_OFFER_LIMIT = 4 * RELATED_K
+# Hashtags say more about a video than the words of its title
+TAG_WEIGHT = 2.0
+MAX_TITLE_TERMS = 20
+REBUILD_BATCH_SIZE = 1000
+# Term lists this short are fetched with one indexed LIMIT query per term
+PER_TERM_QUERY_LIMIT = 64
+EPOCH = datetime(1970, 1, 1)
+
+STOPWORDS = frozenset(
+    "the and for with from this that you your are was were how what why who all "
+    "new video videos official full part episode".split()
+)
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def video_term_set(title: Optional[str], hashtags: Optional[str]) -> List[str]:
+    """Terms a video is indexed under: '#tag' for hashtags, plus title words"""
+    terms = [f"#{name}"[:100] for name in parse_tags(hashtags)]
+    words = 0
+    for word in WORD.findall((title or "").lower()):
+        if len(word) < 3 or word.isdigit() or word in STOPWORDS or word[:100] in terms:
+            continue
+        terms.append(word[:100])
+        words += 1
+        if words == MAX_TITLE_TERMS:
+            break
+    return terms
+
+
+def _apply_term_counts(connection, deltas: Counter):
+    """Adjust the per-term video counts, creating terms on first use"""
+    rows = [{"term": term, "video_count": delta} for term, delta in deltas.items() if delta]
+    if not rows:
+        return
+    table = RelatedTerm.__table__
+    upsert = pg_insert if connection.dialect.name == "postgresql" else sqlite_insert
+    stmt = upsert(table)
+    connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["term"],
+            set_={"video_count": table.c.video_count + stmt.excluded.video_count},
+        ),
+        rows
+    )
+
+
+def add_video_terms(connection, videos: Iterable[Tuple[int, Optional[str], Optional[str]]]) -> Dict[int, List[str]]:
+    """Index (video_id, title, hashtags) triples of videos that have no terms yet"""
+    terms = {video_id: video_term_set(title, hashtags) for video_id, title, hashtags in videos}
+    rows = [{"term": term, "video_id": video_id} for video_id, names in terms.items() for term in names]
+    if rows:
+        connection.execute(insert(video_terms), rows)
+        _apply_term_counts(connection, Counter(row["term"] for row in rows))
+    return terms
+
+
+def remove_video_terms(connection, video_ids: List[int]):
+    """Drop videos from the term index and decrement the term counts"""
+    if not video_ids:
+        return
+    terms = connection.execute(
+        select(video_terms.c.term).where(video_terms.c.video_id.in_(video_ids))
+    ).scalars().all()
+    if terms:
+        connection.execute(delete(video_terms).where(video_terms.c.video_id.in_(video_ids)))
+        _apply_term_counts(connection, Counter({term: -count for term, count in Counter(terms).items()}))
+
+
+def _postings(connection, terms: List[str]) -> Dict[str, List[int]]:
+    """Newest RELATED_MAX_POSTINGS video ids of each term"""
+    postings: Dict[str, List[int]] = {}
+    if len(terms) <= PER_TERM_QUERY_LIMIT:
+        for term in terms:
+            postings[term] = connection.execute(
+                select(video_terms.c.video_id)
+                .where(video_terms.c.term == term)
+                .order_by(video_terms.c.video_id.desc())
+                .limit(RELATED_MAX_POSTINGS)
+            ).scalars().all()
+        return postings
+    grouped = defaultdict(list)
+    for start in range(0, len(terms), 500):
+        for term, video_id in connection.execute(
+            select(video_terms.c.term, video_terms.c.video_id).where(video_terms.c.term.in_(terms[start:start + 500]))
+        ):
+            grouped[term].append(video_id)
+    for term, video_ids in grouped.items():
+        postings[term] = heapq.nlargest(RELATED_MAX_POSTINGS, video_ids)
+    return postings
+
+
+def _weights(connection, terms: List[str]) -> Dict[str, float]:
+    """IDF weight of each term; terms only one video carries are useless"""
+    # The highest id stands in for the catalog size: one index lookup, not a count
+    total = connection.execute(select(func.max(Video.id))).scalar() or 1
+    weights = {}
+    for start in range(0, len(terms), 500):
+        for term, count in connection.execute(
+            select(RelatedTerm.term, RelatedTerm.video_count).where(RelatedTerm.term.in_(terms[start:start + 500]))
+        ):
+            if count > 1:
+                weight = math.log(1 + total / count)
+                weights[term] = weight * TAG_WEIGHT if term.startswith("#") else weight
+    return weights
+
+
+def score_neighbors(
+    terms: Dict[int, List[str]], postings: Dict[str, List[int]], weights: Dict[str, float], limit: int
+) -> Dict[int, List[Tuple[int, float]]]:
+    """Best `limit` (video_id, score) matches of each video by weighted term overlap"""
+    result = {}
+    for video_id, names in terms.items():
+        scores = defaultdict(float)
+        for term in names:
+            weight = weights.get(term)
+            if weight:
+                for other in postings.get(term, ()):
+                    scores[other] += weight
+        scores.pop(video_id, None)
+        # (score, id) tuples compare natively - much faster than a key function
+        result[video_id] = [
+            (other, round(score, 4))
+            for score, other in heapq.nlargest(limit, zip(scores.values(), scores.keys()))
+        ]
+    return result
+
+
+def _stamp() -> int:
+    """Current UTC time in milliseconds, rounded up: when a neighbour was listed.
+
+    SQLite reuses the id of the newest video once it is deleted, so readers
+    only trust a neighbour id for videos created before it was listed.
+    """
+    return math.ceil((datetime.utcnow() - EPOCH) / timedelta(milliseconds=1))
+
+
+def _stamped(lists: Dict[int, List[Tuple[int, float]]]) -> Dict[int, List[Tuple[int, float, int]]]:
+    """Add the listing time to freshly scored (video_id, score) matches"""
+    now = _stamp()
+    return {video_id: [(other, score, now) for other, score in matches] for video_id, matches in lists.items()}
+
+
+def _save_neighbors(connection, lists: Dict[int, List]):
+    """Upsert the related lists of the given videos"""
+    if not lists:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {"video_id": video_id, "neighbors": [list(entry) for entry in neighbors], "updated_at": now}
+        for video_id, neighbors in lists.items()
+    ]
+    upsert = pg_insert if connection.dialect.name == "postgresql" else sqlite_insert
+    stmt = upsert(VideoRelated.__table__)
+    connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["video_id"],
+            set_={"neighbors": stmt.excluded.neighbors, "updated_at": stmt.excluded.updated_at},
+        ),
+        rows
+    )
+
+
+def refresh_related(connection, terms: Dict[int, List[str]], offer: bool = True):
+    """Recompute the lists of freshly indexed videos and offer them to their matches.
+
+    Each video's best RELATED_OFFER_LIMIT matches get it merged into their
+    own top-K, so nothing else in the catalog is recomputed.
+    """
+    if not terms:
+        return
+    names = sorted({term for term_list in terms.values() for term in term_list})
+    postings = _postings(connection, names)
+    scored = _stamped(score_neighbors(
+        terms, postings, _weights(connection, names), RELATED_OFFER_LIMIT if offer else RELATED_K
+    ))
+    if not offer:
+        _save_neighbors(connection, scored)
+        return
+
+    offers = defaultdict(dict)
+    for video_id, matches in scored.items():
+        for other, score, added in matches:
+            if other not in terms:
+                offers[other][video_id] = (video_id, score, added)
+    updated = {video_id: matches[:RELATED_K] for video_id, matches in scored.items()}
+
+    current = {}
+    offered = list(offers)
+    for start in range(0, len(offered), 500):
+        current.update(connection.execute(
+            select(VideoRelated.video_id, VideoRelated.neighbors)
+            .where(VideoRelated.video_id.in_(offered[start:start + 500]))
+        ).all())
+    for other, new in offers.items():
+        # Entries keep the time they were first listed
+        existing = {entry[0]: entry for entry in current.get(other) or []}
+        floor = min(entry[1] for entry in existing.values()) if len(existing) >= RELATED_K else 0.0
+        if not any(entry[1] > floor for entry in new.values()) and not set(new) & set(existing):
+            continue
+        existing.update(new)
+        updated[other] = heapq.nlargest(RELATED_K, existing.values(), key=lambda entry: (entry[1], entry[0]))
+    _save_neighbors(connection, updated)
+
+
+def index_videos(connection, videos: Iterable[Tuple[int, Optional[str], Optional[str]]], offer: bool = True):
+    """Index new videos and give them related lists.
+
+    Bulk imports pass offer=False: the new videos get their own lists, and
+    reach older videos' lists at the next `manage.py build-related`.
+    """
+    refresh_related(connection, add_video_terms(connection, videos), offer=offer)
+
+
+@event.listens_for(Session, "before_flush")
+def _unindex_deleted_videos(session, flush_context, instances):
+    """Drop terms and related lists before their videos are deleted.
+
+    Entries pointing at a deleted video elsewhere stay until the next
+    rebuild; readers skip ids that no longer exist or now belong to a
+    video created after the entry was listed.
+    """
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Video) and obj.id is not None]
+    if deleted:
+        connection = session.connection()
+        remove_video_terms(connection, deleted)
+        connection.execute(delete(VideoRelated).where(VideoRelated.video_id.in_(deleted)))
+
+
+@event.listens_for(Session, "after_flush")
+def _index_written_videos(session, flush_context):
+    """Reindex new videos and videos whose title or hashtags changed"""
+    changed = [
+        obj for obj in session.dirty
+        if isinstance(obj, Video) and (
+            sa_inspect(obj).attrs.title.history.has_changes()
+            or sa_inspect(obj).attrs.hashtags.history.has_changes()
+        )
+    ]
+    new = [obj for obj in session.new if isinstance(obj, Video)]
+    if not changed and not new:
+        return
+    connection = session.connection()
+    remove_video_terms(connection, [obj.id for obj in changed])
+    index_videos(connection, [(obj.id, obj.title, obj.hashtags) for obj in changed + new])
+
+
+def rebuild_related(connection, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """Rebuild the term index and every related list from scratch.
+
+    Offline: postings are loaded once (capped per term), then videos are
+    scored in primary-key batches. Returns the number of videos indexed.
+    """
+    connection.execute(delete(VideoRelated))
+    connection.execute(delete(video_terms))
+    connection.execute(delete(RelatedTerm))
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(Video.id, Video.title, Video.hashtags)
+            .where(Video.id > last_id)
+            .order_by(Video.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        add_video_terms(connection, rows)
+        last_id = rows[-1].id
+
+    postings = defaultdict(list)
+    by_video = defaultdict(list)
+    for term, video_id in connection.execute(select(video_terms.c.term, video_terms.c.video_id)):
+        postings[term].append(video_id)
+        by_video[video_id].append(term)
+    postings = {term: heapq.nlargest(RELATED_MAX_POSTINGS, ids) for term, ids in postings.items()}
+    weights = _weights(connection, list(postings))
+
+    video_ids = sorted(by_video)
+    for start in range(0, len(video_ids), batch_size):
+        batch = {video_id: by_video[video_id] for video_id in video_ids[start:start + batch_size]}
+        _save_neighbors(connection, _stamped(score_neighbors(batch, postings, weights, RELATED_K)))
+    return len(video_ids)
+
+
+def backfill_related(connection) -> int:
+    """Run rebuild_related once on a catalog that has videos but no term index"""
+    if connection.execute(select(video_terms.c.video_id).limit(1)).first():
+        return 0
+    if not connection.execute(select(Video.id).limit(1)).first():
+        return 0
+    return rebuild_related(connection)
+
+
+def _listed_after(entry: List, video: Video) -> bool:
+    """Whether `video` existed when the neighbour entry naming its id was listed.
+
+    Entries written before listing times were recorded are trusted.
+    """
+    if len(entry) < 3 or video.created_at is None:
+        return True
+    return video.created_at <= EPOCH + timedelta(milliseconds=entry[2])
+
+
+async def get_related_videos(db: AsyncSession, video_id: int, limit: int = RELATED_K) -> List[Video]:
+    """Related videos of one video: a primary-key lookup plus one IN query, cached"""
+    await sync_catalog_cache(db)
+    key = ("related", video_id, limit)
+    videos = cached(db, key)
+    if videos is None:
+        generation = catalog_cache.generation
+        neighbors = (await db.execute(
+            select(VideoRelated.neighbors).where(VideoRelated.video_id == video_id)
+        )).scalar_one_or_none() or []
+        ids = [entry[0] for entry in neighbors]
+        by_id = {
+            video.id: video
+            for video in (await db.execute(listed(select(Video)).where(Video.id.in_(ids)))).scalars()
+        } if ids else {}
+        videos = [
+            by_id[entry[0]] for entry in neighbors
+            if entry[0] in by_id and _listed_after(entry, by_id[entry[0]])
+        ][:limit]
+        catalog_cache.set(key, videos, generation)
+    return videos
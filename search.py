@@ -0,0 +1,150 @@
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import or_, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from catalog import cached, catalog_cache, listed, sync_catalog_cache
+from models import Video
+
+# Search configuration
+MAX_QUERY_LENGTH = 200
+MAX_SEARCH_PAGES = 50
+
+# SQLite: FTS5 external-content index over videos, kept in sync by triggers
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(
+        title, description, hashtags,
+        content='videos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS videos_fts_insert AFTER INSERT ON videos BEGIN
+        INSERT INTO videos_fts(rowid, title, description, hashtags)
+        VALUES (new.id, new.title, new.description, new.hashtags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS videos_fts_delete AFTER DELETE ON videos BEGIN
+        INSERT INTO videos_fts(videos_fts, rowid, title, description, hashtags)
+        VALUES ('delete', old.id, old.title, old.description, old.hashtags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS videos_fts_update AFTER UPDATE OF title, description, hashtags ON videos BEGIN
+        INSERT INTO videos_fts(videos_fts, rowid, title, description, hashtags)
+        VALUES ('delete', old.id, old.title, old.description, old.hashtags);
+        INSERT INTO videos_fts(rowid, title, description, hashtags)
+        VALUES (new.id, new.title, new.description, new.hashtags);
+    END
+    """,
+]
+
+# PostgreSQL: weighted tsvector maintained by the database as a generated column
+POSTGRES_SEARCH_DDL = [
+    """
+    ALTER TABLE videos ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(hashtags, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_videos_search_vector ON videos USING GIN (search_vector)",
+]
+
+SQLITE_SEARCH_SQL = """
+    SELECT rowid FROM videos_fts
+    WHERE videos_fts MATCH :query
+    ORDER BY bm25(videos_fts, 10.0, 1.0, 5.0), rowid DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+POSTGRES_SEARCH_SQL = """
+    SELECT id FROM videos, websearch_to_tsquery('english', :query) AS query
+    WHERE search_vector @@ query
+    ORDER BY ts_rank_cd(search_vector, query) DESC, id DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def setup_search_index(connection):
+    """Create the full-text index for the current database and fill it once"""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_SEARCH_DDL:
+            connection.execute(text(statement))
+        indexed = connection.execute(text("SELECT count(*) FROM videos_fts_docsize")).scalar()
+        if not indexed and connection.execute(text("SELECT 1 FROM videos LIMIT 1")).first():
+            connection.execute(text("INSERT INTO videos_fts(videos_fts) VALUES ('rebuild')"))
+            print("✅ Full-text index built")
+    elif dialect == "postgresql":
+        for statement in POSTGRES_SEARCH_DDL:
+            connection.execute(text(statement))
+
+
+def build_fts5_query(query: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 query: every word must match, as a prefix"""
+    words = re.findall(r"\w+", query, flags=re.UNICODE)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+async def search_videos(
+    db: AsyncSession, query: str, page: int, limit: int
+) -> Tuple[List[Video], bool]:
+    """Return one page of videos ranked by relevance and whether more exist"""
+    query = query.strip()[:MAX_QUERY_LENGTH]
+    page = max(1, min(page, MAX_SEARCH_PAGES))
+    if not query:
+        return [], False
+
+    await sync_catalog_cache(db)
+    key = ("search", query.lower(), page, limit)
+    result = cached(db, key)
+    if result is not None:
+        return result
+
+    generation = catalog_cache.generation
+    params = {"limit": limit + 1, "offset": (page - 1) * limit}
+    dialect = db.bind.dialect.name
+    try:
+        if dialect == "sqlite":
+            fts_query = build_fts5_query(query)
+            if fts_query is None:
+                return [], False
+            ids = (await db.execute(text(SQLITE_SEARCH_SQL), {**params, "query": fts_query})).scalars().all()
+        elif dialect == "postgresql":
+            ids = (await db.execute(text(POSTGRES_SEARCH_SQL), {**params, "query": query})).scalars().all()
+        else:
+            ids = None
+    except DBAPIError as e:
+        # Full-text index missing (e.g. SQLite built without FTS5): degrade to LIKE
+        print(f"⚠️  Full-text search unavailable, using LIKE: {e}")
+        await db.rollback()
+        ids = None
+
+    if ids is None:
+        # The query matches literally: escape LIKE wildcards typed by the user
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+        ids = (await db.execute(
+            listed(select(Video.id))
+            .where(or_(Video.title.ilike(pattern, escape="\\"), Video.hashtags.ilike(pattern, escape="\\")))
+            .order_by(Video.created_at.desc(), Video.id.desc())
+            .limit(params["limit"]).offset(params["offset"])
+        )).scalars().all()
+
+    has_more = len(ids) > limit
+    ids = ids[:limit]
+    by_id = {
+        video.id: video
+        for video in (await db.execute(listed(select(Video)).where(Video.id.in_(ids)))).scalars()
+    } if ids else {}
+    result = ([by_id[video_id] for video_id in ids if video_id in by_id], has_more)
+    catalog_cache.set(key, result, generation)
+    return result
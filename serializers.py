@@ -0,0 +1,95 @@
+import json
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import Row
+
+from models import Video
+
+# orjson ships in requirements.txt; the standard library encoder only covers
+# local setups installed without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Columns the JSON API can project, by public field name
+VIDEO_FIELDS = {
+    "id": Video.id,
+    "title": Video.title,
+    "description": Video.description,
+    "hashtags": Video.hashtags,
+    "streamtape_url": Video.streamtape_url,
+    "streamtape_id": Video.streamtape_id,
+    "banner_path": Video.banner_path,
+    "created_at": Video.created_at,
+    "updated_at": Video.updated_at,
+}
+DEFAULT_VIDEO_FIELDS = ("id", "title", "description", "created_at")
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """Encode JSON with orjson when available (datetimes as ISO 8601)"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that skips jsonable_encoder and encodes with orjson"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Parse a `fields=id,title` projection, rejecting unknown names"""
+    if not fields:
+        return DEFAULT_VIDEO_FIELDS
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in VIDEO_FIELDS]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s): {', '.join(unknown) or fields}. Available: {', '.join(VIDEO_FIELDS)}"
+        )
+    return names
+
+
+def video_columns(names: Iterable[str]):
+    """Columns to select for a field projection"""
+    return [VIDEO_FIELDS[name] for name in names]
+
+
+def project(items, names: Tuple[str, ...]):
+    """Build response dicts from rows or Video objects.
+
+    Rows selected through video_columns() start with the requested fields
+    in order, so they are zipped positionally - several times faster than
+    attribute lookups on Row.
+    """
+    if items and isinstance(items[0], Row):
+        return [dict(zip(names, row)) for row in items]
+    return [{name: getattr(item, name) for name in names} for item in items]
+
+
+def ndjson_lines(items, names: Tuple[str, ...]) -> bytes:
+    """Encode rows or Video objects as newline-delimited JSON"""
+    return b"".join(dumps(item) + b"\n" for item in project(items, names))
+
+
+def wants_ndjson(request: Request, format: Optional[str]) -> bool:
+    """True for ?format=ndjson or an Accept header asking for NDJSON"""
+    if format:
+        return format == "ndjson"
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from catalog import listed
+from http_cache import http_date
+from models import CatalogState, Video
+from static_files import accepted_encodings, compress_file
+
+# Only available on POSIX; without it concurrent builders just duplicate work
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Prebuilt sitemap/feed files: outside static/ so only the sitemap routes
+# serve them (never the manifest or lock file). They are rebuilt from the
+# database when missing, so they need no persistent disk.
+SITEMAP_DIR = os.getenv("SITEMAP_DIR", "data/sitemaps")
+# Where earlier versions wrote them, publicly; removed on the next build
+LEGACY_SITEMAP_DIR = "static/sitemaps"
+# How long a request waits for another worker's first build before a 503
+SITEMAP_BUILD_WAIT = float(os.getenv("SITEMAP_BUILD_WAIT", "10"))
+# Public origin used in <loc> and feed links, e.g. https://streamhub.example.com
+# (Render's service URL by default). Never taken from a request's Host
+# header: the files are persisted, so one spoofed request would poison them.
+# Without it the sitemaps and feeds are not served.
+SITE_URL = (os.getenv("SITE_URL") or os.getenv("RENDER_EXTERNAL_URL", "")).rstrip("/")
+# Videos per sitemap shard (protocol limit: 50,000 URLs per file). Shards
+# cover fixed id ranges, so an edit only rebuilds the shard it falls in.
+SITEMAP_SHARD_SIZE = min(50000, int(os.getenv("SITEMAP_SHARD_SIZE", "50000")))
+FEED_SIZE = int(os.getenv("FEED_SIZE", "50"))
+SITEMAP_MAX_AGE = int(os.getenv("SITEMAP_MAX_AGE", "300"))
+SITE_TITLE = "StreamHub"
+
+MANIFEST = "manifest.json"
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+ISO_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# Background refresh state of this worker (see schedule_refresh)
+_refresh = {"task": None, "again": False, "warned": False}
+
+
+def _path(name: str) -> Path:
+    return Path(SITEMAP_DIR) / name
+
+
+def shard_name(shard: int) -> str:
+    return f"sitemap-{shard}.xml"
+
+
+def _iso(value: Optional[datetime]) -> str:
+    return (value or datetime.utcnow()).strftime(ISO_FORMAT)
+
+
+def read_manifest() -> Optional[dict]:
+    """What was last built: base URL, catalog version and per-file signatures"""
+    try:
+        return json.loads(_path(MANIFEST).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write(name: str, chunks: Iterable[str], compress: bool = True):
+    """Atomically replace a prebuilt file and its .gz sibling.
+
+    Files are only rewritten when their content changed, so the mtime is
+    the Last-Modified crawlers get.
+    """
+    path = _path(name)
+    temp_path = path.with_name(f".{path.name}.part")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(temp_path, path)
+    if compress:
+        compress_file(path, force=True)
+
+
+def _remove(name: str):
+    for path in (_path(name), _path(f"{name}.gz")):
+        path.unlink(missing_ok=True)
+
+
+def shard_signatures(connection) -> Dict[int, list]:
+    """(url count, newest updated_at, id sum) of every listed shard in one GROUP BY.
+
+    Any insert, edit, delete or link hide/unhide inside a shard changes its signature.
+    """
+    shard = (Video.id // SITEMAP_SHARD_SIZE).label("shard")
+    rows = connection.execute(
+        listed(select(shard, func.count(), func.max(Video.updated_at), func.sum(Video.id)))
+        .group_by(shard)
+    )
+    return {int(row[0]): [row[1], _iso(row[2]), int(row[3])] for row in rows}
+
+
+def _urlset(connection, base_url: str, shard: Optional[int]) -> Iterable[str]:
+    stmt = listed(select(Video.id, Video.updated_at)).order_by(Video.id)
+    if shard is not None:
+        stmt = stmt.where(Video.id >= shard * SITEMAP_SHARD_SIZE, Video.id < (shard + 1) * SITEMAP_SHARD_SIZE)
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n'
+    if not shard:
+        yield f"<url><loc>{escape(base_url)}/</loc><changefreq>hourly</changefreq></url>\n"
+    for video_id, updated_at in connection.execute(stmt):
+        yield f"<url><loc>{escape(base_url)}/watch/{video_id}</loc><lastmod>{_iso(updated_at)}</lastmod></url>\n"
+    yield "</urlset>\n"
+
+
+def _sitemap_index(base_url: str, signatures: Dict[int, list]) -> Iterable[str]:
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n'
+    for shard, (_, lastmod, _) in sorted(signatures.items()):
+        yield (
+            f"<sitemap><loc>{escape(base_url)}/sitemaps/{shard_name(shard)}</loc>"
+            f"<lastmod>{lastmod}</lastmod></sitemap>\n"
+        )
+    yield "</sitemapindex>\n"
+
+
+def _latest(connection) -> List[Tuple]:
+    return connection.execute(
+        listed(select(Video.id, Video.title, Video.description, Video.created_at, Video.updated_at))
+        .order_by(Video.created_at.desc(), Video.id.desc())
+        .limit(FEED_SIZE)
+    ).all()
+
+
+def _rss(base_url: str, videos: List[Tuple]) -> Iterable[str]:
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel>\n'
+        f"<title>{SITE_TITLE}</title><link>{escape(base_url)}/</link>"
+        f"<description>Latest videos on {SITE_TITLE}</description>\n"
+    )
+    for video_id, title, description, created_at, _ in videos:
+        link = f"{escape(base_url)}/watch/{video_id}"
+        yield (
+            f"<item><title>{escape(title)}</title><link>{link}</link>"
+            f'<guid isPermaLink="true">{link}</guid><pubDate>{http_date(created_at)}</pubDate>'
+            f"<description>{escape(description or '')}</description></item>\n"
+        )
+    yield "</channel></rss>\n"
+
+
+def _atom(base_url: str, videos: List[Tuple], updated: Optional[datetime]) -> Iterable[str]:
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">\n'
+        f"<title>{SITE_TITLE}</title><id>{escape(base_url)}/</id>"
+        f'<link href="{escape(base_url)}/"/><link rel="self" href="{escape(base_url)}/atom.xml"/>'
+        f"<updated>{_iso(updated)}</updated>\n"
+    )
+    for video_id, title, description, created_at, updated_at in videos:
+        link = f"{escape(base_url)}/watch/{video_id}"
+        yield (
+            f'<entry><title>{escape(title)}</title><id>{link}</id><link href="{link}"/>'
+            f"<published>{_iso(created_at)}</published><updated>{_iso(updated_at)}</updated>"
+            f"<author><name>{SITE_TITLE}</name></author>"
+            f"<summary>{escape(description or '')}</summary></entry>\n"
+        )
+    yield "</feed>\n"
+
+
+def refresh_sitemaps(connection, base_url: str, force: bool = False) -> Dict[str, int]:
+    """Rebuild the sitemap shards and feeds whose content changed.
+
+    Compares each shard's signature with the manifest, so a write costs one
+    GROUP BY plus a rebuild of the shards it touched. Returns counts of
+    rebuilt and removed shards and whether the feeds were rewritten.
+    """
+    Path(SITEMAP_DIR).mkdir(parents=True, exist_ok=True)
+    # Read the version first: a write landing mid-build leaves the manifest
+    # behind the catalog, so the next request refreshes again
+    version = connection.execute(select(CatalogState.version).where(CatalogState.id == 1)).scalar() or 0
+    manifest = read_manifest() or {}
+    if manifest.get("base_url") != base_url:
+        force = True
+    previous = {int(shard): signature for shard, signature in manifest.get("shards", {}).items()}
+    old = {} if force else previous
+    signatures = shard_signatures(connection)
+    single = len(signatures) <= 1
+
+    removed = [shard for shard in previous if shard not in signatures]
+    if force or single != manifest.get("single"):
+        changed = list(signatures)
+    else:
+        changed = [shard for shard, signature in signatures.items() if old.get(shard) != signature]
+
+    if single:
+        # Small catalogs get a plain urlset at /sitemap.xml
+        if changed or removed or not _path("sitemap.xml").exists():
+            _write("sitemap.xml", _urlset(connection, base_url, None))
+        for shard in set(previous) | set(signatures):
+            _remove(shard_name(shard))
+    else:
+        for shard in changed:
+            _write(shard_name(shard), _urlset(connection, base_url, shard))
+        for shard in removed:
+            _remove(shard_name(shard))
+        if changed or removed:
+            _write("sitemap.xml", _sitemap_index(base_url, signatures))
+
+    videos = _latest(connection)
+    feed_signature = [[video[0], _iso(video[4])] for video in videos]
+    feed_changed = force or feed_signature != manifest.get("feed")
+    if feed_changed:
+        updated = max((video[4] for video in videos if video[4]), default=None)
+        _write("feed.xml", _rss(base_url, videos))
+        _write("atom.xml", _atom(base_url, videos, updated))
+
+    manifest = {
+        "base_url": base_url,
+        "catalog_version": version,
+        "single": single,
+        "shards": {str(shard): signature for shard, signature in signatures.items()},
+        "feed": feed_signature,
+        "built_at": _iso(datetime.utcnow()),
+    }
+    _write(MANIFEST, [json.dumps(manifest)], compress=False)
+    return {"rebuilt": len(changed), "removed": len(removed), "feeds": int(feed_changed)}
+
+
+def build_sitemaps(base_url: str, force: bool = False) -> Optional[Dict[str, int]]:
+    """Refresh on a fresh connection, holding a lock so one worker builds at a time.
+
+    Returns None when another process is already building.
+    """
+    from database import engine
+
+    Path(SITEMAP_DIR).mkdir(parents=True, exist_ok=True)
+    if Path(LEGACY_SITEMAP_DIR).resolve() != Path(SITEMAP_DIR).resolve():
+        shutil.rmtree(LEGACY_SITEMAP_DIR, ignore_errors=True)
+    with open(_path(".lock"), "w") as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+        with engine.connect() as connection:
+            return refresh_sitemaps(connection, base_url, force=force)
+
+
+def schedule_refresh():
+    """Refresh the prebuilt files in the background of this worker (after writes).
+
+    Refreshes never overlap: a request arriving during a refresh queues one
+    more run. Nothing happens without SITE_URL or before the first build.
+    """
+    if not SITE_URL or read_manifest() is None:
+        return
+    if _refresh["task"] is not None:
+        _refresh["again"] = True
+        return
+
+    async def run():
+        try:
+            while True:
+                _refresh["again"] = False
+                await asyncio.to_thread(build_sitemaps, SITE_URL)
+                if not _refresh["again"]:
+                    break
+        except Exception as e:
+            print(f"⚠️  Sitemap refresh failed: {e}")
+        finally:
+            _refresh["task"] = None
+
+    _refresh["task"] = asyncio.get_running_loop().create_task(run())
+
+
+async def ensure_sitemaps(catalog_version: int) -> bool:
+    """Build the files on first use; refresh in the background once the catalog moved.
+
+    Returns False when SITE_URL is not configured (nothing to serve).
+    """
+    if not SITE_URL:
+        if not _refresh["warned"]:
+            print("⚠️  SITE_URL is not set; sitemaps and feeds are disabled")
+            _refresh["warned"] = True
+        return False
+    manifest = read_manifest()
+    if manifest is None or manifest.get("base_url") != SITE_URL:
+        built = await asyncio.to_thread(build_sitemaps, SITE_URL)
+        if built is None and manifest is None:
+            await _wait_for_first_build()
+    elif manifest.get("catalog_version") != catalog_version:
+        schedule_refresh()
+    return True
+
+
+async def _wait_for_first_build():
+    """Wait for the worker building the first set of files; 503 if it takes too long"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SITEMAP_BUILD_WAIT
+    while read_manifest() is None:
+        if loop.time() >= deadline:
+            raise HTTPException(
+                status_code=503, detail="Sitemaps are being built", headers={"Retry-After": "5"}
+            )
+        await asyncio.sleep(0.2)
+
+
+def prebuilt_file(name: str, accept_encoding: str) -> Optional[Tuple[Path, Optional[str], datetime]]:
+    """(path to send, Content-Encoding, last modified) of a prebuilt file, or None"""
+    path = _path(name)
+    try:
+        modified = datetime.utcfromtimestamp(path.stat().st_mtime)
+    except OSError:
+        return None
+    gzipped = _path(f"{name}.gz")
+    if "gzip" in accepted_encodings(accept_encoding) and gzipped.is_file():
+        return gzipped, "gzip", modified
+    return path, None, modified
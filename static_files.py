@@ -0,0 +1,195 @@
+import gzip
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+import anyio
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.routing import Mount
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+# Brotli is optional; without it only gzip siblings are written
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = "static"
+# Public prefix of every static URL: a CDN or a separate static host, e.g.
+# https://static.example.com/static (templates build their URLs from it)
+STATIC_URL = os.getenv("STATIC_URL", "/static").rstrip("/")
+# Set to false when nginx, a CDN or `static_files:static_app` serves /static
+SERVE_STATIC = os.getenv("SERVE_STATIC", "true").lower() not in ("0", "false", "no", "off")
+# Internal nginx location (e.g. /_static/) to answer with X-Accel-Redirect
+# instead of sending the bytes from Python
+STATIC_ACCEL_REDIRECT = os.getenv("STATIC_ACCEL_REDIRECT", "").rstrip("/")
+# Cache lifetime of files whose name does not change with their content
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Banners and thumbnails named by content hash (and legacy uuid4 banner
+# names) never change
+IMMUTABLE_PATH = re.compile(
+    r"^(banners/[0-9a-f]{2}/[0-9a-f]{64}\.\w+"
+    r"|banners/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.\w+"
+    r"|thumbs/[0-9a-f]{2}/[0-9a-f]{64}-\d+\.\w+)$"
+)
+# Images are already compressed; only text formats get .br/.gz siblings
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".json", ".svg", ".txt", ".xml", ".html", ".ico", ".map"}
+# A sibling is only kept when it saves at least this fraction of the bytes
+MIN_COMPRESSION_SAVING = 0.1
+# Preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def static_url(path: str, base: str = "") -> str:
+    """Public URL of a file under static/ (accepts stored paths like banner_path).
+
+    Pass `base` (e.g. request.base_url) for an absolute URL when STATIC_URL
+    is a plain path.
+    """
+    path = path.lstrip("/")
+    if path.startswith(f"{STATIC_DIR}/"):
+        path = path[len(STATIC_DIR) + 1:]
+    url = f"{STATIC_URL}/{path}"
+    if base and url.startswith("/"):
+        return str(base).rstrip("/") + url
+    return url
+
+
+def cache_control(relative_path: str) -> str:
+    """Cache-Control value for a path relative to the static directory"""
+    if IMMUTABLE_PATH.match(relative_path.replace(os.sep, "/")):
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return f"public, max-age={STATIC_MAX_AGE}"
+
+
+def accepted_encodings(header: str) -> List[str]:
+    """Codings a client accepts (q > 0) from its Accept-Encoding header"""
+    accepted = []
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.append(name.strip().lower())
+    return accepted
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles with long-lived caching, precompressed siblings and nginx handoff.
+
+    Ranges come from FileResponse, which also hands the file to the server
+    through the `http.response.pathsend` extension where supported (zero-copy
+    sendfile under Hypercorn/Granian).
+    """
+
+    async def get_response(self, path: str, scope) -> Response:
+        if (
+            scope["method"] in ("GET", "HEAD")
+            and not STATIC_ACCEL_REDIRECT
+            and Path(path).suffix.lower() in COMPRESSIBLE_SUFFIXES
+        ):
+            accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+            for encoding, suffix in ENCODINGS:
+                if encoding not in accepted:
+                    continue
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                if stat_result is not None:
+                    return self.encoded_response(path, full_path, stat_result, scope, encoding)
+        return await super().get_response(path, scope)
+
+    def encoded_response(self, path: str, full_path, stat_result, scope, encoding: str) -> Response:
+        """Serve a .br/.gz sibling with the original's content type"""
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        response = FileResponse(full_path, stat_result=stat_result, media_type=media_type)
+        response.headers["content-encoding"] = encoding
+        return self._finish(response, path, scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        path = self.get_path(scope)
+        if STATIC_ACCEL_REDIRECT and status_code == 200:
+            # nginx serves the bytes (sendfile, ranges, gzip_static) from an internal location
+            return Response(headers={
+                "X-Accel-Redirect": f"{STATIC_ACCEL_REDIRECT}/{path.replace(os.sep, '/')}",
+                "Cache-Control": cache_control(path),
+            })
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        return self._finish(response, path, scope)
+
+    def _finish(self, response: FileResponse, path: str, scope) -> Response:
+        response.headers["cache-control"] = cache_control(path)
+        if Path(path).suffix.lower() in COMPRESSIBLE_SUFFIXES:
+            response.headers["vary"] = "Accept-Encoding"
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def compressible_files(root: str = STATIC_DIR) -> Iterable[Path]:
+    """Text files under `root` that could use precompressed siblings"""
+    for path in Path(root).rglob("*"):
+        if path.is_file() and path.suffix.lower() in COMPRESSIBLE_SUFFIXES:
+            yield path
+
+
+def compress_file(path: Path, force: bool = False) -> List[Tuple[str, int, int]]:
+    """Write .gz (and .br when brotli is installed) siblings next to `path`.
+
+    Siblings that save less than MIN_COMPRESSION_SAVING are removed rather
+    than written. Returns (sibling, original size, compressed size) for each
+    sibling written.
+    """
+    data = path.read_bytes()
+    compressors = [(".gz", lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append((".br", lambda raw: brotli.compress(raw, quality=11)))
+
+    written = []
+    for suffix, compress in compressors:
+        sibling = path.with_name(path.name + suffix)
+        if not force and sibling.exists() and sibling.stat().st_mtime >= path.stat().st_mtime:
+            continue
+        compressed = compress(data)
+        if len(compressed) > len(data) * (1 - MIN_COMPRESSION_SAVING):
+            sibling.unlink(missing_ok=True)
+            continue
+        temp_path = sibling.with_name(f".{sibling.name}.part")
+        temp_path.write_bytes(compressed)
+        os.replace(temp_path, sibling)
+        written.append((str(sibling), len(data), len(compressed)))
+    return written
+
+
+def compress_static(root: str = STATIC_DIR, force: bool = False) -> List[Tuple[str, int, int]]:
+    """Precompress every compressible file under `root`"""
+    written = []
+    for path in compressible_files(root):
+        written.extend(compress_file(path, force=force))
+    return written
+
+
+def mount_static(app, directory: str = STATIC_DIR):
+    """Mount /static on `app` unless another process serves it"""
+    if not SERVE_STATIC:
+        print(f"🗂️  Static files served elsewhere ({STATIC_URL})")
+        return
+    app.mount("/static", ImmutableStaticFiles(directory=directory, check_dir=False), name="static")
+
+
+# Stand-alone static server for a separate process, e.g.
+#   hypercorn static_files:static_app -b 0.0.0.0:8001
+# with STATIC_URL pointing at it and SERVE_STATIC=false on the web service
+static_app = Starlette(routes=[
+    Mount("/static", app=ImmutableStaticFiles(directory=STATIC_DIR, check_dir=False), name="static")
+])
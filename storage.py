@@ -0,0 +1,185 @@
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+# Banner storage configuration
+BANNER_DIR = "static/banners"
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+# Form posts carrying a banner; their bodies may hold one banner plus the
+# other form fields
+UPLOAD_PATHS = ("/admin/upload", "/admin/edit/")
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# Leading bytes needed to recognise every supported image format
+SNIFF_SIZE = 12
+# Files younger than this are never garbage-collected: an upload may still
+# be on its way to the database
+BANNER_GC_GRACE_SECONDS = int(os.getenv("BANNER_GC_GRACE_SECONDS", "600"))
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large (max {MAX_FILE_SIZE / (1024 * 1024):g} MB)")
+
+
+class UploadLimitMiddleware:
+    """Refuse banner form posts over MAX_FILE_SIZE before the form is parsed.
+
+    A declared Content-Length over the limit is answered at once; other
+    bodies are counted as they arrive and cut off with a 413 once they
+    cross it, instead of being spooled in full first.
+    """
+
+    def __init__(self, app, limit: int = MAX_FILE_SIZE + UPLOAD_FORM_OVERHEAD):
+        self.app = app
+        self.limit = limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(UPLOAD_PATHS):
+            return await self.app(scope, receive, send)
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.limit:
+            error = _too_large()
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code,
+                                    headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.limit:
+                    # Raised inside the form parser, so the app answers 413
+                    raise _too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """Return the file extension for an image's magic bytes, or None"""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def banner_path_for(digest: str, extension: str) -> str:
+    """Content-addressed path of a banner: BANNER_DIR/<hash[:2]>/<hash>.<ext>"""
+    return f"{BANNER_DIR}/{digest[:2]}/{digest}.{extension}"
+
+
+def _temp_path() -> str:
+    return f"{BANNER_DIR}/.{uuid.uuid4()}.part"
+
+
+def commit_banner(temp_path: str, digest: str, extension: str) -> Tuple[str, bool]:
+    """Move a fully written temp file to its content address.
+
+    Returns (path, created). When identical bytes are already stored the
+    temp file is dropped and the existing file's mtime refreshed, which keeps
+    garbage collection off it while the new reference is being committed.
+    """
+    file_path = banner_path_for(digest, extension)
+    if os.path.exists(file_path):
+        os.remove(temp_path)
+        os.utime(file_path)
+        return file_path, False
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temp_path, file_path)
+    return file_path, True
+
+
+def creation_stamp(path: str, created: bool) -> Dict[str, int]:
+    """{path: mtime} of a file a write just created, so a failed write can
+    drop it again (banners.discard_created_banners); {} if it was reused"""
+    return {path: os.stat(path).st_mtime_ns} if created else {}
+
+
+def store_banner_file(source: str) -> Tuple[str, bool]:
+    """Copy a local image into content-addressed storage; returns (path, created)"""
+    with open(source, "rb") as f:
+        extension = sniff_image_type(f.read(SNIFF_SIZE))
+    if extension is None:
+        raise ValueError(f"{source} is not a JPG, PNG, GIF or WebP image")
+
+    temp_path = _temp_path()
+    digest = hashlib.sha256()
+    try:
+        with open(source, "rb") as src, open(temp_path, "wb") as dst:
+            while chunk := src.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                dst.write(chunk)
+        return commit_banner(temp_path, digest.hexdigest(), extension)
+    except BaseException:
+        delete_file_safely(temp_path)
+        raise
+
+
+async def save_uploaded_file(file: UploadFile) -> Tuple[str, Dict[str, int]]:
+    """Stream an uploaded banner to disk; returns its path and creation_stamp().
+
+    The upload is copied in UPLOAD_CHUNK_SIZE pieces into a temp file and
+    hashed on the way; once complete it is renamed to its content address,
+    so re-uploads of the same image share one file and readers never see a
+    partial image. Peak memory is one chunk. The type is taken from the
+    magic bytes, not the client's content_type. Request bodies over the
+    limit are refused while they arrive (UploadLimitMiddleware); the size
+    check here catches a file that alone crosses MAX_FILE_SIZE.
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+
+    header = await file.read(SNIFF_SIZE)
+    extension = sniff_image_type(header)
+    if extension is None:
+        raise HTTPException(status_code=400, detail="Only JPG, PNG, GIF and WebP images are allowed")
+
+    temp_path = _temp_path()
+    digest = hashlib.sha256(header)
+    size = len(header)
+    try:
+        async with aiofiles.open(temp_path, 'wb') as f:
+            await f.write(header)
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise _too_large()
+                digest.update(chunk)
+                await f.write(chunk)
+        file_path, created = commit_banner(temp_path, digest.hexdigest(), extension)
+        return file_path, creation_stamp(file_path, created)
+    except HTTPException:
+        delete_file_safely(temp_path)
+        raise
+    except Exception as e:
+        delete_file_safely(temp_path)
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+
+
+def delete_file_safely(file_path: str) -> bool:
+    """Delete a file if it exists; failures are logged (and left to gc-banners), not raised"""
+    if not file_path:
+        return False
+    try:
+        os.remove(file_path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        print(f"⚠️  Could not delete {file_path}: {e}")
+        return False
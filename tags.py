@@ -0,0 +1,134 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, event, exists, insert, select, update
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models import Tag, Video, normalize_tag, video_tags
+
+# Rows per batch when backfilling tags from the legacy hashtags column
+BACKFILL_BATCH_SIZE = 1000
+
+
+def parse_tags(hashtags: Optional[str]) -> List[str]:
+    """Split a comma-joined hashtags string into unique canonical tag names"""
+    if not hashtags:
+        return []
+    names = []
+    for tag in hashtags.split(','):
+        name = normalize_tag(tag)[:100]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _get_or_create_tags(connection, names: Iterable[str]) -> Dict[str, int]:
+    """Return {name: tag_id}, inserting missing tags race-free"""
+    names = set(names)
+    if not names:
+        return {}
+    table = Tag.__table__
+    rows = [{"name": name, "video_count": 0} for name in names]
+    if connection.dialect.name == "postgresql":
+        connection.execute(pg_insert(table).on_conflict_do_nothing(index_elements=["name"]), rows)
+    elif connection.dialect.name == "sqlite":
+        connection.execute(sqlite_insert(table).on_conflict_do_nothing(index_elements=["name"]), rows)
+    else:
+        existing = set(connection.execute(select(table.c.name).where(table.c.name.in_(names))).scalars())
+        missing = [row for row in rows if row["name"] not in existing]
+        if missing:
+            connection.execute(insert(table), missing)
+    return dict(connection.execute(select(table.c.name, table.c.id).where(table.c.name.in_(names))).all())
+
+
+def _apply_counts(connection, deltas: Counter):
+    """Adjust the precomputed per-tag video counts"""
+    table = Tag.__table__
+    changes = [{"tag_id": tag_id, "delta": delta} for tag_id, delta in deltas.items() if delta]
+    if changes:
+        connection.execute(
+            update(table)
+            .where(table.c.id == bindparam("tag_id"))
+            .values(video_count=table.c.video_count + bindparam("delta")),
+            changes
+        )
+
+
+def add_video_tags(connection, videos: Iterable[Tuple[int, Optional[str]]]):
+    """Link videos to the tags in their hashtags string.
+
+    `videos` is an iterable of (video_id, hashtags) pairs for videos that
+    currently have no tag links (new or just cleared).
+    """
+    parsed = [(video_id, parse_tags(hashtags)) for video_id, hashtags in videos]
+    tag_ids = _get_or_create_tags(connection, (name for _, names in parsed for name in names))
+    links = [
+        {"video_id": video_id, "tag_id": tag_ids[name]}
+        for video_id, names in parsed for name in names
+    ]
+    if links:
+        connection.execute(insert(video_tags), links)
+        _apply_counts(connection, Counter(link["tag_id"] for link in links))
+
+
+def remove_video_tags(connection, video_ids: List[int]):
+    """Unlink videos from all their tags and decrement the tag counts"""
+    if not video_ids:
+        return
+    tag_ids = connection.execute(
+        select(video_tags.c.tag_id).where(video_tags.c.video_id.in_(video_ids))
+    ).scalars().all()
+    if tag_ids:
+        connection.execute(delete(video_tags).where(video_tags.c.video_id.in_(video_ids)))
+        _apply_counts(connection, Counter({tag_id: -count for tag_id, count in Counter(tag_ids).items()}))
+
+
+@event.listens_for(Session, "before_flush")
+def _untag_deleted_videos(session, flush_context, instances):
+    """Drop tag links before their videos are deleted"""
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Video) and obj.id is not None]
+    remove_video_tags(session.connection(), deleted)
+
+
+@event.listens_for(Session, "after_flush")
+def _tag_written_videos(session, flush_context):
+    """Link new videos and relink videos whose hashtags changed"""
+    changed = [
+        obj for obj in session.dirty
+        if isinstance(obj, Video) and sa_inspect(obj).attrs.hashtags.history.has_changes()
+    ]
+    new = [obj for obj in session.new if isinstance(obj, Video)]
+    if not changed and not new:
+        return
+    connection = session.connection()
+    remove_video_tags(connection, [obj.id for obj in changed])
+    add_video_tags(connection, [(obj.id, obj.hashtags) for obj in changed + new])
+
+
+def backfill_tags(connection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Create tag links for videos that have hashtags but no links yet.
+
+    Idempotent; walks the catalog in primary-key batches so it can run on
+    large existing databases. Returns the number of videos linked.
+    """
+    linked = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(Video.id, Video.hashtags)
+            .where(
+                Video.id > last_id,
+                Video.hashtags.isnot(None),
+                ~exists().where(video_tags.c.video_id == Video.id)
+            )
+            .order_by(Video.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return linked
+        add_video_tags(connection, rows)
+        linked += len(rows)
+        last_id = rows[-1].id
@@ -0,0 +1,72 @@
+import os
+from pathlib import Path
+
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+from cache import TTLCache
+from models import normalize_tag
+from static_files import static_url
+from thumbnails import ADMIN_SIZES, GRID_SIZES, OG_WIDTH, banner_variants
+
+# Template configuration
+TEMPLATE_DIR = "templates"
+# Compiled template bytecode, shared by every worker and filled at build time
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", ".jinja_cache")
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "5000"))
+FRAGMENT_CACHE_TTL = float(os.getenv("FRAGMENT_CACHE_TTL", "3600"))
+
+# Rendered per-video fragments; keys carry updated_at, so edits never serve stale HTML
+fragment_cache = TTLCache(maxsize=FRAGMENT_CACHE_SIZE, ttl=FRAGMENT_CACHE_TTL)
+
+
+def bytecode_cache():
+    """Filesystem bytecode cache, or None when the directory isn't writable"""
+    try:
+        Path(TEMPLATE_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        print(f"⚠️  Template bytecode cache disabled: {e}")
+        return None
+    if not os.access(TEMPLATE_CACHE_DIR, os.W_OK):
+        print(f"⚠️  Template bytecode cache disabled: {TEMPLATE_CACHE_DIR} is not writable")
+        return None
+    return FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+
+
+def configure_environment(env):
+    """Install the filters, globals and bytecode cache every template relies on"""
+    env.bytecode_cache = bytecode_cache()
+    env.filters["tag_slug"] = normalize_tag
+    env.globals.update(
+        banner_variants=banner_variants,
+        static_url=static_url,
+        grid_sizes=GRID_SIZES,
+        admin_sizes=ADMIN_SIZES,
+        og_width=OG_WIDTH,
+        render_fragment=lambda name, video, **context: render_fragment(env, name, video, **context)
+    )
+
+
+def render_fragment(env, name: str, video, **context) -> Markup:
+    """Render a per-video partial, reusing the HTML until the video changes.
+
+    The key includes the banner digest because a card switches from the
+    original banner to its responsive variants once they are generated.
+    Extra `context` values (e.g. link status) must be hashable; they are
+    part of the key too.
+    """
+    thumbs = banner_variants(video.banner_path)
+    key = (name, video.id, video.updated_at, thumbs.digest if thumbs else None, tuple(sorted(context.items())))
+    html = fragment_cache.get(key)
+    if html is None:
+        html = Markup(env.get_template(name).render(video=video, thumbs=thumbs, **context))
+        fragment_cache.set(key, html)
+    return html
+
+
+def precompile_templates(env) -> int:
+    """Compile every template into the bytecode cache; returns the count"""
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
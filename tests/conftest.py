@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Modules live at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Never touch a configured database: every run gets a throwaway SQLite file
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='streamhub-tests-')}/test.db"
+os.environ["SQLITE_PROFILE"] = "default"
+os.environ.pop("DATABASE_REPLICA_URL", None)
@@ -0,0 +1,160 @@
+import asyncio
+
+from admission import ConcurrencyLimiter
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_admits_up_to_limit_then_queues():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=2, queue_size=4, max_wait=5)
+        assert await limiter.acquire() is None
+        assert await limiter.acquire() is None
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not queued.done() and len(limiter.waiters) == 1
+
+        # The finishing request hands its slot straight to the waiter
+        limiter.release(0.1)
+        assert await queued is None
+        assert limiter.active == 2 and not limiter.waiters
+
+    run(scenario())
+
+
+def test_queue_full_is_refused_immediately():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=1, queue_size=1, max_wait=5)
+        await limiter.acquire()
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert await limiter.acquire() == "queue_full"
+        queued.cancel()
+
+    run(scenario())
+
+
+def test_deadline_refuses_waits_longer_than_max_wait():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=1, queue_size=10, max_wait=1)
+        limiter.service_time = 2.0
+        await limiter.acquire()
+        assert await limiter.acquire() == "deadline"
+        assert limiter.retry_after() == 2
+
+    run(scenario())
+
+
+def test_timeout_leaves_the_queue():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=1, queue_size=4, max_wait=0.05)
+        await limiter.acquire()
+        assert await limiter.acquire() == "timeout"
+        assert not limiter.waiters and limiter.active == 1
+
+    run(scenario())
+
+
+def test_cancel_while_queued_gives_up_the_place():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=1, queue_size=4, max_wait=5)
+        await limiter.acquire()
+        first = asyncio.ensure_future(limiter.acquire())
+        second = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        assert first.cancelled()
+        assert len(limiter.waiters) == 1
+
+        # The slot skips the cancelled waiter
+        limiter.release(0.0)
+        assert await second is None
+        limiter.release(0.0)
+        assert limiter.active == 0 and not limiter.waiters
+
+    run(scenario())
+
+
+async def _cancel_granted(limiter, task):
+    """Cancel a waiter whose slot was just granted; returns whether it was admitted.
+
+    Depending on the Python version the cancellation either wins (and the
+    limiter must pass the slot on) or the grant does (and the admitted
+    request releases the slot when it finishes, as the middleware does).
+    """
+    limiter.release(0.0)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    if task.cancelled():
+        return False
+    assert task.result() is None
+    return True
+
+
+def test_cancel_after_slot_was_granted_does_not_leak_it():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=1, queue_size=4, max_wait=5)
+        await limiter.acquire()
+        first = asyncio.ensure_future(limiter.acquire())
+        second = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+
+        if await _cancel_granted(limiter, first):
+            limiter.release(0.0)
+        assert await second is None
+        assert limiter.active == 1
+        limiter.release(0.0)
+        assert limiter.active == 0 and not limiter.waiters
+
+    run(scenario())
+
+
+def test_cancel_after_grant_with_nobody_waiting_frees_the_slot():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=1, queue_size=4, max_wait=5)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+
+        if await _cancel_granted(limiter, waiter):
+            limiter.release(0.0)
+        assert limiter.active == 0
+        assert await limiter.acquire() is None
+
+    run(scenario())
+
+
+def test_rate_limit_covers_only_the_listing_endpoints(monkeypatch):
+    import admission
+
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "RATE_LIMIT_ENABLED", True)
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def status(middleware, path):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": path, "headers": [], "client": ("10.0.0.1", 1234)}
+        await middleware(scope, None, send)
+        return sent[0]["status"]
+
+    async def scenario():
+        middleware = admission.AdmissionMiddleware(app)
+        middleware.rate_limiter = admission.RateLimiter(rate=0.001, burst=1, max_clients=10)
+        assert await status(middleware, "/api/videos") == 200
+        assert await status(middleware, "/api/videos") == 429
+        assert await status(middleware, "/api/videos/") == 429
+        for path in ("/api/videos/changes", "/api/videos/7/related", "/api/videos/7"):
+            assert await status(middleware, path) == 200
+
+    run(scenario())
@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import database
+from analytics import get_ranked_page
+from linkcheck import save_results
+from models import Video, VideoLink, VideoStats
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    assert database.init_db()
+
+
+def ranked(sort="popular", page=1, limit=2):
+    async def go():
+        engine = create_async_engine(database.ASYNC_DATABASE_URL)
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                videos, has_more = await get_ranked_page(db, sort, page, limit)
+                return [(video.id, video.title) for video in videos], has_more
+        finally:
+            await engine.dispose()
+    return asyncio.run(go())
+
+
+def add_viewed(*views):
+    with database.SessionLocal() as db:
+        videos = [
+            Video(title=f"ranked {count}", streamtape_url="https://streamtape.com/e/rank", streamtape_id="rank",
+                  banner_path="static/banners/test.png")
+            for count in views
+        ]
+        db.add_all(videos)
+        db.commit()
+        ids = [video.id for video in videos]
+    with database.engine.begin() as connection:
+        connection.execute(insert(VideoStats), [
+            {"video_id": video_id, "views": count, "watch_seconds": 0} for video_id, count in zip(ids, views)
+        ])
+    return ids
+
+
+def test_hidden_videos_do_not_shorten_ranked_pages():
+    top, hidden, third = add_viewed(10**6 + 3, 10**6 + 2, 10**6 + 1)
+    with database.engine.begin() as connection:
+        save_results(connection, [{
+            "video_id": hidden, "status": VideoLink.BROKEN, "http_status": 404, "error": None,
+            "checked_at": datetime.utcnow(),
+        }])
+    videos, _ = ranked(limit=2)
+    assert [video_id for video_id, _ in videos] == [top, third]
+
+
+def test_catalog_writes_refresh_cached_rankings():
+    (video_id,) = add_viewed(10**7)
+    assert ranked(limit=1)[0] == [(video_id, f"ranked {10**7}")]
+
+    with database.SessionLocal() as db:
+        db.get(Video, video_id).title = "renamed"
+        db.commit()
+    assert ranked(limit=1)[0] == [(video_id, "renamed")]
+
+    with database.SessionLocal() as db:
+        db.delete(db.get(Video, video_id))
+        db.commit()
+    assert video_id not in [found for found, _ in ranked(limit=1)[0]]
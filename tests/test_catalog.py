@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import database
+from catalog import TagInfo, count_videos, get_tag, get_tag_stats, invalidate_catalog
+from linkcheck import save_results
+from models import Video, VideoLink
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    assert database.init_db()
+
+
+def run(query):
+    async def go():
+        engine = create_async_engine(database.ASYNC_DATABASE_URL)
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                return await query(db)
+        finally:
+            await engine.dispose()
+    return asyncio.run(go())
+
+
+def add_video(title, hashtags=None):
+    with database.SessionLocal() as db:
+        video = Video(title=title, streamtape_url="https://streamtape.com/e/cat", streamtape_id="cat",
+                      banner_path="static/banners/test.png", hashtags=hashtags)
+        db.add(video)
+        db.commit()
+        return video.id
+
+
+def test_count_leaves_out_broken_videos_except_for_the_admin_panel():
+    invalidate_catalog()
+    listed_before = run(count_videos)
+    everything_before = run(lambda db: count_videos(db, include_broken=True))
+
+    add_video("counted")
+    hidden = add_video("hidden")
+    with database.engine.begin() as connection:
+        save_results(connection, [{
+            "video_id": hidden, "status": VideoLink.BROKEN, "http_status": 404, "error": None,
+            "checked_at": datetime.utcnow(),
+        }])
+    invalidate_catalog()
+
+    assert run(count_videos) == listed_before + 1
+    assert run(lambda db: count_videos(db, include_broken=True)) == everything_before + 2
+
+
+def test_cached_tags_are_plain_values():
+    add_video("tagged", "#catalogtag")
+    invalidate_catalog()
+
+    tag = run(lambda db: get_tag(db, "#CatalogTag"))
+    assert isinstance(tag, TagInfo)
+    assert (tag.name, tag.video_count, tag.label) == ("catalogtag", 1, "#catalogtag")
+    # A cache hit hands back the same value, usable after its session closed
+    assert run(lambda db: get_tag(db, "catalogtag")) is tag
+    assert run(lambda db: get_tag(db, "missingtag")) is None
+
+    _, top_tags = run(lambda db: get_tag_stats(db, top=100))
+    assert tag in top_tags
+    assert all(isinstance(top, TagInfo) for top in top_tags)
@@ -0,0 +1,172 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import database
+from changes import change_fields, check_token, decode_token, encode_token, prune_tombstones, read_changes
+from models import CatalogState, Video, VideoTombstone
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    assert database.init_db()
+
+
+def in_session(work):
+    """Run `work(db)` on a fresh async engine (one event loop per call)"""
+    async def go():
+        engine = create_async_engine(database.ASYNC_DATABASE_URL)
+        try:
+            async with AsyncSession(engine) as db:
+                return await work(db)
+        finally:
+            await engine.dispose()
+    return asyncio.run(go())
+
+
+def read(position, limit=100):
+    page, _ = in_session(lambda db: read_changes(db, position, limit, change_fields("title")))
+    return page
+
+
+def current_position():
+    with database.engine.connect() as connection:
+        return connection.execute(select(CatalogState.version).where(CatalogState.id == 1)).scalar(), None
+
+
+def add_videos(*titles):
+    with database.SessionLocal() as db:
+        videos = [
+            Video(title=title, streamtape_url=f"https://streamtape.com/e/{title}", streamtape_id=title,
+                  banner_path="static/banners/test.png")
+            for title in titles
+        ]
+        db.add_all(videos)
+        db.commit()
+        return [video.id for video in videos]
+
+
+def test_token_round_trip():
+    assert decode_token(None) is None
+    assert decode_token("") is None
+    assert decode_token(encode_token(12)) == (12, None)
+    assert decode_token(encode_token(12, 7)) == (12, 7)
+
+
+@pytest.mark.parametrize("token", ["x", "12.x", "1.2.3", ".5", "12,7"])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(HTTPException) as error:
+        decode_token(token)
+    assert error.value.status_code == 400
+
+
+def test_pages_split_inside_one_write():
+    start = current_position()
+    ids = add_videos("a1", "a2", "a3")
+
+    first = read(start, limit=2)
+    assert [video["id"] for video in first["videos"]] == ids[:2]
+    assert first["has_more"]
+    # All three share the write's sequence; the token carries the last id
+    seq, last_id = decode_token(first["next_token"])
+    assert last_id == ids[1]
+
+    second = read(decode_token(first["next_token"]), limit=2)
+    assert [video["id"] for video in second["videos"]] == ids[2:]
+    assert not second["has_more"]
+    assert decode_token(second["next_token"]) == (seq, ids[2])
+
+    idle = read(decode_token(second["next_token"]))
+    assert idle["videos"] == [] and idle["deleted"] == []
+    assert idle["next_token"] == second["next_token"]
+
+
+def test_edits_and_deletes_after_a_token():
+    keep, drop = add_videos("b1", "b2")
+    position = current_position()
+
+    with database.SessionLocal() as db:
+        db.get(Video, keep).title = "b1 edited"
+        db.delete(db.get(Video, drop))
+        db.commit()
+
+    page = read(position)
+    assert page["videos"] == [{"id": keep, "title": "b1 edited"}]
+    assert page["deleted"] == [drop]
+
+
+def test_token_older_than_pruned_deletes_is_gone():
+    (victim,) = add_videos("c1")
+    stale = encode_token(*current_position())
+    with database.SessionLocal() as db:
+        db.delete(db.get(Video, victim))
+        db.commit()
+    fresh = encode_token(*current_position())
+
+    with database.engine.begin() as connection:
+        connection.execute(
+            update(VideoTombstone).values(deleted_at=datetime.utcnow() - timedelta(days=365))
+        )
+        assert prune_tombstones(connection, retention_days=30) >= 1
+
+    with pytest.raises(HTTPException) as error:
+        in_session(lambda db: check_token(db, stale))
+    assert error.value.status_code == 410
+    assert in_session(lambda db: check_token(db, fresh)) == decode_token(fresh)
+    assert in_session(lambda db: check_token(db, None)) is None
+
+
+def test_recent_tombstones_survive_pruning():
+    (victim,) = add_videos("d1")
+    position = current_position()
+    with database.SessionLocal() as db:
+        db.delete(db.get(Video, victim))
+        db.commit()
+
+    with database.engine.begin() as connection:
+        prune_tombstones(connection, retention_days=30)
+    assert read(position)["deleted"] == [victim]
+
+
+def test_commit_between_the_scans_is_not_skipped():
+    edited, removed = add_videos("e1", "e2")
+    position = current_position()
+
+    def interleave():
+        # An edit and then a delete commit after the video scan ran
+        with database.SessionLocal() as db:
+            db.get(Video, edited).title = "e1 edited"
+            db.commit()
+        with database.SessionLocal() as db:
+            db.delete(db.get(Video, removed))
+            db.commit()
+
+    class Interleaving(AsyncSession):
+        scans = 0
+
+        async def execute(self, *args, **kwargs):
+            result = await super().execute(*args, **kwargs)
+            Interleaving.scans += 1
+            if Interleaving.scans == 2:
+                interleave()
+            return result
+
+    async def go():
+        engine = create_async_engine(database.ASYNC_DATABASE_URL)
+        try:
+            async with Interleaving(engine) as db:
+                return await read_changes(db, position, 100, change_fields("title"))
+        finally:
+            await engine.dispose()
+
+    # Neither write is in the page, so the token stays before both
+    first, _ = asyncio.run(go())
+    assert first["videos"] == [] and first["deleted"] == []
+
+    second = read(decode_token(first["next_token"]))
+    assert second["videos"] == [{"id": edited, "title": "e1 edited"}]
+    assert second["deleted"] == [removed]
@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import func, select
+
+import database
+from jobs import claim_jobs, enqueue_sync, finish_job
+from models import Job
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    assert database.init_db()
+
+
+def jobs_with(kind):
+    with database.engine.connect() as connection:
+        return connection.execute(select(func.count()).where(Job.kind == kind)).scalar()
+
+
+@pytest.mark.parametrize("error", [None, "boom"])
+def test_key_only_deduplicates_queued_and_running_jobs(error):
+    kind = f"dedupe-{error}"
+    with database.engine.begin() as connection:
+        enqueue_sync(connection, kind, {}, key=f"{kind}:1")
+        enqueue_sync(connection, kind, {}, key=f"{kind}:1")
+    assert jobs_with(kind) == 1
+
+    with database.engine.begin() as connection:
+        assert len(claim_jobs(connection, "test", 100)) >= 1
+        # Running still holds the key
+        enqueue_sync(connection, kind, {}, key=f"{kind}:1")
+    assert jobs_with(kind) == 1
+
+    with database.engine.begin() as connection:
+        (job_id,) = connection.execute(select(Job.id).where(Job.kind == kind)).scalars()
+        finish_job(connection, job_id, "test", error, retry=False, attempts=1)
+    # Done or failed, the same work can be queued again
+    with database.engine.begin() as connection:
+        enqueue_sync(connection, kind, {}, key=f"{kind}:1")
+    assert jobs_with(kind) == 2
@@ -0,0 +1,71 @@
+import base64
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import clamp_limit, decode_cursor, encode_cursor, split_page
+
+
+def b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    cursor = encode_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",                        # not base64
+    "a",                                    # truncated
+    b64(b"\xff\xfe\xfd"),                   # not UTF-8
+    b64(b"2024-05-01T12:30:15"),            # no id
+    b64(b"2024-05-01T12:30:15|42|7"),       # extra part
+    b64(b"yesterday|42"),                   # bad timestamp
+    b64(b"2024-05-01T12:30:15|forty-two"),  # bad id
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_tampered_cursor_is_rejected_or_decodes_to_a_position():
+    cursor = encode_cursor(datetime(2024, 5, 1), 42)
+    # Flip characters: the result must either decode cleanly or be a 400
+    for index in range(len(cursor)):
+        tampered = cursor[:index] + ("A" if cursor[index] != "A" else "B") + cursor[index + 1:]
+        try:
+            created_at, video_id = decode_cursor(tampered)
+        except HTTPException as error:
+            assert error.status_code == 400
+        else:
+            assert isinstance(created_at, datetime) and isinstance(video_id, int)
+
+
+def test_clamp_limit():
+    assert clamp_limit(None) == 24
+    assert clamp_limit(0) == 24
+    assert clamp_limit(-5) == 24
+    assert clamp_limit(10) == 10
+    assert clamp_limit(10000) == 100
+    assert clamp_limit(10000, maximum=5000) == 5000
+
+
+class Row:
+    def __init__(self, video_id, created_at):
+        self.id = video_id
+        self.created_at = created_at
+
+
+def test_split_page_cursor_points_at_last_row():
+    rows = [Row(video_id, datetime(2024, 5, video_id)) for video_id in (5, 4, 3)]
+    page, next_cursor = split_page(rows, 2)
+    assert [row.id for row in page] == [5, 4]
+    assert decode_cursor(next_cursor) == (datetime(2024, 5, 4), 4)
+    assert split_page(rows, 3) == (rows, None)
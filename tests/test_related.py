@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import database
+from catalog import invalidate_catalog
+from models import Video, VideoRelated
+from related import get_related_videos
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    assert database.init_db()
+
+
+def related(video_id):
+    async def go():
+        engine = create_async_engine(database.ASYNC_DATABASE_URL)
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                return [video.id for video in await get_related_videos(db, video_id)]
+        finally:
+            await engine.dispose()
+    invalidate_catalog()
+    return asyncio.run(go())
+
+
+def add_video(title, hashtags):
+    with database.SessionLocal() as db:
+        video = Video(title=title, streamtape_url="https://streamtape.com/e/rel", streamtape_id="rel",
+                      banner_path="static/banners/test.png", hashtags=hashtags)
+        db.add(video)
+        db.commit()
+        return video.id
+
+
+def test_neighbour_id_reused_by_a_new_video_is_dropped():
+    first = add_video("Lighthouse keeper diaries", "#lighthouse #coast")
+    newest = add_video("Lighthouse storm night", "#lighthouse #coast")
+    assert related(first) == [newest]
+
+    with database.SessionLocal() as db:
+        db.delete(db.get(Video, newest))
+        db.commit()
+    # Without AUTOINCREMENT, SQLite hands the deleted (highest) id to the next video
+    unrelated = add_video("Sourdough starter basics", "#baking")
+    assert unrelated == newest
+    with database.SessionLocal() as db:
+        assert newest in [entry[0] for entry in db.get(VideoRelated, first).neighbors]
+
+    assert related(first) == []
+
+
+def test_entries_without_listing_time_are_trusted():
+    first = add_video("Glacier hiking routes", "#glacier")
+    second = add_video("Glacier camping gear", "#glacier")
+    with database.SessionLocal() as db:
+        row = db.get(VideoRelated, first)
+        row.neighbors = [entry[:2] for entry in row.neighbors]
+        db.commit()
+    assert related(first) == [second]
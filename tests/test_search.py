@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import database
+import search
+from catalog import invalidate_catalog
+from models import Video
+from search import build_fts5_query, search_videos
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    assert database.init_db()
+
+
+def find(query, page=1, limit=10):
+    """Ids search_videos() returns for `query`, bypassing cached results"""
+    async def go():
+        engine = create_async_engine(database.ASYNC_DATABASE_URL)
+        try:
+            async with AsyncSession(engine) as db:
+                videos, has_more = await search_videos(db, query, page, limit)
+                return [video.id for video in videos], has_more
+        finally:
+            await engine.dispose()
+    invalidate_catalog()
+    return asyncio.run(go())
+
+
+def add_video(title, description=None, hashtags=None):
+    with database.SessionLocal() as db:
+        video = Video(title=title, description=description, hashtags=hashtags,
+                      streamtape_url="https://streamtape.com/e/search", streamtape_id="search",
+                      banner_path="static/banners/test.png")
+        db.add(video)
+        db.commit()
+        return video.id
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("cats", '"cats"*'),
+    ("Funny  cats!", '"Funny"* "cats"*'),
+    # FTS5 syntax in user input is reduced to plain words
+    ('title:x OR "y" NEAR(z) -w ^v', '"title"* "x"* "OR"* "y"* "NEAR"* "z"* "w"* "v"*'),
+    ("café", '"café"*'),
+    ("", None),
+    ('"*()^:-', None),
+])
+def test_fts5_query_building(query, expected):
+    assert build_fts5_query(query) == expected
+
+
+def test_hostile_input_never_errors():
+    add_video("quokka escape test")
+    for query in ('"', "AND", "quokka*", "NEAR(quokka", "quokka OR", "{quokka}", "quokka:"):
+        ids, _ = find(query)
+        assert isinstance(ids, list)
+    assert find('quokka"')[0] == find("quokka")[0] != []
+
+
+def test_prefix_and_every_word_must_match():
+    both = add_video("axolotl swimming lesson")
+    add_video("axolotl sleeping")
+    assert find("axolo swim")[0] == [both]
+
+
+def test_title_matches_rank_above_hashtags_and_description():
+    in_description = add_video("first upload", description="a narwhal documentary")
+    in_hashtags = add_video("second upload", hashtags="#narwhal")
+    in_title = add_video("narwhal close up")
+    assert find("narwhal")[0] == [in_title, in_hashtags, in_description]
+
+
+def test_paging():
+    ids = [add_video(f"pangolin part {n}") for n in range(3)]
+    first, more = find("pangolin", page=1, limit=2)
+    second, last = find("pangolin", page=2, limit=2)
+    assert more and not last
+    assert sorted(first + second) == sorted(ids)
+
+
+def test_index_follows_insert_update_and_delete():
+    video_id = add_video("wombat diaries")
+    assert find("wombat")[0] == [video_id]
+
+    with database.SessionLocal() as db:
+        db.get(Video, video_id).title = "capybara diaries"
+        db.commit()
+    assert find("wombat")[0] == []
+    assert find("capybara")[0] == [video_id]
+
+    with database.SessionLocal() as db:
+        db.delete(db.get(Video, video_id))
+        db.commit()
+    assert find("capybara")[0] == []
+
+
+def test_like_fallback_without_fts5(monkeypatch):
+    newer = add_video("okapi 100% wild")
+    older_in_hashtags = add_video("unrelated", hashtags="#okapi")
+    add_video("okapi 100x wild")
+    # A missing index table raises like SQLite built without FTS5
+    monkeypatch.setattr(search, "SQLITE_SEARCH_SQL", "SELECT rowid FROM missing_fts WHERE x MATCH :query")
+
+    assert set(find("okapi")[0]) >= {newer, older_in_hashtags}
+    # LIKE wildcards in the query match literally
+    assert find("100%")[0] == [newer]
+    assert find("100_")[0] == []
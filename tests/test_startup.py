@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The measurement lives with the benchmarks, which import each other by name
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+# Cold starts are slow and machine dependent: opt in with the budget to enforce
+STARTUP_BUDGET_MS = os.getenv("STARTUP_BUDGET_MS")
+STARTUP_RUNS = int(os.getenv("STARTUP_RUNS", "3"))
+
+pytestmark = pytest.mark.skipif(not STARTUP_BUDGET_MS, reason="set STARTUP_BUDGET_MS to check the startup budget")
+
+
+def test_import_and_startup_fit_the_budget():
+    from startup import ROOT, measure_in_process, migrate
+
+    database_url = f"sqlite:///{tempfile.mkdtemp(prefix='streamhub-startup-')}/startup.db"
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONPATH=str(ROOT))
+    migrate(env)
+
+    measured = measure_in_process(env, STARTUP_RUNS)
+    assert measured["first_render_status"] == 200
+    total = measured["import_ms"] + measured["lifespan_ms"]
+    assert total <= float(STARTUP_BUDGET_MS), f"startup took {total:.0f}ms: {measured}"
@@ -0,0 +1,48 @@
+import pytest
+
+import thumbnails
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def thumb_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnails, "THUMB_DIR", str(tmp_path / "thumbs"))
+    monkeypatch.setattr(thumbnails, "_variants", thumbnails.TTLCache(maxsize=2, ttl=60))
+    monkeypatch.setattr(thumbnails, "_missing", thumbnails.TTLCache(maxsize=2, ttl=60))
+    return tmp_path
+
+
+def banner(directory, name, width, height=100):
+    path = directory / name
+    Image.new("RGB", (width, height), "red").save(path, "PNG")
+    return str(path)
+
+
+def test_srcset_lists_the_real_width_of_capped_variants(thumb_dir):
+    path = banner(thumb_dir, "small.png", 150)
+    assert thumbnails.generate_variants(path)["widths"] == [192, thumbnails.OG_WIDTH]
+
+    srcset = thumbnails.banner_variants(path).srcset("webp")
+    assert srcset.endswith("-192.webp 150w")
+    assert "192w" not in srcset
+
+
+def test_manifests_without_pixel_widths_still_load(thumb_dir):
+    path = banner(thumb_dir, "legacy.png", 1000)
+    manifest = thumbnails.generate_variants(path)
+    thumbnails._manifest_path(path).write_text(
+        '{"digest": "%s", "widths": %s}' % (manifest["digest"], manifest["widths"])
+    )
+    assert thumbnails.banner_variants(path).srcset().endswith("-960.jpg 960w")
+
+
+def test_variant_cache_is_bounded(thumb_dir):
+    paths = [banner(thumb_dir, f"b{i}.png", 200) for i in range(4)]
+    for path in paths:
+        thumbnails.generate_variants(path)
+        assert thumbnails.banner_variants(path) is not None
+    assert len(thumbnails._variants) == 2
+    # A banner without a manifest is remembered (boundedly) as missing
+    assert thumbnails.banner_variants(str(thumb_dir / "none.png")) is None
+    assert len(thumbnails._missing) == 1
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+StreamHub banner thumbnails
+Resized WebP/JPEG variants of every banner, generated off the request path
+"""
+
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional - templates fall back to the original banner
+    Image = None
+
+from cache import TTLCache
+from static_files import static_url
+
+# Thumbnail configuration
+THUMB_DIR = "static/thumbs"
+THUMB_WIDTHS = (192, 384, 480, 960)
+OG_WIDTH = 1200
+THUMB_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "80"))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+# Banners without variants (job pending or failed, or no Pillow) are looked
+# at again after this long
+THUMB_RETRY_SECONDS = float(os.getenv("THUMB_RETRY_SECONDS", "300"))
+# Per-worker cache of banner manifests
+THUMB_CACHE_SIZE = int(os.getenv("THUMB_CACHE_SIZE", "4096"))
+THUMB_CACHE_TTL = float(os.getenv("THUMB_CACHE_TTL", "3600"))
+
+# Display width (CSS px) of each place a banner is shown
+GRID_SIZES = "(min-width: 1280px) 25vw, (min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw"
+ADMIN_SIZES = "96px"
+
+
+class BannerVariants:
+    """Derived images for one banner, addressed by the banner's content hash"""
+
+    def __init__(self, digest: str, widths, pixels: Optional[Dict[int, int]] = None):
+        self.digest = digest
+        self.widths = sorted(widths)
+        # Real width of each variant: smaller than its name for small sources
+        self.pixels = pixels or {}
+
+    def url(self, width: int, fmt: str = "jpg") -> str:
+        """Path of the smallest variant at least `width` pixels wide"""
+        chosen = next((w for w in self.widths if w >= width), self.widths[-1])
+        return f"{THUMB_DIR}/{self.digest[:2]}/{self.digest}-{chosen}.{fmt}"
+
+    def srcset(self, fmt: str = "jpg") -> str:
+        """srcset attribute value listing every width in `fmt`"""
+        return ", ".join(
+            f"{static_url(self.url(w, fmt))} {self.pixels.get(w, w)}w"
+            for w in self.widths if w != OG_WIDTH
+        )
+
+
+def _manifest_path(banner_path: str) -> Path:
+    return Path(THUMB_DIR) / "by-banner" / f"{Path(banner_path).name}.json"
+
+
+def generate_variants(banner_path: str) -> Optional[dict]:
+    """Create every variant of a banner; runs in the thumbnails job or the backfill pool.
+
+    Variants are written to THUMB_DIR/<hash[:2]>/<hash>-<width>.<fmt>, so
+    identical banners share one set of files, and a small per-banner
+    manifest records which hash and widths (with their real pixel widths)
+    belong to the banner.
+    """
+    if Image is None or not os.path.exists(banner_path):
+        return None
+
+    digest = hashlib.sha256(Path(banner_path).read_bytes()).hexdigest()
+    out_dir = Path(THUMB_DIR) / digest[:2]
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    with Image.open(banner_path) as source:
+        source = source.convert("RGB")
+        widths, pixels = [], {}
+        for width in THUMB_WIDTHS + (OG_WIDTH,):
+            # Never upscale: widths past the source size would duplicate bytes
+            if width > source.width and widths and width != OG_WIDTH:
+                continue
+            target = min(width, source.width)
+            height = max(1, round(source.height * target / source.width))
+            resized = None
+            for ext, pil_format in THUMB_FORMATS.items():
+                out_path = out_dir / f"{digest}-{width}.{ext}"
+                if out_path.exists():
+                    continue
+                if resized is None:
+                    resized = source.resize((target, height), Image.LANCZOS)
+                temp_path = out_path.with_suffix(f".{ext}.part")
+                resized.save(temp_path, pil_format, quality=THUMB_QUALITY, optimize=True)
+                os.replace(temp_path, out_path)
+            widths.append(width)
+            pixels[width] = target
+
+    manifest = {"digest": digest, "widths": widths, "pixels": pixels}
+    manifest_path = _manifest_path(banner_path)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_manifest = manifest_path.with_suffix(".json.part")
+    temp_manifest.write_text(json.dumps(manifest))
+    os.replace(temp_manifest, manifest_path)
+    return manifest
+
+
+# Per-worker state: known variants, and banners that had no manifest yet
+# (forgotten after THUMB_RETRY_SECONDS, so they are looked for again)
+_variants = TTLCache(maxsize=THUMB_CACHE_SIZE, ttl=THUMB_CACHE_TTL)
+_missing = TTLCache(maxsize=THUMB_CACHE_SIZE, ttl=THUMB_RETRY_SECONDS)
+
+
+def banner_variants(banner_path: str) -> Optional[BannerVariants]:
+    """Return a banner's variants, or None until its thumbnails job wrote them.
+
+    Used as a Jinja global; templates serve the original banner meanwhile.
+    Variants are only generated by the `thumbnails` job (banners.py) and
+    `python thumbnails.py`, never from the render path.
+    """
+    if not banner_path:
+        return None
+    variants = _variants.get(banner_path)
+    if variants is not None or _missing.get(banner_path):
+        return variants
+
+    manifest_path = _manifest_path(banner_path)
+    try:
+        manifest = json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        _missing.set(banner_path, True)
+        return None
+    # JSON object keys are strings; manifests written before "pixels" lack it
+    pixels = {int(width): target for width, target in manifest.get("pixels", {}).items()}
+    variants = BannerVariants(manifest["digest"], manifest["widths"], pixels)
+    _variants.set(banner_path, variants)
+    return variants
+
+
+def main():
+    """Generate variants for every banner already in static/banners (any depth)"""
+    if Image is None:
+        print("❌ Pillow is not installed - run: pip install Pillow")
+        return 1
+
+    banners = [
+        # Content-addressed banners live in static/banners/<hash[:2]>/
+        str(path) for path in sorted(Path("static/banners").rglob("*"))
+        if path.is_file() and not path.name.startswith(".")
+    ]
+    print(f"🖼️  Generating thumbnails for {len(banners)} banner(s)...")
+    with ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS) as pool:
+        for path, manifest in zip(banners, pool.map(generate_variants, banners)):
+            status = "✅" if manifest else "⚠️ "
+            print(f"{status} {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+StreamHub Job Worker
+Run queued background jobs (see jobs.py) outside the web workers
+
+    JOB_RUNNER=external gunicorn main:app ...      # web service only enqueues
+    python worker.py --processes 2 --threads 4     # on a host sharing static/
+"""
+
+import argparse
+import multiprocessing
+import signal
+import sys
+import time
+
+from jobs import JOB_THREADS, JobRunner
+from metrics import MULTIPROC_DIR, serve_metrics
+
+
+def run_process(threads: int):
+    """Run jobs in this process until SIGTERM/SIGINT, then finish the running ones"""
+    from database import create_job_engines
+
+    engine, read_engine = create_job_engines(threads)
+    runner = JobRunner(engine, threads=threads, read_engine=read_engine)
+
+    def shutdown(signum, frame):
+        runner.stopping.set()
+        runner.wake.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    print(f"👷 Job worker {runner.worker_id} running {threads} thread(s)")
+    runner.run()
+    print(f"👋 Job worker {runner.worker_id} stopped")
+
+
+def supervise(processes: int, threads: int):
+    """Keep `processes` worker processes running, restarting any that die"""
+    context = multiprocessing.get_context("spawn")
+    stopping = False
+    children = []
+
+    def start():
+        child = context.Process(target=run_process, args=(threads,), daemon=False)
+        child.start()
+        return child
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for child in children:
+            if child.is_alive():
+                child.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    children.extend(start() for _ in range(processes))
+    while not stopping:
+        time.sleep(1)
+        for index, child in enumerate(children):
+            if not child.is_alive() and not stopping:
+                print(f"⚠️  Job worker process {child.pid} exited ({child.exitcode}), restarting")
+                children[index] = start()
+    for child in children:
+        child.join()
+
+
+def main():
+    """Run the job worker"""
+    parser = argparse.ArgumentParser(description="StreamHub background job worker")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes")
+    parser.add_argument("--threads", type=int, default=JOB_THREADS, help="Jobs run concurrently per process")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        if args.processes > 1 and not MULTIPROC_DIR:
+            print("⚠️  Set PROMETHEUS_MULTIPROC_DIR to export metrics from several processes")
+        else:
+            serve_metrics(args.metrics_port)
+    if args.processes > 1:
+        supervise(args.processes, args.threads)
+    else:
+        run_process(args.threads)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())